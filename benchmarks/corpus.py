@@ -0,0 +1,185 @@
+"""
+corpus writes a deterministic synthetic corpus to benchmark dluxparser.
+
+The same seed always gives the same files, byte by byte:
+
+* ``inventory/``: log2json sintaxis files, with plain, numbered and
+  SPECIAL_WORDS features.
+* ``csv/``: wide csv files mixing integers, floats, booleans, text and
+  empty values.
+* ``shrink/``: logs with noise around star banner sections, as expected
+  by the shrinker sub-commands.
+
+Usage
+-----
+
+    python -m benchmarks.corpus -o /tmp/corpus --files 20 --size-kb 512
+"""
+import argparse
+import os
+import random
+
+KINDS = ('inventory', 'csv', 'shrink')
+
+_WORDS = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf',
+          'hotel', 'india', 'juliet', 'kilo', 'lima', 'mike', 'november')
+_FEATURES = ('Memory', 'Disk', 'Fan', 'Sensor', 'Port', 'Slot', 'Lane')
+_SPECIAL = ('front', 'power')
+_BANNER = '*' * 25
+
+
+class ArgumentParser():
+    def __init__(self, args=None, parser=None):
+        desc = 'Write a deterministic synthetic corpus for the benchmarks.'
+        if not parser:
+            parser = argparse.ArgumentParser(description=desc)
+        self.parser = parser
+
+        parser.add_argument(
+            "-o", "--output-dir", metavar="<dir_name>",
+            action='store', required=True, dest='output_dir', type=str,
+            help="The directory where the corpus will be written.")
+        parser.add_argument(
+            "--files", metavar="N",
+            action='store', required=False, dest='files', type=int,
+            default=10,
+            help="Number of files of each kind.")
+        parser.add_argument(
+            "--size-kb", metavar="N",
+            action='store', required=False, dest='size_kb', type=int,
+            default=256,
+            help="Approximate size of each file in KB.")
+        parser.add_argument(
+            "--columns", metavar="N",
+            action='store', required=False, dest='columns', type=int,
+            default=40,
+            help="Number of columns of the csv files.")
+        parser.add_argument(
+            "--kind", metavar="<kind>",
+            action='append', required=False, dest='kinds', type=str,
+            choices=KINDS,
+            help="Kind of files to write, all of them if not given.")
+        parser.add_argument(
+            "--seed", metavar="N",
+            action='store', required=False, dest='seed', type=int,
+            default=2018,
+            help="Seed of the generator.")
+
+    def parse_args(self, args):
+        return self.parser.parse_args(args=args)
+
+
+def generate(output_dir, files=10, size_kb=256, columns=40, kinds=KINDS,
+             seed=2018):
+    '''Write the corpus, return the folder of each kind.'''
+    folders = {}
+    for kind in kinds:
+        folder = os.path.join(output_dir, kind)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        folders[kind] = folder
+        for number in range(files):
+            # A generator per file, same file for the same seed
+            rand = random.Random('%s-%s-%i' % (seed, kind, number))
+            if kind == 'csv':
+                name = 'table%03i.csv' % number
+                lines = _csv_lines(rand, columns)
+            elif kind == 'inventory':
+                name = 'inventory%03i.log' % number
+                lines = _inventory_lines(rand)
+            else:
+                name = 'display%03i.log' % number
+                lines = _shrink_lines(rand)
+            _write(os.path.join(folder, name), lines, size_kb * 1024)
+    return folders
+
+
+def _write(name, lines, size):
+    '''Write lines into a file until it reaches size bytes.'''
+    written = 0
+    with open(name, 'w') as the_file:
+        for line in lines:
+            if written >= size:
+                break
+            the_file.write(line)
+            written = written + len(line)
+
+
+def _text(rand, words=3):
+    return ' '.join(rand.choice(_WORDS) for _ in range(words))
+
+
+def _inventory_lines(rand):
+    '''Lines in log2json sintaxis, forever.'''
+    yield 'Hostname = %s%i\n' % (rand.choice(_WORDS), rand.randint(1, 99))
+    while True:
+        choice = rand.random()
+        if choice < 0.2:
+            yield '%s = %s\n' % (rand.choice(_WORDS).title(), _text(rand))
+            continue
+        if choice < 0.3:
+            feature = '%s %s' % (rand.choice(_SPECIAL),
+                                 rand.choice(_WORDS))
+        else:
+            feature = rand.choice(_FEATURES)
+        # A numbered element with a few keys
+        element = rand.randint(0, 63)
+        for key in rand.sample(_WORDS, rand.randint(1, 5)):
+            yield '%s %i %s %s = %s\n' % (feature, element, key,
+                                          _text(rand, 1), _text(rand))
+
+
+def _csv_lines(rand, columns):
+    '''Header and rows of a wide csv file, forever.'''
+    kinds = [rand.choice(('int', 'float', 'bool', 'text', 'zip'))
+             for _ in range(columns)]
+    yield ','.join('%s_%i' % (kind, index)
+                   for index, kind in enumerate(kinds)) + '\n'
+    while True:
+        row = []
+        for kind in kinds:
+            if rand.random() < 0.05:
+                row.append('')
+            elif kind == 'int':
+                row.append(str(rand.randint(-10 ** 6, 10 ** 6)))
+            elif kind == 'float':
+                row.append('%.4f' % rand.uniform(-1000, 1000))
+            elif kind == 'bool':
+                row.append(rand.choice(('true', 'false')))
+            elif kind == 'zip':
+                row.append('%05i' % rand.randint(0, 99999))
+            else:
+                row.append(_text(rand))
+        yield ','.join(row) + '\n'
+
+
+def _shrink_lines(rand):
+    '''Noise and star banner sections of a display.cfg dump, forever.'''
+    section = 0
+    while True:
+        for _ in range(rand.randint(5, 50)):
+            yield '%s noise %i ...\n' % (_text(rand), rand.randint(0, 999))
+        yield 'Tx64 display.cfg file dump\n'
+        yield _BANNER + '\n'
+        yield 'dlux header %i\n' % section
+        for feature in range(rand.randint(50, 500)):
+            if rand.random() < 0.1:
+                yield 'FEATURE %i Value = number of %s\n' % (
+                    feature, _text(rand, 1))
+            else:
+                yield 'FEATURE %i Value = %s\n' % (feature, _text(rand))
+        yield _BANNER + '\n'
+        yield 'trailer %i\n' % section
+        section = section + 1
+
+
+def main(opts=None):
+    opts = ArgumentParser().parse_args(opts)
+    folders = generate(opts.output_dir, opts.files, opts.size_kb,
+                       opts.columns, opts.kinds or KINDS, opts.seed)
+    for kind in sorted(folders):
+        print("%s: %s" % (kind, folders[kind]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+run benchmarks the dluxparser commands on a synthetic corpus.
+
+Every case runs the command on a fresh python process, as users run it,
+and reports its throughput (input MB/s and files/s, best of the repeats)
+and peak memory (maximum resident size of the process). Results are
+compared against a stored baseline: a case is a regression when its
+throughput drops or its peak memory grows by more than the tolerance.
+
+Baselines depend on the machine and the corpus, so they are a local
+reference and are not committed (git ignores ``benchmarks/baseline.json``).
+Save one on the machine the comparisons run on, before the changes to
+measure, with the corpus settings the comparisons will use:
+
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --case log2json --case to-lower
+
+A baseline of another corpus (``--files``, ``--size-kb``) is not compared
+against. The exit code is 1 when a case regressed or failed, or when the
+baseline corpus differs.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import corpus
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+
+# Spec of the pipeline case, the usual cleanup of display.cfg dumps
+PIPELINE_SPEC = '''\
+remove-section -i "Tx64 display.cfg file.*\\n[*]+" -e "dlux header"
+remove-from-regex -r "number of" "noise" "[.][.][.]+"
+extract-section -i "dlux header" -e "[*]{25}" -t 1 -b 1
+'''
+
+# Name, corpus kind and command line of every case
+CASES = (
+    ('log2json', 'inventory',
+     ['dluxparser.log2json', '-d', '{input}', '-o', '{output}']),
+    ('log2json-legacy', 'inventory',
+     ['dluxparser.log2json', '-d', '{input}', '-o', '{output}',
+      '--engine', 'legacy']),
+    ('csv2json', 'csv',
+     ['dluxparser.csv2json', '--root-dir', '{input}']),
+    ('csv2json-columnar', 'csv',
+     ['dluxparser.csv2json', '--root-dir', '{input}', '--layout',
+      'columnar', '--infer-types']),
+    ('extract-section', 'shrink',
+     ['dluxparser.shrinker', 'extract-section', '-i', 'dlux header',
+      '-e', '[*]{25}', '-t', '1', '-b', '1', '-d', '{input}',
+      '-o', '{output}']),
+    ('remove-section', 'shrink',
+     ['dluxparser.shrinker', 'remove-section', '-i',
+      'Tx64 display.cfg file.*\\n[*]+', '-e', 'trailer', '-d', '{input}',
+      '-o', '{output}']),
+    ('remove-from-regex', 'shrink',
+     ['dluxparser.shrinker', 'remove-from-regex', '-r', 'number of',
+      'noise', '[.][.][.]+', '-d', '{input}', '-o', '{output}']),
+    ('remove-from-bottom', 'shrink',
+     ['dluxparser.shrinker', 'remove-from-bottom', '-n', '10',
+      '-d', '{input}', '-o', '{output}']),
+    ('to-lower', 'shrink',
+     ['dluxparser.shrinker', 'to-lower', '-d', '{input}',
+      '-o', '{output}']),
+    ('pipeline', 'shrink',
+     ['dluxparser.pipeline', '-d', '{input}', '-o', '{output}',
+      '-s', '{spec}']),
+)
+
+
+class ArgumentParser():
+    def __init__(self, args=None, parser=None):
+        desc = 'Benchmark the dluxparser commands on a synthetic corpus.'
+        if not parser:
+            parser = argparse.ArgumentParser(description=desc)
+        self.parser = parser
+
+        parser.add_argument(
+            "--case", metavar="<case>",
+            action='append', required=False, dest='cases', type=str,
+            choices=[case[0] for case in CASES],
+            help="Case to run, all of them if not given.")
+        parser.add_argument(
+            "--corpus-dir", metavar="<dir_name>",
+            action='store', required=False, dest='corpus_dir', type=str,
+            help="Keep the corpus on this folder, reused if it exists.")
+        parser.add_argument(
+            "--files", metavar="N",
+            action='store', required=False, dest='files', type=int,
+            default=10,
+            help="Number of files of each kind.")
+        parser.add_argument(
+            "--size-kb", metavar="N",
+            action='store', required=False, dest='size_kb', type=int,
+            default=256,
+            help="Approximate size of each file in KB.")
+        parser.add_argument(
+            "--repeat", metavar="N",
+            action='store', required=False, dest='repeat', type=int,
+            default=3,
+            help="Runs of each case, the best one is kept.")
+        parser.add_argument(
+            "--baseline", metavar="<file_name>",
+            action='store', required=False, dest='baseline', type=str,
+            default=BASELINE,
+            help="Baseline results of this machine to compare against.")
+        parser.add_argument(
+            "--save-baseline", action='store_true', required=False,
+            dest='save_baseline',
+            help="Store the results as the new baseline of this machine.")
+        parser.add_argument(
+            "--tolerance", metavar="<ratio>",
+            action='store', required=False, dest='tolerance', type=float,
+            default=0.25,
+            help="Change against the baseline taken as a regression.")
+
+    def parse_args(self, args):
+        return self.parser.parse_args(args=args)
+
+
+def measure(argv, env=None):
+    '''Run a command, return its (seconds, peak resident MB, exit code).'''
+    start = time.time()
+    process = subprocess.Popen(argv, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, env=env)
+    # wait4 gives the resource usage of this very process
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.time() - start
+    # Reaped here, not by Popen
+    process.returncode = status
+    code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    return seconds, usage.ru_maxrss / 1024.0, code
+
+
+def run_case(case, folders, workdir, repeat):
+    '''Best time and highest peak memory of running a case repeat times.'''
+    name, kind, command = case
+    files = sorted(glob.glob(os.path.join(folders[kind], '*')))
+    size = sum(os.path.getsize(path) for path in files)
+    spec = os.path.join(workdir, 'pipeline.spec')
+    with open(spec, 'w') as the_file:
+        the_file.write(PIPELINE_SPEC)
+
+    result = {'seconds': None, 'peak_mb': 0}
+    for _ in range(repeat):
+        output = os.path.join(workdir, 'output')
+        paths = {'{input}': folders[kind], '{output}': output,
+                 '{spec}': spec}
+        argv = [sys.executable, '-m'] + [paths.get(item, item)
+                                         for item in command]
+        seconds, peak, code = measure(argv)
+        # Outputs are not kept, csv2json writes them next to the inputs
+        shutil.rmtree(output, ignore_errors=True)
+        for path in glob.glob(os.path.join(folders[kind], '*.json*')):
+            os.remove(path)
+        if code:
+            return {'error': 'exit code %i' % code}
+        if result['seconds'] is None or seconds < result['seconds']:
+            result['seconds'] = seconds
+        result['peak_mb'] = max(result['peak_mb'], peak)
+
+    result['files'] = len(files)
+    result['mb'] = size / 1048576.0
+    result['mb_per_s'] = result['mb'] / result['seconds']
+    result['files_per_s'] = len(files) / result['seconds']
+    return result
+
+
+def compare(result, baseline, tolerance):
+    '''Describe a result against its baseline, and whether it regressed.'''
+    if 'error' in result:
+        return result['error'], True
+    if not baseline or 'error' in baseline:
+        return 'no baseline', False
+    speed = result['mb_per_s'] / baseline['mb_per_s']
+    memory = result['peak_mb'] / baseline['peak_mb']
+    regressed = speed < 1 - tolerance or memory > 1 + tolerance
+    note = 'speed x%.2f memory x%.2f' % (speed, memory)
+    return (note + ' REGRESSION') if regressed else note, regressed
+
+
+def main(opts=None):
+    opts = ArgumentParser().parse_args(opts)
+    settings = {'files': opts.files, 'size_kb': opts.size_kb}
+    cases = [case for case in CASES
+             if not opts.cases or case[0] in opts.cases]
+
+    baseline = {}
+    if os.path.exists(opts.baseline) and not opts.save_baseline:
+        with open(opts.baseline, 'r') as the_file:
+            baseline = json.load(the_file)
+        if baseline.get('corpus') != settings:
+            # Timings of another corpus tell nothing about this one
+            print("<-- Error: Baseline corpus %s differs from %s, run with "
+                  "the same --files and --size-kb or save a new baseline "
+                  "with --save-baseline" % (baseline.get('corpus'), settings))
+            return 1
+    elif not opts.save_baseline:
+        print("<-- Warning: No baseline found at %s, save one of this "
+              "machine with --save-baseline" % opts.baseline)
+
+    workdir = tempfile.mkdtemp(prefix='dluxparser-bench-')
+    try:
+        corpus_dir = opts.corpus_dir or os.path.join(workdir, 'corpus')
+        folders = dict((kind, os.path.join(corpus_dir, kind))
+                       for kind in corpus.KINDS)
+        if not all(os.path.isdir(folder) for folder in folders.values()):
+            folders = corpus.generate(corpus_dir, opts.files, opts.size_kb)
+
+        results = {}
+        regressions = 0
+        print("%-20s %6s %8s %8s %8s %8s %8s  %s" % (
+            'case', 'files', 'MB', 'seconds', 'MB/s', 'files/s',
+            'peak MB', 'baseline'))
+        for case in cases:
+            result = run_case(case, folders, workdir, opts.repeat)
+            results[case[0]] = result
+            note, regressed = compare(
+                result, baseline.get('results', {}).get(case[0]),
+                opts.tolerance)
+            regressions = regressions + regressed
+            if 'error' in result:
+                print("%-20s %s" % (case[0], note))
+                continue
+            print("%-20s %6i %8.2f %8.3f %8.2f %8.1f %8.1f  %s" % (
+                case[0], result['files'], result['mb'], result['seconds'],
+                result['mb_per_s'], result['files_per_s'],
+                result['peak_mb'], note))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if opts.save_baseline:
+        with open(opts.baseline, 'w') as the_file:
+            json.dump({'corpus': settings, 'results': results}, the_file,
+                      indent=4, sort_keys=True)
+            the_file.write('\n')
+        print("Baseline saved on %s" % opts.baseline)
+    if regressions:
+        print("%i of %i cases regressed." % (regressions, len(cases)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+startup benchmarks how long the dluxparser commands take to start.
+
+The CLI is run from cron and from per file shell loops, where starting
+the interpreter, importing the modules and building the command line
+parser can cost more than the work itself. Run cases parse a folder
+holding a single small file. Every case is run on a fresh
+python process, the best time of the repeats is kept, and compared against
+a stored baseline like the throughput cases of ``benchmarks.run``. The
+time of an empty interpreter is reported as a reference.
+
+Module cases report the import time python measures (``-X importtime``)
+for a dluxparser module, cliff included.
+
+The baseline is a local reference of the machine it was saved on, it is
+not committed (git ignores ``benchmarks/startup.json``):
+
+    python -m benchmarks.startup --save-baseline
+    python -m benchmarks.startup
+
+The exit code is 1 when a case regressed or failed.
+"""
+import argparse
+import functools
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import run
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'startup.json')
+
+# Name and arguments of python of every command case
+COMMANDS = (
+    ('python', ['-c', 'pass']),
+    ('version', ['-m', 'dluxparser.main', '--version']),
+    ('help', ['-m', 'dluxparser.main', '--help']),
+    ('log2json-help', ['-m', 'dluxparser.main', 'log2json', '--help']),
+    ('shrinker-help', ['-m', 'dluxparser.main', 'shrinker', 'to-lower',
+                       '--help']),
+    ('log2json-run', ['-m', 'dluxparser.main', 'log2json', '-d', '{input}',
+                      '-o', '{output}']),
+    ('to-lower-run', ['-m', 'dluxparser.main', 'shrinker', 'to-lower',
+                      '-d', '{input}', '-o', '{output}']),
+)
+
+# Modules whose import time is measured
+MODULES = ('dluxparser.main', 'dluxparser.log2json', 'dluxparser.csv2json',
+           'dluxparser.shrinker', 'dluxparser.pipeline')
+
+_IMPORT_TIME = re.compile(r'import time:\s*\d+ \|\s*(\d+) \| (\S+)$')
+
+
+class ArgumentParser():
+    def __init__(self, args=None, parser=None):
+        desc = 'Benchmark the startup time of the dluxparser commands.'
+        if not parser:
+            parser = argparse.ArgumentParser(description=desc)
+        self.parser = parser
+
+        parser.add_argument(
+            "--repeat", metavar="N",
+            action='store', required=False, dest='repeat', type=int,
+            default=10,
+            help="Runs of each case, the best one is kept.")
+        parser.add_argument(
+            "--baseline", metavar="<file_name>",
+            action='store', required=False, dest='baseline', type=str,
+            default=BASELINE,
+            help="Baseline results of this machine to compare against.")
+        parser.add_argument(
+            "--save-baseline", action='store_true', required=False,
+            dest='save_baseline',
+            help="Store the results as the new baseline of this machine.")
+        parser.add_argument(
+            "--tolerance", metavar="<ratio>",
+            action='store', required=False, dest='tolerance', type=float,
+            default=0.25,
+            help="Change against the baseline taken as a regression.")
+
+    def parse_args(self, args):
+        return self.parser.parse_args(args=args)
+
+
+def _environment():
+    '''Environment of the cases, bytecode is cached as once installed.'''
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def time_command(arguments, repeat, paths):
+    '''Best seconds of running python with arguments.'''
+    argv = [sys.executable] + [paths.get(item, item) for item in arguments]
+    times = []
+    for _ in range(repeat + 1):
+        shutil.rmtree(paths['{output}'], ignore_errors=True)
+        seconds, _, code = run.measure(argv, env=_environment())
+        if code:
+            return {'error': 'exit code %i' % code}
+        times.append(seconds)
+    # The first run writes the bytecode, it is not counted
+    return {'seconds': min(times[1:])}
+
+
+def time_import(module, repeat):
+    '''Best seconds python reports to import a module.'''
+    argv = [sys.executable, '-X', 'importtime', '-c', 'import ' + module]
+    times = []
+    for _ in range(repeat + 1):
+        process = subprocess.Popen(argv, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE,
+                                   env=_environment(),
+                                   universal_newlines=True)
+        _, err = process.communicate()
+        if process.returncode:
+            return {'error': 'exit code %i' % process.returncode}
+        for line in err.splitlines():
+            match = _IMPORT_TIME.match(line)
+            if match and match.group(2) == module:
+                times.append(int(match.group(1)) / 1000000.0)
+    return {'seconds': min(times[1:])}
+
+
+def compare(result, baseline, tolerance):
+    '''Describe a result against its baseline, and whether it regressed.'''
+    if 'error' in result:
+        return result['error'], True
+    if not baseline or 'error' in baseline:
+        return 'no baseline', False
+    ratio = result['seconds'] / baseline['seconds']
+    regressed = ratio > 1 + tolerance
+    note = 'time x%.2f' % ratio
+    return (note + ' REGRESSION') if regressed else note, regressed
+
+
+def main(opts=None):
+    opts = ArgumentParser().parse_args(opts)
+    baseline = {}
+    if os.path.exists(opts.baseline) and not opts.save_baseline:
+        with open(opts.baseline, 'r') as the_file:
+            baseline = json.load(the_file)
+    elif not opts.save_baseline:
+        print("<-- Warning: No baseline found at %s, save one of this "
+              "machine with --save-baseline" % opts.baseline)
+
+    workdir = tempfile.mkdtemp(prefix='dluxparser-startup-')
+    paths = {'{input}': os.path.join(workdir, 'input'),
+             '{output}': os.path.join(workdir, 'output')}
+    os.makedirs(paths['{input}'])
+    with open(os.path.join(paths['{input}'], 'host.log'), 'w') as the_file:
+        the_file.write('Hostname = alpha\nMemory 1 size = 16 GB\n')
+
+    cases = [(name, functools.partial(time_command, arguments, paths=paths))
+             for name, arguments in COMMANDS]
+    cases.extend(('import ' + module, functools.partial(time_import, module))
+                 for module in MODULES)
+
+    results = {}
+    regressions = 0
+    print("%-30s %8s  %s" % ('case', 'ms', 'baseline'))
+    try:
+        for name, case in cases:
+            result = case(opts.repeat)
+            results[name] = result
+            note, regressed = compare(result, baseline.get(name),
+                                      opts.tolerance)
+            regressions = regressions + regressed
+            if 'error' in result:
+                print("%-30s %s" % (name, note))
+                continue
+            print("%-30s %8.1f  %s" % (name, result['seconds'] * 1000, note))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if opts.save_baseline:
+        with open(opts.baseline, 'w') as the_file:
+            json.dump(results, the_file, indent=4, sort_keys=True)
+            the_file.write('\n')
+        print("Baseline saved on %s" % opts.baseline)
+    if regressions:
+        print("%i of %i cases regressed." % (regressions, len(cases)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
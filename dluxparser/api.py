@@ -0,0 +1,123 @@
+'''
+api is the library interface of dluxparser, to embed the parsers in other
+programs. It works on file objects or iterables of text lines and returns
+parsed data or streams of text, no file is read or written on its own.
+
+    from dluxparser import api
+
+    with open('inventory.log') as the_file:
+        data = api.log2json(the_file)
+
+    with open('table.csv') as the_file:
+        for record in api.csv_records(the_file):
+            ...
+
+    with open('display.log') as the_file:
+        chunks = api.extract_section(the_file, 'dlux', '[*]{25}',
+                                     remove_bottom=2)
+        chunks = api.remove_from_regex(chunks, ['number of', 'count'])
+        sys.stdout.writelines(chunks)
+
+Text inputs are file objects opened in text mode or iterables of text
+chunks (lines, or the chunks of any size a stream returned holds), so a
+stream returned can be given to the next function. The shrinker
+functions take a messages list where the messages the CLI would print
+(e.g. a section not found) are appended, they are dropped otherwise.
+Errors raise exceptions.
+'''
+import argparse
+import csv
+
+from dluxparser import csv2json as _csv2json
+from dluxparser import log2json as _log2json
+from dluxparser import shrinker as _shrinker
+from dluxparser import streams
+from dluxparser import workers
+
+
+def _chunks(lines):
+    '''Chunks of whole lines of a file object or an iterable of lines.'''
+    if hasattr(lines, 'read'):
+        return streams.read_chunks(lines)
+    return lines
+
+
+def _lines(lines):
+    '''Lines of a file object or an iterable of text chunks.'''
+    return streams.iter_lines(_chunks(lines))
+
+
+def log2json(lines, engine='line'):
+    '''Parse log lines, return the json data log2json writes for them.'''
+    args = argparse.Namespace(engine=engine)
+    return _log2json.Log2Json(args, folders=False).parse_text(_lines(lines))
+
+
+def csv_records(lines, delimiter=','):
+    '''Generator of a dictionary per csv row, keyed by the header.'''
+    return csv.DictReader(_lines(lines), delimiter=delimiter)
+
+
+def csv2json(lines, delimiter=',', format='json', layout='records',
+             infer_types=False):
+    '''Json text of csv lines as a stream of chunks.
+
+    format, layout and infer_types are the csv2json options of the same
+    name, the text is the one written to a json file.
+    '''
+    args = argparse.Namespace(delimiter=delimiter, format=format,
+                              layout=layout, infer_types=infer_types)
+    return _csv2json.Csv2Json(args, folders=False).convert(_lines(lines))
+
+
+def extract_section(lines, initstr, endstr, remove_top=0, remove_bottom=0,
+                    to_lower=False, messages=None):
+    '''Text from the initstr regex match to the endstr one, with
+       remove_top and remove_bottom more lines removed.'''
+    return _shrink(lines, messages, func='shrink', func2='extract',
+                   initstr=initstr, endstr=endstr, remove_top=remove_top,
+                   remove_bottom=remove_bottom, to_lower=to_lower)
+
+
+def remove_section(lines, initstr, endstr, to_lower=False, messages=None):
+    '''Text without the section from the initstr regex match to the endstr
+       one.'''
+    return _shrink(lines, messages, func='shrink', func2='remove',
+                   initstr=initstr, endstr=endstr, to_lower=to_lower)
+
+
+def remove_from_top(lines, number, messages=None):
+    '''Text without its first number lines.'''
+    return _shrink(lines, messages, func='remove_from', func2='top',
+                   number=number)
+
+
+def remove_from_bottom(lines, number, messages=None):
+    '''Text without its last number lines.'''
+    return _shrink(lines, messages, func='remove_from', func2='bottom',
+                   number=number)
+
+
+def remove_from_regex(lines, regexes, messages=None):
+    '''Text without the lines matching any of the regexes.'''
+    return _shrink(lines, messages, func='remove_from', func2='regex',
+                   regex=list(regexes))
+
+
+def to_lower(lines, messages=None):
+    '''Text in lower case.'''
+    return _shrink(lines, messages, func='to_lower')
+
+
+def _shrink(lines, messages, **options):
+    '''Stream lines through a shrinker sub-command.'''
+    stage = _shrinker.Shrinker(argparse.Namespace(**options), folders=False)
+
+    def chunks():
+        # Sections are searched when the first chunk is asked for
+        for chunk in stage.transform(_chunks(lines)):
+            yield chunk
+
+    if messages is None:
+        messages = []
+    return workers.collect(chunks(), messages)
@@ -0,0 +1,236 @@
+'''
+archives reads the files of tar and zip archives given as root folder and
+writes the outputs of a command into a folder or an archive, so bundles
+of logs are parsed with no extract step.
+
+    for member in archives.members('bundle.tar.gz'):
+        with member.open() as the_file:
+            ...
+
+Members are read one at a time in the order they are stored, tars
+(compressed or not) as a stream with no seek back. Only regular files
+are read, and a member which is itself compressed is decompressed while
+read, see ``compression``.
+
+An output folder named like an archive (``.zip``, ``.tar``, ``.tar.gz``,
+``.tgz``, ``.tar.bz2``, ``.tar.xz``...) is written as one. Each output is
+spooled until complete and then added at once, so a file failing leaves
+no partial member behind. An output named as one already written (e.g.
+the ones of ``boot.log`` and ``boot.log.gz``) fails, an archive can not
+hold both.
+
+Inputs and outputs of archives are streamed through the text functions of
+the commands by ``run_job``, one file at a time.
+'''
+import functools
+import io
+import locale
+import os
+import shutil
+import tempfile
+import time
+
+from dluxparser import compression
+from dluxparser import stats
+from dluxparser import streams
+from dluxparser import workers
+
+# Suffixes of the archives written, and the tarfile mode of each
+_TAR_MODES = (
+    ('.tar', 'w'),
+    ('.tar.gz', 'w:gz'),
+    ('.tgz', 'w:gz'),
+    ('.tar.bz2', 'w:bz2'),
+    ('.tbz2', 'w:bz2'),
+    ('.tar.xz', 'w:xz'),
+    ('.txz', 'w:xz'),
+)
+
+
+def is_archive(path):
+    '''Whether path is a tar or zip archive file.'''
+    if not os.path.isfile(path):
+        return False
+    # Imported on demand, most runs do not need them and they take a good
+    # share of the startup time
+    import tarfile
+    import zipfile
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+
+def is_archive_name(path):
+    '''Whether an output folder named path is written as an archive.'''
+    name = path.lower()
+    return name.endswith('.zip') or any(name.endswith(suffix)
+                                        for suffix, _ in _TAR_MODES)
+
+
+def modes(root_dir, output_dir):
+    '''(archive, streamed) of a run: whether root_dir is an archive, and
+       whether its files are read, or written, one at a time as archives
+       are. output_dir is None when outputs are not written into one.'''
+    archive = bool(root_dir) and is_archive(root_dir)
+    return archive, archive or bool(output_dir and
+                                    is_archive_name(output_dir))
+
+
+class Member(str):
+    '''A regular file of an archive.
+
+    It is named by the archive path joined to its name within it, so it
+    reads and is reported like a file path. size is its size in bytes.
+    '''
+
+    def __new__(cls, archive, name, size, opener):
+        member = super(Member, cls).__new__(cls, os.path.join(archive, name))
+        member.name = name
+        member.size = size
+        member._opener = opener
+        return member
+
+    def open(self):
+        '''Text stream of the member, decompressed if it is compressed.'''
+        return compression.open_binary(self._opener())
+
+
+def members(path):
+    '''Yield a Member per regular file of the archive at path, in the
+       order they are stored. A member must be read before the next one
+       is asked for.'''
+    import tarfile
+    import zipfile
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield Member(path, info.filename, info.file_size,
+                                 functools.partial(archive.open, info))
+        return
+
+    with tarfile.open(path, 'r|*') as archive:
+        for info in archive:
+            if info.isfile():
+                yield Member(path, info.name, info.size,
+                             functools.partial(_tar_member, archive, info))
+
+
+def _tar_member(archive, info):
+    '''Buffered binary stream of a member of a tar read as a stream.'''
+    return io.BufferedReader(_Reader(archive.extractfile(info)))
+
+
+class _Reader(io.RawIOBase):
+    '''Raw reader over a member of a tar read as a stream, whose file
+       object can not tell whether it is seekable.'''
+
+    def __init__(self, the_file):
+        self._file = the_file
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_output(path, compress=None):
+    '''Folder or Archive writing outputs into path.'''
+    if not is_archive_name(path):
+        return Folder(path, compress)
+    if compress:
+        raise Exception("Archive members are not compressed, name the "
+                        "archive .tar.gz, .tar.bz2 or .tar.xz instead.")
+    return Archive(path)
+
+
+class Folder(object):
+    '''Write outputs as the files of a folder, compressed with compress if
+       given.'''
+
+    def __init__(self, path, compress=None):
+        self.path = path
+        self.compress = compress
+
+    def write(self, path, chunks):
+        '''Write a stream of text chunks into the file at path.'''
+        workers.write_chunks(path, chunks, self.compress)
+
+    def close(self):
+        pass
+
+
+class Archive(object):
+    '''Write outputs as the members of a tar or zip archive.
+
+    Outputs are named by their path within the folder the archive stands
+    for, the text is encoded as files opened in text mode do. Writing a
+    name twice raises an exception.
+    '''
+
+    def __init__(self, path):
+        import tarfile
+        import zipfile
+        self.path = path
+        self._zip = self._tar = None
+        self._names = set()
+        name = path.lower()
+        if name.endswith('.zip'):
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+            return
+        for suffix, mode in _TAR_MODES:
+            if name.endswith(suffix):
+                self._tar = tarfile.open(path, mode)
+
+    def write(self, path, chunks):
+        '''Write a stream of text chunks as the member at path.'''
+        import tarfile
+        import zipfile
+        name = os.path.relpath(path, self.path)
+        if name in self._names:
+            raise Exception("%s is already in %s, written from another "
+                            "input." % (name, self.path))
+        encoding = locale.getpreferredencoding(False)
+        with tempfile.SpooledTemporaryFile(
+                max_size=streams.SPOOL_SIZE) as spool:
+            for chunk in chunks:
+                with stats.timer('write'):
+                    spool.write(chunk.encode(encoding))
+            size = spool.tell()
+            spool.seek(0)
+            with stats.timer('write'):
+                if self._zip is not None:
+                    info = zipfile.ZipInfo(name, time.localtime()[:6])
+                    info.file_size = size
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with self._zip.open(info, 'w') as the_file:
+                        shutil.copyfileobj(spool, the_file)
+                else:
+                    info = tarfile.TarInfo(name)
+                    info.size = size
+                    info.mtime = time.time()
+                    info.mode = 0o644
+                    self._tar.addfile(info, spool)
+        self._names.add(name)
+        stats.written(path, size)
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+
+
+def run_job(func, output, job):
+    '''Write into output the text chunks func returns for the chunks of
+       an input file or archive member. job is its (origin, output path)
+       pair.'''
+    origin, path = job
+    if isinstance(origin, Member):
+        the_file = origin.open()
+    else:
+        the_file = compression.open_text(origin)
+    with the_file:
+        chunks = stats.timed('read', streams.read_chunks(the_file))
+        output.write(path, workers.not_empty(func(chunks), path))
@@ -0,0 +1,20 @@
+'''
+cli holds the base class of the commands dluxparser provides.
+'''
+from cliff import command
+
+
+class Command(command.Command):
+    '''A command built in dluxparser.'''
+
+    def run(self, parsed_args):
+        # The -q/--quiet of cliff takes the flag wherever it is given, the
+        # command one is set from it
+        if (getattr(self.app_args, 'verbose_level', None) == 0 and
+                hasattr(parsed_args, 'quiet')):
+            parsed_args.quiet = True
+        return super(Command, self).run(parsed_args)
+
+    def get_epilog(self):
+        # A built in command, skip the lookup of the package providing it
+        return self._epilog or ''
@@ -0,0 +1,127 @@
+'''
+compression reads and writes text files compressed with gzip, bz2 or xz.
+
+Inputs are recognized by their first bytes, whatever their name, and
+decompressed while they are read, so compressed trees are parsed with no
+copy of them on disk. Outputs are compressed while written when asked for.
+
+    with compression.open_text('boot.log.gz') as the_file:
+        for line in the_file:
+            ...
+
+    with compression.open_text('boot.json.xz', 'w', 'xz') as the_file:
+        the_file.write(text)
+
+Output names drop the suffix of a compressed input and get the suffix of
+their own compression, see ``output_name``. The compression modules are
+imported when a file needs them, they are not part of the startup time.
+'''
+import importlib
+import io
+
+# Compressions supported, in the order they are looked for
+FORMATS = ('gzip', 'bz2', 'xz')
+
+# First bytes of a file of each compression
+_MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+}
+
+# Bytes read to recognize a compression
+_MAGIC_SIZE = max(len(magic) for magic in _MAGIC.values())
+
+# Suffix of the file names of each compression
+SUFFIXES = {
+    'gzip': '.gz',
+    'bz2': '.bz2',
+    'xz': '.xz',
+}
+
+# Module providing open() for each compression
+_MODULES = {
+    'gzip': 'gzip',
+    'bz2': 'bz2',
+    'xz': 'lzma',
+}
+
+
+def add_arguments(parser):
+    '''Add the --compress option of the outputs to an argparse parser.'''
+    parser.add_argument(
+        "--compress", metavar="<format>",
+        action='store', required=False, dest='compress', type=str,
+        choices=FORMATS,
+        help="Compress the output file(s): 'gzip', 'bz2' or 'xz'.")
+
+
+def detect_bytes(head):
+    '''Compression of a file starting with head bytes, None if plain.'''
+    for kind in FORMATS:
+        if head.startswith(_MAGIC[kind]):
+            return kind
+    return None
+
+
+def detect(name):
+    '''Compression of a file by its first bytes, None if plain.'''
+    with open(name, 'rb') as the_file:
+        return detect_bytes(the_file.read(_MAGIC_SIZE))
+
+
+def open_text(name, mode='r', kind=None):
+    '''Open a text file, decompressing it when read or compressing it
+       with kind when written.'''
+    if 'r' in mode:
+        kind = detect(name)
+    if not kind:
+        return open(name, mode)
+    return _module(kind).open(name, mode + 't')
+
+
+def open_stream(the_file, mode='r', kind=None):
+    '''Text stream over an open text file (e.g. the standard input or
+       output), read through the compression its first bytes show or
+       written compressed with kind.'''
+    binary = getattr(the_file, 'buffer', None)
+    if binary is None:
+        return the_file
+    if 'r' in mode:
+        kind = None
+        if hasattr(binary, 'peek'):
+            kind = detect_bytes(binary.peek(_MAGIC_SIZE)[:_MAGIC_SIZE])
+    if not kind:
+        return the_file
+    return _module(kind).open(binary, mode + 't')
+
+
+def open_binary(binary):
+    '''Text stream of a binary stream supporting peek, read through the
+       compression its first bytes show.'''
+    kind = detect_bytes(binary.peek(_MAGIC_SIZE)[:_MAGIC_SIZE])
+    if not kind:
+        return io.TextIOWrapper(binary)
+    return _module(kind).open(binary, 'rt')
+
+
+def plain_name(name):
+    '''File name without the suffix of a compression.'''
+    for suffix in SUFFIXES.values():
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def output_name(name, kind=None):
+    '''Name of the output of a file, with the suffix of kind.'''
+    return plain_name(name) + SUFFIXES.get(kind, '')
+
+
+def _module(kind):
+    '''Module with the open() of a compression.'''
+    try:
+        return importlib.import_module(_MODULES[kind])
+    except ImportError:
+        raise Exception("%s compression is not available on this python."
+                        % kind)
@@ -2,18 +2,86 @@
 csv2json is a parser to transform a csv file into json
 
 Arguments:
-- ``--file | -f``: The csv file name to be transformed
+- ``--file | -f``: The csv file name to be transformed, ``-`` reads the
+  standard input and writes the json to the standard output
+- ``--root-dir``: Instead of a single file, transform every ``.csv`` file
+  within this directory and its sub-folders. A tar or zip archive (e.g. a
+  ``.tar.gz`` bundle) is read member by member, with no extract step
+- ``--output-dir | -o``: With ``--root-dir``, save the json files into
+  this directory instead of next to their csv file. Named like an archive
+  (``.zip``, ``.tar``, ``.tar.gz``, ``.tar.bz2``, ``.tar.xz``) they are
+  written into a new archive. Needed to transform an archive
+- ``--jobs | -j``: Number of files transformed in parallel on
+  ``--root-dir``, defaults to 1. Use 0 for all available CPUs
+- ``--pool``: Run parallel jobs on a ``process`` (default) or ``thread``
+  pool
 - ``--delimiter | -d``: The delimiter of csv file, defaults to ','
+- ``--batch-size | -b``: Number of rows encoded per write, defaults to 1000
+- ``--format``: ``json`` (default) writes a json array, ``jsonl`` writes
+  one json object per line (JSON Lines)
+- ``--split-rows``: Start a new numbered part file every N rows
+- ``--split-bytes``: Start a new numbered part file before a part grows
+  over N bytes
+- ``--layout``: ``records`` (default) writes an object per row,
+  ``rows`` writes ``{"columns": [...], "data": [[values...], ...]}`` and
+  ``columnar`` writes ``{"columns": [...], "data": {column: [values...]}}``
+- ``--infer-types``: With ``rows`` or ``columnar`` layouts, turn columns
+  holding only integers, numbers or true/false into json numbers and
+  booleans; empty values become null. Columns with a number too large for
+  a float, like ``1e400``, are kept as strings
+- ``--quiet | -q``: On ``--root-dir``, print only the files with errors and
+  a progress line every few seconds, instead of a line per file
+- ``--stats``: On ``--root-dir``, report the time spent reading, parsing
+  and writing, the bytes read and written, the throughput, the peak memory
+  and the slowest files
+- ``--stats-json``: Save those statistics into a json file
+- ``--compress``: Compress the json files with ``gzip``, ``bz2`` or ``xz``,
+  their names get its suffix
+- ``--include``, ``--exclude``, ``--max-size``, ``--skip-hidden``,
+  ``--largest-first``: On ``--root-dir``, select the csv files by globs,
+  size or hidden name, and transform the largest first. See ``scanner``
+
+Json files are written next to their csv file, unless ``--output-dir`` is
+given. Archives, read or written, are transformed one file at a time and
+their json files can not be split.
+Csv files compressed with gzip, bz2 or xz, recognized by their first bytes,
+are decompressed while read, ``table.csv.gz`` is written as ``table.json``.
+Rows are streamed from the csv file into the json file, memory use does
+not depend on the size of the input file.
+The ``columnar`` layout, and the ``rows`` layout with ``--infer-types``,
+keep the table in memory as one list per column, they can not be split.
+Fields beyond the header are dropped on these layouts.
+When splitting, parts are named ``<file>.00001.json``, ``<file>.00002.json``
+and so on. Every part is a complete json (or jsonl) file and it shows up
+under its final name only once it has been fully written, so consumers can
+load parts while the conversion is still running.
 '''
 
 import argparse
 import csv
+import functools
 import json
+import math
 import os
+import re
+import shutil
 
-from cliff import command
 from datetime import datetime
 
+from dluxparser import archives
+from dluxparser import cli
+from dluxparser import compression
+from dluxparser import scanner
+from dluxparser import stats
+from dluxparser import streams
+from dluxparser import workers
+
+# Values recognized when inferring column types, numbers follow the json
+# grammar so values like zip codes with leading zeros are kept as strings
+_INT = re.compile(r'-?(0|[1-9][0-9]*)$')
+_FLOAT = re.compile(r'-?(0|[1-9][0-9]*)([.][0-9]+)?([eE][-+]?[0-9]+)?$')
+_BOOLS = {'true': True, 'false': False}
+
 
 class ArgumentParser():
     def __init__(self, args=None, parser=None):
@@ -24,15 +92,62 @@ class ArgumentParser():
         self.parser = parser
 
         # Add arguments
-        parser.add_argument(
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument(
             "-f", "--file", metavar="<file_name>",
-            action='store', required=True, dest='csvfile', type=str,
+            action='store', dest='csvfile', type=str,
             help="The directory where file is stored.")
+        group.add_argument(
+            "--root-dir", metavar="<dir_name>",
+            action='store', dest='root_dir', type=str,
+            help="The root directory where csv file(s) are stored.")
+        parser.add_argument(
+            "-o", "--output-dir", metavar="<dir_name>",
+            action='store', required=False, dest='output_dir', type=str,
+            help="Folder or archive where json file(s) are saved")
+        workers.add_arguments(parser)
+        parser.add_argument(
+            "--pool", metavar="<pool>",
+            action='store', required=False, dest='pool', type=str,
+            choices=('process', 'thread'), default='process',
+            help="Parallel jobs run on 'process' (default) or 'thread' pool")
         parser.add_argument(
             "-d", "--delimiter", metavar="<delimiter>",
             action='store', required=False, dest='delimiter', type=str,
             default=',',
             help="Delimiter of csv file - defaults to ','")
+        parser.add_argument(
+            "-b", "--batch-size", metavar="<rows>",
+            action='store', required=False, dest='batch_size', type=int,
+            default=1000,
+            help="Number of rows encoded per write - defaults to 1000")
+        parser.add_argument(
+            "--format", metavar="<format>",
+            action='store', required=False, dest='format', type=str,
+            choices=('json', 'jsonl'), default='json',
+            help="Output format: 'json' array (default) or 'jsonl' lines")
+        parser.add_argument(
+            "--split-rows", metavar="N",
+            action='store', required=False, dest='split_rows', type=int,
+            default=0,
+            help="Write numbered part files of at most N rows")
+        parser.add_argument(
+            "--split-bytes", metavar="N",
+            action='store', required=False, dest='split_bytes', type=int,
+            default=0,
+            help="Write numbered part files of at most N bytes")
+        parser.add_argument(
+            "--layout", metavar="<layout>",
+            action='store', required=False, dest='layout', type=str,
+            choices=('records', 'rows', 'columnar'), default='records',
+            help="Output layout: 'records' (default), 'rows' or 'columnar'")
+        parser.add_argument(
+            "--infer-types", required=False,
+            action='store_true', dest='infer_types',
+            help="Turn numeric and true/false columns into json types")
+        stats.add_arguments(parser)
+        compression.add_arguments(parser)
+        scanner.add_arguments(parser)
         parser.set_defaults(func='parse')
 
     def parse_args(self, args):
@@ -42,26 +157,245 @@ class ArgumentParser():
 class Csv2Json(object):
     '''This class is to transform a csv input file into a json file'''
 
-    def __init__(self, args):
+    def __init__(self, args, folders=True):
         self.args = args
-        if not os.path.isfile(args.csvfile):
+        self.root_dir = getattr(args, 'root_dir', None)
+        self.output_dir = getattr(args, 'output_dir', None)
+        self.archive, self.streamed = archives.modes(
+            self.root_dir if folders else None, self.output_dir)
+        # Converting text only there are no files to check
+        if folders and self.root_dir:
+            if not self.archive and not os.path.isdir(self.root_dir):
+                raise Exception("You must provide a valid root folder.")
+            if self.archive and not self.output_dir:
+                raise Exception("An output folder or archive is needed to "
+                                "transform an archive.")
+        elif folders and args.csvfile != '-' and (
+                not os.path.isfile(args.csvfile)):
             raise Exception("You must provide a valid file.")
-        self.csvfile = os.path.abspath(args.csvfile)
-        self.jsonfile = os.path.splitext(args.csvfile)[0] + '.json'
+        if folders and self.output_dir and not self.root_dir:
+            raise Exception("An output folder can only be given with "
+                            "--root-dir.")
+        self.format = getattr(args, 'format', 'json')
         self.delimiter = args.delimiter
+        self.batch_size = max(1, getattr(args, 'batch_size', 1000))
+        self.split_rows = getattr(args, 'split_rows', 0)
+        self.split_bytes = getattr(args, 'split_bytes', 0)
+        self.layout = getattr(args, 'layout', 'records')
+        self.infer_types = getattr(args, 'infer_types', False)
+        self.compress = getattr(args, 'compress', None)
+        if self.layout == 'columnar' and (
+                self.format == 'jsonl' or self.split_rows or
+                self.split_bytes):
+            raise Exception("Columnar layout can not be written as jsonl "
+                            "nor split into parts.")
+        if self.infer_types and self.layout == 'records':
+            raise Exception("Types can only be inferred with the rows or "
+                            "columnar layouts.")
+        if self.streamed and (self.split_rows or self.split_bytes):
+            raise Exception("Json files of archives can not be split into "
+                            "parts.")
 
     def parse(self):
-        '''Main function to parse input csv file into json'''
-        with open(self.csvfile, 'r') as csvfile:
-            reader = csv.DictReader(csvfile, delimiter=self.delimiter)
-            out = json.dumps([row for row in reader])
-            with open(self.jsonfile, 'w+') as jsonfile:
-                jsonfile.write(out)
-        return self.jsonfile
+        '''Main function to parse input csv file(s) into json'''
+        if self.root_dir:
+            return self._parse_dir()
+        if self.args.csvfile == '-':
+            return workers.run_stdio(self.convert, compress=self.compress)
+        return '\n'.join(self._parse_file(self.args.csvfile))
+
+    def convert(self, lines):
+        '''Json of csv lines as a stream of text chunks, the text written
+           to a json file when it is not split.'''
+        head, separator, tail, records = self._document(lines)
+        yield head
+        for index, record in enumerate(records):
+            yield separator + record if index else record
+        yield tail
+
+    def _parse_dir(self):
+        '''Transform all csv files within root_dir on a pool of workers.'''
+        if self.output_dir:
+            self._make_output_dir()
+        # Get files
+        jobs, files, processes = workers.schedule(
+            self._walk(), self.streamed, getattr(self.args, 'jobs', 1))
+        func = self._parse_file
+        writer = None
+        if self.streamed:
+            writer = archives.open_output(self.output_dir, self.compress)
+            func = functools.partial(self._stream_file, writer)
+
+        # Process files, results come back in the same order
+        report = stats.Report(self.args)
+        outcomes = workers.imap(report.wrap(func), jobs, processes,
+                                chunksize=scanner.chunksize(self.args),
+                                threads=getattr(self.args, 'pool',
+                                                'process') == 'thread')
+        for csvfile, (files, error) in zip(files, outcomes):
+            files = report.add(csvfile, files, error)
+            if error:
+                report.show(["%i. Parsing file: %s" % (report.count, csvfile),
+                             "<-- Error: Unable to parse file %s: %s" %
+                             (csvfile, error)])
+            else:
+                report.show(["%i. Parsed file: %s -> %s" %
+                             (report.count, csvfile, ', '.join(files))])
+
+        if writer:
+            writer.close()
+        report.close()
+        print("Found %i files." % report.count)
+        if report.errors:
+            print("Failed to parse %i of %i files." %
+                  (report.errors, report.count))
+            return 1
+
+    def _make_output_dir(self):
+        '''Create output folder if exists back it up.'''
+        if os.path.exists(self.output_dir):
+            shutil.move(self.output_dir, self.output_dir + '.bk.' +
+                        datetime.now().isoformat())
+        if not archives.is_archive_name(self.output_dir):
+            os.makedirs(self.output_dir)
+
+    def _walk(self):
+        '''Yield every csv file (or archive member) within root_dir.'''
+        if self.archive:
+            files = scanner.members(self.root_dir, self.args)
+        else:
+            files = scanner.files(self.root_dir, self.args)
+        for csvfile in files:
+            name = compression.plain_name(os.path.basename(csvfile))
+            if name.lower().endswith('.csv'):
+                yield csvfile
+
+    def _json_name(self, csvfile):
+        '''Path of the json file of a csv file.'''
+        jsonfile = (os.path.splitext(compression.plain_name(csvfile))[0] +
+                    '.' + self.format)
+        if self.output_dir:
+            jsonfile = os.path.join(self.output_dir,
+                                    os.path.basename(jsonfile))
+        return jsonfile
+
+    def _stream_file(self, writer, csvfile):
+        '''Transform a csv file into writer, return the json file name.'''
+        jsonfile = compression.output_name(self._json_name(csvfile),
+                                           self.compress)
+        archives.run_job(
+            lambda chunks: self.convert(streams.iter_lines(chunks)),
+            writer, (csvfile, jsonfile))
+        return [jsonfile]
+
+    def _parse_file(self, csvfile):
+        '''Transform a csv file, return the name of the json file(s).'''
+        jsonfile = self._json_name(csvfile)
+        with compression.open_text(csvfile) as the_file:
+            head, separator, tail, records = self._document(
+                stats.lines(the_file))
+            writer = workers.JsonWriter(jsonfile, head, separator, tail,
+                                        split_rows=self.split_rows,
+                                        split_bytes=self.split_bytes,
+                                        batch_size=self.batch_size,
+                                        compress=self.compress)
+            with writer:
+                for record in records:
+                    writer.write(record)
+        return writer.files
+
+    def _document(self, lines):
+        '''Head, records separator, tail and stream of encoded records of
+           the json of csv lines.'''
+        if self.layout == 'records':
+            reader = csv.DictReader(lines, delimiter=self.delimiter)
+            return self._records(reader)
+        reader = csv.reader(lines, delimiter=self.delimiter)
+        return self._table(reader)
+
+    def _records(self, rows, columns=None):
+        '''Json document of rows.
+
+        Rows are encoded as records, or as lists under the given columns
+        for the rows layout. A json array of records written this way is
+        the same as json.dumps of the whole list of rows.
+        '''
+        encode = json.JSONEncoder().encode
+        if self.format == 'jsonl':
+            head = encode(columns) + '\n' if columns is not None else ''
+            return head, '', '', (encode(row) + '\n' for row in rows)
+        if columns is not None:
+            head = '{"columns": %s, "data": [' % encode(columns)
+            return head, ', ', ']}', (encode(row) for row in rows)
+        return '[', ', ', ']', (encode(row) for row in rows)
+
+    def _table(self, reader):
+        '''Json document of the rows or columnar layouts.'''
+        columns = next(reader, [])
+        rows = self._table_rows(reader, len(columns))
+        if self.layout == 'rows' and not self.infer_types:
+            return self._records(rows, columns)
+
+        # Collect the table column wise in a single pass
+        data = [[] for _ in columns]
+        appends = [values.append for values in data]
+        for row in rows:
+            for append, value in zip(appends, row):
+                append(value)
+        if self.infer_types:
+            data = [self._convert(values) for values in data]
+
+        if self.layout == 'rows':
+            return self._records(zip(*data), columns)
+
+        encode = json.JSONEncoder().encode
+        head = '{"columns": %s, "data": {' % encode(columns)
+        return head, ', ', '}}', ('%s: %s' % (encode(column), encode(values))
+                                  for column, values in zip(columns, data))
+
+    def _table_rows(self, reader, width):
+        '''Rows as lists of width values, missing values are None.'''
+        for row in reader:
+            # Skip blank rows as csv.DictReader does
+            if not row:
+                continue
+            if len(row) < width:
+                row = row + [None] * (width - len(row))
+            yield row[:width]
+
+    def _convert(self, values):
+        '''Convert a column of strings to the json type they all share.'''
+        kind = None
+        for value in values:
+            if not value:
+                continue
+            if value.lower() in _BOOLS:
+                found = bool
+            elif _INT.match(value):
+                found = int
+            elif _FLOAT.match(value):
+                # Infinity is no json number
+                if math.isinf(float(value)):
+                    return values
+                found = float
+            else:
+                return values
+            if kind is None or kind is found:
+                kind = found
+            elif {kind, found} == {int, float}:
+                kind = float
+            else:
+                return values
+
+        if kind is None:
+            return values
+        if kind is bool:
+            return [_BOOLS[v.lower()] if v else None for v in values]
+        return [kind(v) if v else None for v in values]
 
 
 # CLIFF CLI CREATOR CLASS - GENERIC
-class CliffCsv2Json(command.Command):
+class CliffCsv2Json(cli.Command):
     '''Parse csv files into json format'''
 
     def get_parser(self, prog_name):
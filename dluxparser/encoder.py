@@ -0,0 +1,102 @@
+'''
+encoder turns parsed data into json text as a stream of chunks, so outputs
+are written while encoded instead of built whole first.
+
+    with open('boot.json', 'w') as the_file:
+        for chunk in encoder.iterencode(data, 'compact'):
+            the_file.write(chunk)
+
+Two styles are written: ``pretty``, indented by 4 spaces (the text of
+``json.dumps(data, indent=4)``), and ``compact``, with no whitespace at
+all, about half the size and faster to encode. Compact json is encoded
+with orjson when it is installed, with the standard library otherwise.
+Both give the same text: orjson writes non ASCII characters as they are
+where the standard library escapes them, so the rare text holding any is
+encoded again by the standard library.
+
+A dictionary is encoded a member at a time, each with the one shot
+encoder, as the incremental one of the standard library is a much slower
+pure python one. Members are joined into chunks of about CHUNK_SIZE
+characters.
+'''
+import json
+
+from dluxparser import streams
+
+# Layouts of the json text
+STYLES = ('pretty', 'compact')
+
+# Standard library encoder of each style
+_ENCODERS = {
+    'pretty': json.JSONEncoder(indent=4),
+    'compact': json.JSONEncoder(separators=(',', ':')),
+}
+
+# orjson module once looked for, False if it is not installed
+_orjson = None
+
+
+def _fast():
+    '''orjson module, None if it is not installed.'''
+    global _orjson
+    if _orjson is None:
+        # Imported on demand, it is not part of the startup time
+        try:
+            import orjson
+        except ImportError:
+            orjson = False
+        _orjson = orjson
+    return _orjson or None
+
+
+def encode(data, style='pretty'):
+    '''Json text of data in style, at once.'''
+    if style == 'compact':
+        fast = _fast()
+        if fast is not None:
+            text = fast.dumps(
+                data, option=fast.OPT_NON_STR_KEYS).decode('utf-8')
+            if text.isascii():
+                return text
+    return _ENCODERS[style].encode(data)
+
+
+def iterencode(data, style='pretty'):
+    '''Json text of data in style as a stream of chunks.'''
+    return _join(_members(data, style))
+
+
+def _members(data, style):
+    '''Json text of data in pieces, one per member of a dictionary with
+       text keys, as the parsers give.'''
+    if (not isinstance(data, dict) or not data or
+            not all(isinstance(key, str) for key in data)):
+        yield encode(data, style)
+        return
+
+    pretty = style == 'pretty'
+    separator = '{'
+    for key, value in data.items():
+        if pretty:
+            # Members are one level deep, json strings hold no new lines
+            yield (separator + '\n    ' + encode(key, style) + ': ' +
+                   encode(value, style).replace('\n', '\n    '))
+        else:
+            yield separator + encode(key, style) + ':' + encode(value, style)
+        separator = ','
+    yield '\n}' if pretty else '}'
+
+
+def _join(pieces, size=streams.CHUNK_SIZE):
+    '''Join text pieces into chunks of about size characters.'''
+    chunk = []
+    length = 0
+    for piece in pieces:
+        chunk.append(piece)
+        length = length + len(piece)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield ''.join(chunk)
@@ -49,8 +49,56 @@ Arguments
 ---------
 
 * ``--root-dir, -d``: The parent directory where files to be parsed live.
-  Folder can contain sub-folders.
-* ``--output-dir, -o``: The directory where parsed files will live.
+  Folder can contain sub-folders. ``-`` reads a single file from the
+  standard input and writes its json to the standard output. A tar or zip
+  archive (e.g. a ``.tar.gz`` bundle) is read member by member, with no
+  extract step.
+* ``--output-dir, -o``: The directory where parsed files will live. Named
+  like an archive (``.zip``, ``.tar``, ``.tar.gz``, ``.tar.bz2``,
+  ``.tar.xz``) the json files are written into a new archive. Archives,
+  read or written, are parsed one file at a time and can not be parsed
+  incrementally.
+* ``--engine``: (Optional) The parsing engine, ``line`` (default) works on
+  whole lines with precompiled patterns, ``legacy`` runs the original
+  per-character state machine. Both produce the same json.
+* ``--jobs, -j``: (Optional) Number of worker processes to parse files in
+  parallel, defaults to 1. Use 0 for all available CPUs.
+* ``--incremental``: (Optional) Reuse the output folder and only parse the
+  files which are new or changed since the last run, outputs of deleted
+  files are removed. A manifest in the output folder keeps track of them.
+* ``--quiet, -q``: (Optional) Print only the files with errors, and a
+  progress line every few seconds, instead of a line per file.
+* ``--stats``: (Optional) Report the time spent reading, parsing and writing,
+  the bytes read and written, the throughput, the peak memory and the
+  slowest files.
+* ``--stats-json``: (Optional) Save those statistics into a json file.
+* ``--compress``: (Optional) Compress the json files with ``gzip``, ``bz2``
+  or ``xz``, their names get its suffix.
+* ``--json-style``: (Optional) Layout of the json files, ``pretty``
+  (default) indented by 4 spaces or ``compact`` with no whitespace, about
+  half the size and faster to write. Compact json is encoded with orjson
+  when it is installed.
+* ``--output-mode``: (Optional) ``files`` (default) writes a json file per
+  input, ``ndjson`` appends a record per input, ``{"id": <path>, ...}``
+  with its path relative to the root folder, as a line of compact json
+  into ``records.ndjson``.
+* ``--split-rows``: (Optional) With ndjson, start a new numbered records
+  file every N records.
+* ``--split-bytes``: (Optional) With ndjson, start a new numbered records
+  file before one grows over N bytes.
+* ``--offset-index``: (Optional) With ndjson, write next to every records
+  file an ``.idx`` file with a line per record: its byte offset, its length
+  and its id separated by tabs, to read a record back with a seek.
+* ``--sink``: (Optional) Also load the parsed data into a database, given
+  as ``sqlite:<path>``: a row per value with its file, feature, element
+  index and key, so the whole tree is queried at once. Files parsed again
+  replace their rows. See ``sinks``.
+* ``--index``: (Optional) Load the parsed data into an index within the
+  output folder instead, which ``dluxparser query`` searches. Kept up to
+  date by ``--incremental`` runs.
+* ``--include``, ``--exclude``, ``--max-size``, ``--skip-hidden``,
+  ``--largest-first``: (Optional) Select the files to process by globs,
+  size or hidden name, and process the largest first. See ``scanner``.
 
 Usage
 -----
@@ -58,38 +106,116 @@ Usage
 log2json takes a parent folder which may contain sub-folders and
 transforms all available files - notice expected input sintaxis above -
 into json format.
+Files compressed with gzip, bz2 or xz, recognized by their first bytes, are
+decompressed while read, ``boot.log.gz`` is written as ``boot.json``.
+
+Large trees are better written as ndjson, no file is created per input and
+records are written in batches. Records files are named
+``records.00001.ndjson``, ``records.00002.ndjson`` and so on when split,
+they show up under their final name once complete. Ndjson outputs are
+written into a folder and can not be written incrementally.
 """
 import argparse
+import functools
+import locale
 import os
 import re
 import shutil
-import json
 
-from cliff import command
 from datetime import datetime
 
+from dluxparser import archives
+from dluxparser import cli
+from dluxparser import compression
+from dluxparser import encoder
+from dluxparser import manifest
+from dluxparser import scanner
+from dluxparser import sinks
+from dluxparser import stats
+from dluxparser import streams
+from dluxparser import workers
+
+# Precompiled patterns used by the parsing engines
+_GARBAGE = re.compile(r'[^\x00-\x7f]+')
+_MARKER = re.compile(r'[0-9=]')
+_DIGITS = re.compile(r'[0-9]*')
+_ALL_DIGITS = re.compile(r'[0-9]+')
+_FIRST_WHITESPACE = re.compile(r'\s')
+
+# Name of the records file of the ndjson output mode
+RECORDS_FILE = 'records.ndjson'
+
 
 class ArgumentParser():
-    def __init__(self, args=None, parser=None):
+    def __init__(self, args=None, parser=None, common=True):
         desc = ('log2json transform a text or log file to json. '
                 'See expected input sintaxis on the documentation')
         if not parser:
             parser = argparse.ArgumentParser(description=desc)
         self.parser = parser
 
-        # Add arguments
+        # Add arguments, pipeline stages take the ones shaping the json only
+        if common:
+            parser.add_argument(
+                "-d", "--root-dir", metavar="<dir_name>",
+                action='store', required=True, dest='root_dir', type=str,
+                help="The root directory where text file(s) are stored.")
+            parser.add_argument(
+                "-o", "--output-dir", metavar="<dir_name>",
+                action='store', required=False, dest='output_dir', type=str,
+                default='ParsedFiles',
+                help="The directory where parsed file(s) will be saved.")
         parser.add_argument(
-            "-d", "--root-dir", metavar="<dir_name>",
-            action='store', required=True, dest='root_dir', type=str,
-            help="The root directory where text file(s) are stored.")
+            "--engine", metavar="<engine>",
+            action='store', required=False, dest='engine', type=str,
+            choices=('line', 'legacy'), default='line',
+            help="Parsing engine: 'line' (default) or 'legacy'.")
         parser.add_argument(
-            "-o", "--output-dir", metavar="<dir_name>",
-            action='store', required=False, dest='output_dir', type=str,
-            default='ParsedFiles',
-            help="The directory where parsed file(s) will be saved.")
+            "--json-style", metavar="<style>",
+            action='store', required=False, dest='json_style', type=str,
+            choices=encoder.STYLES, default='pretty',
+            help="Json layout: 'pretty' (default) or 'compact'.")
+        if common:
+            self.add_common_args(parser)
 
         parser.set_defaults(func='parse')
 
+    def add_common_args(self, parser):
+        '''Arguments of the log2json command, not of pipeline stages.'''
+        workers.add_arguments(parser)
+        parser.add_argument(
+            "--incremental", action='store_true', required=False,
+            help="Only parse files new or changed since the last run.")
+        stats.add_arguments(parser)
+        compression.add_arguments(parser)
+        parser.add_argument(
+            "--output-mode", metavar="<mode>",
+            action='store', required=False, dest='output_mode', type=str,
+            choices=('files', 'ndjson'), default='files',
+            help="A json file per input (default) or 'ndjson' records.")
+        parser.add_argument(
+            "--split-rows", metavar="N",
+            action='store', required=False, dest='split_rows', type=int,
+            default=0,
+            help="Write numbered ndjson files of at most N records.")
+        parser.add_argument(
+            "--split-bytes", metavar="N",
+            action='store', required=False, dest='split_bytes', type=int,
+            default=0,
+            help="Write numbered ndjson files of at most N bytes.")
+        parser.add_argument(
+            "--offset-index", action='store_true', required=False,
+            dest='offset_index',
+            help="Write the offset of every ndjson record into a file.")
+        parser.add_argument(
+            "--sink", metavar="<kind:path>",
+            action='store', required=False, dest='sink', type=str,
+            help="Also load the parsed data into 'sqlite:<path>'.")
+        parser.add_argument(
+            "--index", action='store_true', required=False,
+            help="Index the parsed data for the query command.")
+        scanner.add_arguments(parser)
+
     def parse_args(self, args):
         return self.parser.parse_args(args=args)
 
@@ -98,70 +224,350 @@ class Log2Json():
 
     SPECIAL_WORDS = ('front', 'power')
 
-    def __init__(self, args):
+    def __init__(self, args, folders=True):
         self.args = args
-        if not os.path.isdir(args.root_dir):
+        self.ndjson = getattr(args, 'output_mode', 'files') == 'ndjson'
+        self.sink = getattr(args, 'sink', None)
+        # A pipeline stage only parses text, it has no folders
+        if not folders:
+            return
+        if not self.ndjson and (args.split_rows or args.split_bytes or
+                                args.offset_index):
+            raise Exception("Only ndjson outputs can be split or indexed.")
+        if self.ndjson and args.offset_index and args.compress:
+            raise Exception("Compressed ndjson files can not be indexed.")
+
+        # Standard input is written to the standard output
+        if args.root_dir == '-':
+            if getattr(args, 'incremental', False):
+                raise Exception("Standard input can not be parsed "
+                                "incrementally.")
+            if args.sink or args.index:
+                raise Exception("Standard input can not be loaded into a "
+                                "sink nor indexed.")
+            return
+        if args.sink:
+            sinks.parse_spec(args.sink)
+        if args.index:
+            if args.sink or archives.is_archive_name(args.output_dir):
+                raise Exception("The index is written into the output "
+                                "folder, it can not be used with --sink "
+                                "nor an archive.")
+            self.sink = 'sqlite:' + os.path.join(args.output_dir,
+                                                 sinks.INDEX_NAME)
+
+        self.archive, self.streamed = archives.modes(args.root_dir,
+                                                     args.output_dir)
+        if not self.archive and not os.path.isdir(args.root_dir):
             raise Exception("You must provide a valid root folder.")
+        if self.streamed and getattr(args, 'incremental', False):
+            raise Exception("Archives can not be parsed incrementally.")
+        if self.ndjson and (args.incremental or
+                            archives.is_archive_name(args.output_dir)):
+            raise Exception("Ndjson outputs are written into a folder and "
+                            "can not be written incrementally.")
 
         output_dir = args.output_dir
         if os.path.abspath(args.root_dir) == os.path.abspath(output_dir):
             raise Exception("Input and Output folders must be different.")
 
-        # Create output folder if exists back it up
+    def _make_output_dir(self):
+        '''Create output folder if exists back it up, unless reused.'''
+        output_dir = self.args.output_dir
+        if getattr(self.args, 'incremental', False):
+            if not os.path.isdir(output_dir):
+                os.makedirs(output_dir)
+            return
         if os.path.exists(output_dir):
             shutil.move(output_dir, output_dir + '.bk.' +
                         datetime.now().isoformat())
-        os.makedirs(output_dir)
+        if not archives.is_archive_name(output_dir):
+            os.makedirs(output_dir)
 
     def parse(self):
         '''Main function to parse input log files into json'''
-        # Get and process files
-        count = 0
-        for root, _, files in os.walk(self.args.root_dir):
-            for filename in files:
-                origin = os.path.join(root, filename)
-                fname = os.path.splitext(filename)[0]
-                output = os.path.join(self.args.output_dir, fname + '.json')
-                count = count + 1
-
-                # Parse data
-                print("%i. Parsing file: %s" % (count, origin))
-                data = self._parse(origin)
-                self._write_to_file(output, json.dumps(data, indent=4))
+        if self.args.root_dir == '-':
+            if self.ndjson:
+                return workers.run_stdio(
+                    lambda the_file: [self._record(
+                        '-', self.parse_text(the_file))],
+                    compress=self.args.compress)
+            return workers.run_stdio(
+                lambda the_file: self.encode(self.parse_text(the_file)),
+                compress=self.args.compress)
+        self._make_output_dir()
+        # Both engines give the same json, incremental runs write files
+        inputs = manifest.load(self.args, ignore=(
+            'engine', 'output_mode', 'split_rows', 'split_bytes',
+            'offset_index'))
+
+        # Get files
+        jobs, files, processes = workers.schedule(
+            self._walk(inputs), self.streamed, getattr(self.args, 'jobs', 1))
+        writer = records = sink = None
+        if self.ndjson:
+            # Records come back in order and are appended in batches
+            func = self._parse_record
+            records = workers.JsonWriter(
+                os.path.join(self.args.output_dir, RECORDS_FILE),
+                split_rows=self.args.split_rows,
+                split_bytes=self.args.split_bytes,
+                compress=self.args.compress, index=self.args.offset_index)
+        else:
+            writer = archives.open_output(self.args.output_dir,
+                                          self.args.compress)
+            func = functools.partial(self._parse_file, writer)
+        if self.sink:
+            # Rows come back with the outcome of every file
+            sink = sinks.open_sink(self.sink)
+
+        # Process files, results come back in the same order
+        report = stats.Report(self.args)
+        outcomes = workers.imap(report.wrap(func), jobs, processes,
+                                chunksize=scanner.chunksize(self.args))
+        for (origin, output), (outcome, error) in zip(files, outcomes):
+            outcome = report.add(origin, outcome, error)
+            lines = ["%i. Parsing file: %s" % (report.count, origin)]
+            name = os.path.relpath(origin, self.args.root_dir)
+            if error:
+                lines.append("<-- Error: Unable to parse file %s: %s" %
+                             (origin, error))
+                if inputs:
+                    inputs.forget(name)
+                if sink:
+                    sink.forget(name)
+            else:
+                record, rows = outcome
+                if records:
+                    records.write(record, name)
+                if sink:
+                    sink.add(name, rows)
+                if inputs:
+                    inputs.record(name, origin, [os.path.basename(output)])
+            report.show(lines)
+
+        if writer:
+            writer.close()
+        if records:
+            records.close()
+        if sink:
+            if inputs:
+                for name in inputs.deleted():
+                    sink.forget(name)
+            sink.close()
+        if inputs:
+            inputs.close()
+        report.close()
+        if report.errors:
+            print("Failed to parse %i of %i files." %
+                  (report.errors, report.count))
+            return 1
+
+    def _walk(self, inputs=None):
+        '''Yield the (origin, output) pair of every file in root_dir, only
+           the changed ones if a manifest of inputs is given.'''
+        if self.archive:
+            for member in scanner.members(self.args.root_dir, self.args):
+                yield member, self._output(os.path.basename(member.name))
+            return
+        for origin in scanner.files(self.args.root_dir, self.args):
+            name = os.path.relpath(origin, self.args.root_dir)
+            if inputs and not inputs.changed(name, origin):
+                continue
+            yield origin, self._output(os.path.basename(origin))
+
+    def _output(self, filename):
+        '''Path of the json output of an input file name.'''
+        fname = os.path.splitext(compression.plain_name(filename))[0]
+        fname = compression.output_name(fname + '.json', self.args.compress)
+        return os.path.join(self.args.output_dir, fname)
+
+    def _parse_file(self, writer, job):
+        '''Parse an input file or archive member and write its json output
+           with writer. Return no record and its sink rows.'''
+        origin, output = job
+        data, rows = self._parse_input(origin)
+        writer.write(output, self.encode(data))
+        return None, rows
+
+    def _parse_record(self, job):
+        '''Parse an input file or archive member, return its ndjson record
+           and its sink rows.'''
+        origin, _ = job
+        data, rows = self._parse_input(origin)
+        record = self._record(os.path.relpath(origin, self.args.root_dir),
+                              data)
+        # Written as text files are, by the main process
+        stats.written(origin, len(record.encode(
+            locale.getpreferredencoding(False))))
+        return record, rows
+
+    def _parse_input(self, origin):
+        '''Parse an input file or archive member, return its json data and
+           its sink rows, None with no sink.'''
+        if isinstance(origin, archives.Member):
+            with origin.open() as the_file:
+                content = self._parse_text(stats.lines(the_file))
+        else:
+            content = self._parse(origin)
+        rows = None
+        if self.sink:
+            rows = list(self._rows(content))
+        return self._compact(content), rows
+
+    def _record(self, name, data):
+        '''Ndjson line of the parsed data of the input file name.'''
+        record = {'id': name}
+        record.update(data)
+        # The id is first and wins over a feature of the same name
+        record['id'] = name
+        return encoder.encode(record, 'compact') + '\n'
+
+    def encode(self, data):
+        '''Json text of parsed data, in the selected style, as a stream of
+           chunks.'''
+        return encoder.iterencode(data,
+                                  getattr(self.args, 'json_style', 'pretty'))
 
     # #### Internal methods - To be used by the subcommands #####
     def _get_content(self, name):
-        '''Get the content from a file or from stream.'''
-        if os.path.exists(name):
-            the_file = open(name, 'r')
+        '''Get the content from a file.'''
+        with stats.timer('read'):
+            the_file = compression.open_text(name)
             content = the_file.read()
             the_file.close()
-        else:
-            content = name
         return content
 
-    def _locate_match(self, name, pattern):
-        '''Locate a string patern within a file or stream.'''
-        content = self._get_content(name)
+    def _locate_match(self, content, pattern):
+        '''Locate a string patern within a text.'''
         return re.split(pattern, content, 1)
 
-    def _write_to_file(self, file_name, plain_content):
-        '''Writes a given text into a file.'''
-        if not plain_content:
-            print("<-- Error: Empty processed data for file %s" % file_name)
-            plain_content = " "
-
-        the_file = open(file_name, "w")
-        the_file.write(plain_content)
-        the_file.close()
-
     def _trim_plus_underscore(self, mystr):
-        mystr = mystr.strip()
-        mystr = re.sub(r"\s+", '_', mystr)
-        return mystr
+        # Same as stripping and replacing \s+ runs with '_'
+        return '_'.join(mystr.split())
 
     def _parse(self, name):
-        content = self._get_content(name)
+        '''Parse a file with the selected engine, not compacted yet.'''
+        if getattr(self.args, 'engine', 'line') == 'legacy':
+            return self._parse_legacy(self._get_content(name))
+        with compression.open_text(name) as the_file:
+            return self._parse_lines(stats.lines(the_file))
+
+    def parse_text(self, lines):
+        '''Parse text lines into json with the selected engine.'''
+        return self._compact(self._parse_text(lines))
+
+    def _parse_text(self, lines):
+        '''Parse text lines with the selected engine, not compacted yet.'''
+        if getattr(self.args, 'engine', 'line') == 'legacy':
+            return self._parse_legacy(''.join(lines))
+        return self._parse_lines(lines)
+
+    def _split_feature(self, text):
+        '''Split the text before '=' into a feature and a key.
+
+        First word becomes the feature, the rest becomes the key.
+        Features on SPECIAL_WORDS take the second word as well.
+        '''
+        key = ''
+        aux = _FIRST_WHITESPACE.split(text.strip(), 1)
+        feature = self._trim_plus_underscore(aux[0])
+        if feature.lower() in self.SPECIAL_WORDS and len(aux) > 1:
+            # Special case for front panel and power supply
+            aux = _FIRST_WHITESPACE.split(aux[1], 1)
+            feature = feature + '_' + self._trim_plus_underscore(aux[0])
+        if len(aux) > 1:
+            key = self._trim_plus_underscore(aux[1])
+        return feature, key
+
+    def _parse_lines(self, lines):
+        '''Line oriented engine, same outcome as the legacy state machine.
+
+        Each line is split on the first digit or '=' it holds:
+        - digit: text before it is the feature, the following digits the
+          element number and the text up to '=' the key (digits dropped).
+          Lines with no '=' after the digit are ignored.
+        - '=': first word is the feature, the rest is the key.
+        The text after '=' is the value. Lines with neither a digit nor '='
+        are carried over as the beginning of the next line's feature.
+        '''
+        json_content = {}
+        carry = []
+
+        for line in lines:
+            # Ignore garbage characters
+            if not line.isascii():
+                line = _GARBAGE.sub('', line)
+            if line.endswith('\n'):
+                line = line[:-1]
+
+            match = _MARKER.search(line)
+            if match is None:
+                carry.append(line + '\n')
+                continue
+
+            head = line[:match.start()]
+            if carry:
+                head = ''.join(carry) + head
+                carry = []
+            rest = line[match.end():]
+
+            if match.group() == '=':
+                feature, key = self._split_feature(head)
+                nElement = ''
+                value = rest
+            else:
+                feature = self._trim_plus_underscore(head)
+                digits = _DIGITS.match(rest)
+                nElement = match.group() + digits.group()
+                key, equal, value = rest[digits.end():].partition('=')
+                if not equal:
+                    # If line is truncated, ignore feature
+                    continue
+                key = self._trim_plus_underscore(_ALL_DIGITS.sub('', key))
+
+            value = self._trim_plus_underscore(value)
+            if value:
+                self._add_value(json_content, feature, nElement, key, value)
+
+        return json_content
+
+    def _add_value(self, json_content, feature, nElement, key, value):
+        '''Insert {key, value} or value alone on nElement index.'''
+        jcf = json_content.setdefault(feature, [])
+        index = int(nElement) if nElement.isdigit() else 1
+
+        while index + 1 > len(jcf):
+            jcf.append({})
+
+        if key:
+            jcf[index][key] = value
+        else:
+            jcf[index] = value
+
+    def _rows(self, json_content):
+        '''Yield a (feature, element, key, value) row per value of parsed
+           data not compacted yet, key is empty for values with no key.'''
+        for feature, elements in json_content.items():
+            for index, element in enumerate(elements):
+                if isinstance(element, dict):
+                    for key, value in element.items():
+                        yield feature, index, key, value
+                else:
+                    yield feature, index, '', element
+
+    def _compact(self, json_content):
+        '''Remove empty elements and unwrap single element lists.'''
+        for key in json_content.keys():
+            # Remove empty dictionaries
+            json_content[key] = list(filter(None, json_content[key]))
+            if len(json_content[key]) == 1:
+                # if list has only one element remove the list
+                json_content[key] = json_content[key][0]
+
+        return json_content
+
+    def _parse_legacy(self, content):
         # Make sure last line is parsed correctly
         if content[len(content) - 1] != '\n':
             content = content + '\n'
@@ -185,8 +591,8 @@ class Log2Json():
         for char_ in content:
             # Verify it is not garbage if so, ignore
             try:
-                char_.decode('utf-8')
-            except e:
+                char_.encode('ascii')
+            except UnicodeError:
                 continue
 
             if state == 0:
@@ -254,28 +660,19 @@ class Log2Json():
                 else:
                     value = value + char_
 
-        for key in json_content.keys():
-            # Remove empty dictionaries
-            json_content[key] = filter(None, json_content[key])
-            if len(json_content[key]) == 1:
-                # if list has only one element remove the list
-                json_content[key] = json_content[key][0]
-
         return json_content
 
-    def _remove_lines_r(self, name, regex):
+    def _remove_lines_r(self, content, regex):
         '''Remove the lines that match a given regex.'''
-        content = self._get_content(name)
-        count = len(content.split('\n'))
-        for r in regex:
-            content = re.sub('.*'+r+'.*\n', '', content)
-        count = count - len(content.split('\n'))
-        print('Removed %i lines.' % count)
+        matcher = streams.LineMatcher(regex)
+        hits = [0] * len(matcher.patterns)
+        content = ''.join(streams.filter_lines([content], matcher, hits))
+        print('Removed %i lines.' % sum(hits))
         return content
 
 
 # CLIFF CLI CREATOR CLASS
-class CliffLog2Json(command.Command):
+class CliffLog2Json(cli.Command):
     '''Parse text or log files into json format'''
 
     def get_parser(self, prog_name):
@@ -1,9 +1,98 @@
+import argparse
+import importlib
 import logging
 import sys
 
 from cliff import app
 from cliff import commandmanager
-from pbr import version as vr
+
+# Commands of the dluxparser.cm entry points, looked up here instead of
+# scanning the installed packages metadata. Keep both lists in sync.
+COMMANDS = {
+    'shrinker': 'dluxparser.shrinker:CliffShrinker',
+    'log2json': 'dluxparser.log2json:CliffLog2Json',
+    'csv2json': 'dluxparser.csv2json:CliffCsv2Json',
+    'pipeline': 'dluxparser.pipeline:CliffPipeline',
+    'query': 'dluxparser.query:CliffQuery',
+}
+
+_version = None
+
+
+def version():
+    '''Version of the installed package, looked up once.'''
+    global _version
+    if _version is None:
+        # pbr scans the packages metadata, only done for --version
+        from pbr import version as vr
+        _version = vr.VersionInfo('dluxparser').version_string_with_vcs()
+    return _version
+
+
+class LazyCommand(object):
+    '''Entry point like object importing its command module on load.'''
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def load(self):
+        module, cls = self.value.split(':')
+        return getattr(importlib.import_module(module), cls)
+
+
+class CommandManager(commandmanager.CommandManager):
+    '''Commands from the COMMANDS table, modules are imported only when
+       their command runs. The ones other packages register on the entry
+       points are looked up only for a name not in the table, or when all
+       the commands are listed.'''
+
+    def load_commands(self, namespace):
+        self.group_list.append(namespace)
+        self._plugins = False
+        for name, value in COMMANDS.items():
+            self.commands[name] = LazyCommand(name, value)
+
+    def __iter__(self):
+        self._load_plugins()
+        return super(CommandManager, self).__iter__()
+
+    def find_command(self, argv):
+        try:
+            return super(CommandManager, self).find_command(argv)
+        except ValueError:
+            if not self._load_plugins():
+                raise
+            return super(CommandManager, self).find_command(argv)
+
+    def _load_plugins(self):
+        '''Add the commands of the entry points of every namespace, scanning
+           the installed packages metadata. Return False if already done.'''
+        if self._plugins:
+            return False
+        self._plugins = True
+        plugins = commandmanager.CommandManager(
+            None, self.convert_underscores,
+            ignored_modules=self.ignored_modules)
+        for namespace in self.group_list:
+            plugins.load_commands(namespace)
+        for name, entry_point in plugins.commands.items():
+            # Commands of the table keep their lazy entry
+            self.commands.setdefault(name, entry_point)
+        return True
+
+
+class VersionAction(argparse.Action):
+    '''--version looking the version up only when given.'''
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help=None):
+        super(VersionAction, self).__init__(
+            option_strings=option_strings, dest=dest, default=default,
+            nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        parser.exit(message='%s %s\n' % (app.App.NAME, version()))
 
 
 class ParserMainApp(app.App):
@@ -13,11 +102,23 @@ class ParserMainApp(app.App):
     def __init__(self):
         super(ParserMainApp, self).__init__(
             description='Dlux CLI to parse a file into a different format.',
-            version=vr.VersionInfo('dluxparser').version_string_with_vcs(),
-            command_manager=commandmanager.CommandManager('dluxparser.cm'),
+            version=None,
+            command_manager=CommandManager('dluxparser.cm'),
             deferred_help=True,
             )
 
+    def build_option_parser(self, description, version,
+                            argparse_kwargs=None):
+        # Replace the --version of cliff with a lazy one
+        argparse_kwargs = dict(argparse_kwargs or {},
+                               conflict_handler='resolve')
+        parser = super(ParserMainApp, self).build_option_parser(
+            description, version, argparse_kwargs)
+        parser.add_argument(
+            '--version', action=VersionAction,
+            help="show program's version number and exit")
+        return parser
+
     def initialize_app(self, argv):
         self.log.debug('Initializing parser application')
 
@@ -0,0 +1,181 @@
+'''
+manifest records the input files a command processed into an output
+folder, so later ``--incremental`` runs only process what changed.
+
+The manifest is a json file within the output folder holding the options
+which shape the outputs and, per input file (by its path relative to the
+root folder), its size, modification time, sha256 and the outputs written
+from it:
+
+    {
+        "options": {"func": "parse", "root_dir": "/data/logs"},
+        "files": {
+            "host1/boot.log": {
+                "size": 1024,
+                "mtime": 1516924800.0,
+                "sha256": "9f86d081...",
+                "outputs": ["boot.json"]
+            }
+        }
+    }
+
+An input is unchanged when its size and mtime match; when only the mtime
+differs its content hash decides. Inputs are not read again to be hashed
+when processed: the hash is taken when a run finds an input touched and
+kept for the next runs, ``sha256`` is null until then.
+Runs with other options start over, and remove the outputs of the
+previous run they do not write again, so those of inputs deleted
+meanwhile are not left behind.
+'''
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.dluxparser-manifest.json'
+
+# Options which do not change the outputs, or which select the inputs:
+# inputs left out are dropped as deleted ones
+_IGNORED = ('output_dir', 'inline', 'incremental', 'jobs', 'quiet', 'stats',
+            'stats_json', 'include', 'exclude', 'max_size', 'skip_hidden',
+            'largest_first')
+
+# Bytes hashed at once
+_BLOCK_SIZE = 1024 * 1024
+
+
+def command_options(args, ignore=()):
+    '''Options of a parsed command line which shape its outputs.'''
+    options = {}
+    for key, value in vars(args).items():
+        if key in _IGNORED or key in ignore:
+            continue
+        if key == 'root_dir':
+            value = os.path.abspath(value)
+        if value is None or isinstance(value, (str, int, float, list)):
+            options[key] = value
+    return options
+
+
+def load(args, ignore=()):
+    '''Manifest of the output folder for --incremental runs, else None.'''
+    if not getattr(args, 'incremental', False):
+        return None
+    inputs = Manifest(args.output_dir, command_options(args, ignore))
+    if inputs.reset:
+        print("Options changed since the last run, parsing all files.")
+    return inputs
+
+
+def file_hash(path):
+    '''sha256 hex digest of a file content.'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as the_file:
+        for block in iter(lambda: the_file.read(_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest(object):
+    '''Inputs processed into an output folder and the options used.
+
+    reset tells whether a manifest written with other options was found,
+    all the inputs are then processed again and its outputs not written
+    again are removed on close. unchanged counts the inputs
+    found not to need it.
+    '''
+
+    def __init__(self, output_dir, options):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.options = options
+        self.files = {}
+        self.reset = False
+        self.unchanged = 0
+        self._seen = set()
+        # Content hashes taken by changed, kept by record
+        self._digests = {}
+        # Inputs of a manifest written with other options
+        self._previous = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as the_file:
+                content = json.load(the_file)
+            if content.get('options') == options:
+                self.files = content.get('files', {})
+            else:
+                self._previous = content.get('files', {})
+                self.reset = True
+
+    def changed(self, name, path):
+        '''Whether the input at path, named name, has to be processed.'''
+        self._seen.add(name)
+        entry = self.files.get(name)
+        stat = os.stat(path)
+        if entry is None or entry['size'] != stat.st_size:
+            return True
+        # Touched, the content tells
+        if entry['mtime'] != stat.st_mtime:
+            digest = self._digests[name] = file_hash(path)
+            if entry.get('sha256') != digest:
+                return True
+            entry['mtime'] = stat.st_mtime
+        self.unchanged = self.unchanged + 1
+        return False
+
+    def record(self, name, path, outputs):
+        '''Keep an input processed into outputs, relative to output_dir.
+           Its content hash is the one changed took, if any.'''
+        stat = os.stat(path)
+        self.files[name] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': self._digests.pop(name, None),
+            'outputs': outputs,
+        }
+
+    def forget(self, name):
+        '''Drop an input, it is processed again on the next run.'''
+        self.files.pop(name, None)
+
+    def deleted(self):
+        '''Names of the inputs not seen on this run, the ones of a manifest
+           reset included.'''
+        names = set(self.files).union(self._previous)
+        return sorted(name for name in names if name not in self._seen)
+
+    def remove_deleted(self):
+        '''Drop the inputs not seen on this run and remove their outputs,
+           and the outputs of a manifest reset, but the ones some input
+           still writes. Return the names of the inputs dropped.
+        '''
+        deleted = self.deleted()
+        kept = set()
+        for name in self._seen:
+            kept.update(self.files.get(name, {}).get('outputs', []))
+        outputs = set()
+        for name in deleted:
+            outputs.update(self.files.pop(name, {}).get('outputs', []))
+        # Written with other options, by inputs seen or not
+        for entry in self._previous.values():
+            outputs.update(entry.get('outputs', []))
+        self._previous = {}
+        for output in sorted(outputs - kept):
+            path = os.path.join(self.output_dir, output)
+            if os.path.exists(path):
+                os.remove(path)
+        return deleted
+
+    def close(self):
+        '''Remove the outputs of deleted inputs, save the manifest and
+           report the files left untouched.'''
+        deleted = self.remove_deleted()
+        self.save()
+        print("Skipped %i unchanged files." % self.unchanged)
+        if deleted:
+            print("Removed outputs of %i deleted files." % len(deleted))
+
+    def save(self):
+        '''Write the manifest, replacing the previous one at once.'''
+        content = {'options': self.options, 'files': self.files}
+        with open(self.path + '.tmp', 'w') as the_file:
+            json.dump(content, the_file, indent=4, sort_keys=True)
+        os.rename(self.path + '.tmp', self.path)
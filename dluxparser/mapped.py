@@ -0,0 +1,131 @@
+'''
+mapped searches regexes on the bytes of a memory mapped text file.
+
+The file is not decoded to find a match, the regex is compiled to bytes
+and run on the mapped file, so locating a section costs a scan of the
+file with no copy of it. Only the text finally needed is read.
+
+Offsets on the bytes must be the offsets on the text read in text mode,
+so only files with no carriage returns (which universal newlines would
+turn into '\\n') and an UTF-8 or ASCII locale encoding can be mapped.
+Some regex items match differently on bytes than on decoded text (e.g.
+'.' on a multibyte character), patterns using them are searched only on
+files holding plain ASCII text, see ``BytesPattern``.
+'''
+import codecs
+import locale
+import mmap
+import os
+import re
+
+from dluxparser import streams
+
+# Bytes matched alike by any text regex item: ASCII but the separators
+# \s matches only on text
+_PLAIN = bytes(bytearray(c for c in range(128) if not 0x1c <= c <= 0x1f))
+
+# Escapes matching differently on bytes than on text
+_TEXT_ESCAPES = 'wWsSdDbBx0123456789'
+
+# Items which depend on the text before the position a search starts
+_ANCHORS = ('^', '\\A', '\\b', '\\B', '(?<')
+
+# Split a pattern in single characters, escapes and the items above
+_ITEMS = re.compile(r'\\.|\[\^|\(\?<|.', re.S)
+
+
+def encoding():
+    '''Encoding used to read text files, None if bytes offsets on it are
+       not text offsets.'''
+    name = codecs.lookup(locale.getpreferredencoding(False)).name
+    if name in ('utf-8', 'ascii'):
+        return name
+    return None
+
+
+def map_text(the_file):
+    '''Map a text file opened in binary mode, None if it can not be.'''
+    if not encoding() or not os.fstat(the_file.fileno()).st_size:
+        return None
+    data = mmap.mmap(the_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if data.find(b'\r') >= 0:
+        data.close()
+        return None
+    return data
+
+
+def is_plain(data, size=streams.CHUNK_SIZE):
+    '''Whether all bytes of data are matched alike by text regexes.'''
+    for start in range(0, len(data), size):
+        if data[start:start + size].translate(None, _PLAIN):
+            return False
+    return True
+
+
+def compile_bytes(pattern):
+    '''BytesPattern for a text pattern, None if it can not be one.
+
+    Patterns with groups are not compiled, re.split returns them with the
+    text around the match.
+    '''
+    try:
+        item = BytesPattern(pattern)
+    except (re.error, UnicodeError):
+        return None
+    if item.groups:
+        return None
+    return item
+
+
+class BytesPattern(object):
+    '''A text regex pattern searched on bytes.
+
+    plain tells whether the pattern finds on bytes the same matches it
+    finds on the decoded text of any file, otherwise it can only be used
+    on files where is_plain is True. anchored tells whether it depends on
+    the text before the search position, so it must search from the
+    start. Patterns with no metacharacters are looked up with find.
+    '''
+
+    def __init__(self, pattern):
+        self._regex = re.compile(pattern.encode('utf-8'))
+        self.groups = self._regex.groups
+        self._literal = None
+        if not streams.is_regex(pattern):
+            self._literal = pattern.encode('utf-8')
+
+        items = _ITEMS.findall(pattern)
+        self.anchored = any(item in _ANCHORS for item in items)
+        self.plain = not (
+            re.compile(pattern).flags & re.IGNORECASE or
+            any(ord(char) > 127 for char in pattern) or
+            any(item in ('.', '[^') or
+                (item[0] == '\\' and item[1:] in _TEXT_ESCAPES)
+                for item in items))
+
+    def search(self, data, pos=0):
+        '''(start, end) of the first match from pos on, None if none.'''
+        if self._literal is not None:
+            start = data.find(self._literal, pos)
+            if start < 0:
+                return None
+            return start, start + len(self._literal)
+        match = self._regex.search(data, pos)
+        if not match:
+            return None
+        return match.span()
+
+
+def read_ranges(data, ranges, size=streams.CHUNK_SIZE):
+    '''Decoded text of the (start, end) byte ranges of data, as a stream
+       of chunks of whole lines.'''
+    name = encoding()
+    for start, end in ranges:
+        while start < end:
+            stop = min(start + size, end)
+            if stop < end:
+                # Cut after a newline, never inside a character
+                newline = data.find(b'\n', stop - 1, end)
+                stop = end if newline < 0 else newline + 1
+            yield data[start:stop].decode(name)
+            start = stop
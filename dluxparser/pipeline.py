@@ -0,0 +1,270 @@
+"""
+pipeline runs a chain of shrinker sub-commands, optionally followed by
+log2json, on every file of a folder. Each file is read once and streamed
+through all the stages in memory, only the outcome of the last stage is
+written.
+
+Spec file sintaxis:
+
+    # Comments and blank lines are skipped
+    shrinker remove-section -i "[*][*][*]+" -e "Tx64 display.cfg file.*\\n[*]+"
+    extract-section -i "dlux" -e "[*][*][*]+" --remove-from-bottom 2 -l
+    remove-from-regex -r "number of" "present" "count" "[.][.][.]+"
+    log2json
+
+One stage per line, written as its command line with shell quoting. The
+leading ``shrinker`` is optional and the folder arguments (``--root-dir``,
+``--output-dir``, ``--inline``, ``--jobs``, ``--compress``) are not accepted
+on stages.
+``log2json`` can only be the last stage, it takes ``--engine`` and
+``--json-style`` as the log2json command does.
+
+Arguments
+---------
+
+* ``--root-dir, -d``: The parent directory where files to be parsed live.
+  Folder can contain sub-folders. ``-`` reads a single file from the
+  standard input and writes the outcome to the standard output, messages
+  go to the standard error. A tar or zip archive (e.g. a ``.tar.gz``
+  bundle) is read member by member, with no extract step.
+* ``--output-dir, -o``: The directory where parsed files will live. Named
+  like an archive (``.zip``, ``.tar``, ``.tar.gz``, ``.tar.bz2``,
+  ``.tar.xz``) the parsed files are written into a new archive. Archives,
+  read or written, are parsed one file at a time.
+* ``--spec, -s``: The file listing the stages.
+* ``--jobs, -j``: (Optional) Number of worker processes to parse files in
+  parallel, defaults to 1. Use 0 for all available CPUs.
+* ``--quiet, -q``: (Optional) Print only the files with errors, and a
+  progress line every few seconds, instead of a line per file.
+* ``--stats``: (Optional) Report the time spent reading, parsing and writing,
+  the bytes read and written, the throughput, the peak memory and the
+  slowest files.
+* ``--stats-json``: (Optional) Save those statistics into a json file.
+* ``--compress``: (Optional) Compress the output files with ``gzip``,
+  ``bz2`` or ``xz``, their names get its suffix.
+* ``--include``, ``--exclude``, ``--max-size``, ``--skip-hidden``,
+  ``--largest-first``: (Optional) Select the files to process by globs,
+  size or hidden name, and process the largest first. See ``scanner``.
+
+Usage
+-----
+
+pipeline takes a parent folder which may contain sub-folders and writes
+each file, after going through all the stages, into the output folder.
+With a log2json last stage the outputs are json files.
+Files compressed with gzip, bz2 or xz, recognized by their first bytes, are
+decompressed while read and their outputs drop the compression suffix.
+"""
+import argparse
+import functools
+import os
+import shlex
+import shutil
+
+from datetime import datetime
+
+from dluxparser import archives
+from dluxparser import cli
+from dluxparser import compression
+from dluxparser import log2json
+from dluxparser import scanner
+from dluxparser import shrinker
+from dluxparser import stats
+from dluxparser import streams
+from dluxparser import workers
+
+
+class ArgumentParser():
+    def __init__(self, args=None, parser=None):
+        desc = ('pipeline streams file(s) through a chain of shrinker '
+                'sub-commands and log2json. See the spec file sintaxis on '
+                'the documentation')
+        if not parser:
+            parser = argparse.ArgumentParser(description=desc)
+        self.parser = parser
+
+        # Add arguments
+        parser.add_argument(
+            "-d", "--root-dir", metavar="<dir_name>",
+            action='store', required=True, dest='root_dir', type=str,
+            help="The root directory where text file(s) are stored.")
+        parser.add_argument(
+            "-o", "--output-dir", metavar="<dir_name>",
+            action='store', required=False, dest='output_dir', type=str,
+            default='ParsedFiles',
+            help="The directory where parsed file(s) will be saved.")
+        parser.add_argument(
+            "-s", "--spec", metavar="<file_name>",
+            action='store', required=True, dest='spec', type=str,
+            help="File listing the stages, one per line.")
+        workers.add_arguments(parser)
+        stats.add_arguments(parser)
+        compression.add_arguments(parser)
+        scanner.add_arguments(parser)
+
+        parser.set_defaults(func='run')
+
+    def parse_args(self, args):
+        return self.parser.parse_args(args=args)
+
+
+class Pipeline():
+    def __init__(self, args):
+        self.args = args
+        self.archive, self.streamed = archives.modes(args.root_dir,
+                                                     args.output_dir)
+        if (args.root_dir != '-' and not self.archive and
+                not os.path.isdir(args.root_dir)):
+            raise Exception("You must provide a valid root folder.")
+        if not os.path.isfile(args.spec):
+            raise Exception("You must provide a valid spec file.")
+
+        output_dir = args.output_dir
+        if os.path.abspath(args.root_dir) == os.path.abspath(output_dir):
+            raise Exception("Input and Output folders must be different.")
+
+        self.stages, self.to_json = self._load_spec(args.spec)
+
+    def run(self):
+        '''Main function to stream input files through the stages'''
+        if self.args.root_dir == '-':
+            return workers.run_stdio(
+                lambda the_file: self.stream(streams.read_chunks(the_file)),
+                compress=self.args.compress)
+
+        # Create output folder if exists back it up
+        output_dir = self.args.output_dir
+        if os.path.exists(output_dir):
+            shutil.move(output_dir, output_dir + '.bk.' +
+                        datetime.now().isoformat())
+        if not archives.is_archive_name(output_dir):
+            os.makedirs(output_dir)
+
+        # Get files
+        jobs, files, processes = workers.schedule(
+            self._walk(), self.streamed, getattr(self.args, 'jobs', 1))
+        func = self._run_file
+        writer = None
+        if self.streamed:
+            writer = archives.open_output(output_dir, self.args.compress)
+            func = functools.partial(archives.run_job, self.stream, writer)
+
+        # Process files, results come back in the same order
+        report = stats.Report(self.args)
+        outcomes = workers.imap(
+            report.wrap(functools.partial(workers.capture, func)), jobs,
+            processes, chunksize=scanner.chunksize(self.args))
+        for (origin, _), (messages, error) in zip(files, outcomes):
+            messages = report.add(origin, messages, error)
+            lines = ["%i. Parsing file: %s" % (report.count, origin)]
+            lines.extend(messages or [])
+            if error:
+                lines.append("<-- Error: Unable to parse file %s: %s" %
+                             (origin, error))
+            report.show(lines)
+
+        if writer:
+            writer.close()
+        report.close()
+        print("Found %i files." % report.count)
+        if report.errors:
+            print("Failed to parse %i of %i files." %
+                  (report.errors, report.count))
+            return 1
+
+    def _walk(self):
+        '''Yield the (origin, output) pair of every file in root_dir.'''
+        if self.archive:
+            files = ((member, os.path.basename(member.name))
+                     for member in scanner.members(self.args.root_dir,
+                                                   self.args))
+        else:
+            files = ((origin, os.path.basename(origin))
+                     for origin in scanner.files(self.args.root_dir,
+                                                 self.args))
+        for origin, filename in files:
+            filename = compression.plain_name(filename)
+            if self.to_json:
+                filename = os.path.splitext(filename)[0] + '.json'
+            filename = compression.output_name(filename, self.args.compress)
+            yield origin, os.path.join(self.args.output_dir, filename)
+
+    def _run_file(self, job):
+        '''Stream a file through the stages and write the outcome.'''
+        origin, output = job
+        with compression.open_text(origin) as the_file:
+            chunks = self.stream(stats.timed('read',
+                                             streams.read_chunks(the_file)))
+            workers.write_chunks(output, workers.not_empty(chunks, output),
+                                 self.args.compress)
+
+    def stream(self, chunks):
+        '''Stream text chunks through the stages.'''
+        for stage in self.stages:
+            chunks = stage.transform(chunks)
+        if self.to_json:
+            data = self.to_json.parse_text(streams.iter_lines(chunks))
+            chunks = self.to_json.encode(data)
+        return chunks
+
+    def _load_spec(self, name):
+        '''Read the stages of a spec file.
+
+        Return the list of shrinker stages and the log2json stage, None if
+        the spec does not end with it.
+        '''
+        stages = []
+        to_json = None
+        with open(name, 'r') as the_file:
+            for number, line in enumerate(the_file, 1):
+                words = shlex.split(line, comments=True)
+                if not words:
+                    continue
+                if to_json:
+                    raise Exception("log2json must be the last stage, "
+                                    "line %i of %s." % (number, name))
+                if words[0] == 'shrinker':
+                    words = words[1:]
+                try:
+                    if words and words[0] == 'log2json':
+                        args = log2json.ArgumentParser(
+                            common=False).parse_args(words[1:])
+                        to_json = log2json.Log2Json(args, folders=False)
+                    else:
+                        args = shrinker.ArgumentParser(
+                            common=False).parse_args(words)
+                        stages.append(shrinker.Shrinker(args, folders=False))
+                except SystemExit:
+                    raise Exception("Invalid stage on line %i of %s." %
+                                    (number, name))
+
+        if not stages and not to_json:
+            raise Exception("No stages found on %s." % name)
+        return stages, to_json
+
+
+# CLIFF CLI CREATOR CLASS
+class CliffPipeline(cli.Command):
+    '''Stream files through a chain of shrinker and log2json stages'''
+
+    def get_parser(self, prog_name):
+        parser = super(CliffPipeline, self).get_parser(prog_name)
+        ArgumentParser(None, parser)
+        return parser
+
+    def take_action(self, parsed_args):
+        main(parsed_args)
+
+
+def main(opts=None):
+    # Parse arguments
+    if opts is None:
+        opts = ArgumentParser().parse_args(opts)
+    # Create commands instance
+    pipeline = Pipeline(opts)
+    # Run parsed subcommand function
+    raise SystemExit(getattr(pipeline, opts.func)())
+
+
+if __name__ == "__main__":
+    main()
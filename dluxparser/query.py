@@ -0,0 +1,133 @@
+"""
+query finds the parsed files holding given features, keys and values, on
+the index log2json writes with ``--index`` or on a ``--sink`` database,
+with no scan of the json files.
+
+Term sintaxis:
+
+    FEATURE                   files with the feature
+    FEATURE.key               ... with the key on any element
+    FEATURE[N].key            ... with the key on element N
+    FEATURE.key=value         ... with the key holding value
+    FEATURE.key=prefix*       ... with the key holding a value starting
+                              with prefix
+    FEATURE=value             ... with value on any key, or with no key
+
+Arguments
+---------
+
+* ``terms``: One or more terms, files matching all of them are printed.
+* ``--output-dir, -o``: The directory log2json wrote with ``--index``,
+  defaults to ``ParsedFiles``.
+* ``--sink``: (Optional) Search the database given as ``sqlite:<path>`` to
+  log2json ``--sink`` instead.
+
+Usage
+-----
+
+query prints the matching files, by their path relative to the root folder
+log2json parsed, one per line in order. It returns 1 when none matches.
+
+    dluxparser log2json -d logs -o ParsedFiles --index
+    dluxparser query "FeatureY[3].serial=X123" "Hostname=echo*"
+"""
+import argparse
+import os
+import re
+
+from dluxparser import cli
+from dluxparser import sinks
+
+# FEATURE[N].key=value, every part but the feature is optional
+_TERM = re.compile(r'(?P<feature>[^.=\[]+)(\[(?P<element>[0-9]+)\])?'
+                   r'(\.(?P<key>[^=]*))?(=(?P<value>.*))?$')
+
+
+class ArgumentParser():
+    def __init__(self, args=None, parser=None):
+        desc = ('query finds the files log2json parsed by their features, '
+                'keys and values. See the term sintaxis on the '
+                'documentation')
+        if not parser:
+            parser = argparse.ArgumentParser(description=desc)
+        self.parser = parser
+
+        # Add arguments
+        parser.add_argument(
+            "terms", metavar="<FEATURE[N].key=value>", nargs='+', type=str,
+            help="Terms the files must all match.")
+        parser.add_argument(
+            "-o", "--output-dir", metavar="<dir_name>",
+            action='store', required=False, dest='output_dir', type=str,
+            default='ParsedFiles',
+            help="The directory log2json saved its index into.")
+        parser.add_argument(
+            "--sink", metavar="<kind:path>",
+            action='store', required=False, dest='sink', type=str,
+            help="Search the log2json 'sqlite:<path>' sink instead.")
+
+        parser.set_defaults(func='find')
+
+    def parse_args(self, args):
+        return self.parser.parse_args(args=args)
+
+
+class Query():
+    def __init__(self, args):
+        self.args = args
+        if args.sink:
+            self.path = sinks.parse_spec(args.sink)[1]
+        else:
+            self.path = os.path.join(args.output_dir, sinks.INDEX_NAME)
+        self.terms = [self._parse_term(term) for term in args.terms]
+
+    def find(self):
+        '''Main function to print the files matching the terms'''
+        files = sinks.find(self.path, self.terms)
+        for name in files:
+            print(name)
+        if not files:
+            return 1
+
+    def _parse_term(self, term):
+        '''(feature, element, key, value, prefix) tuple of a term.'''
+        match = _TERM.match(term)
+        if match is None:
+            raise Exception("Invalid term %s, it must be "
+                            "FEATURE[N].key=value." % term)
+        element = match.group('element')
+        if element is not None:
+            element = int(element)
+        value = match.group('value')
+        prefix = value is not None and value.endswith('*')
+        if prefix:
+            value = value[:-1]
+        return (match.group('feature'), element, match.group('key'), value,
+                prefix)
+
+
+# CLIFF CLI CREATOR CLASS
+class CliffQuery(cli.Command):
+    '''Find the parsed files holding features, keys and values'''
+
+    def get_parser(self, prog_name):
+        parser = super(CliffQuery, self).get_parser(prog_name)
+        ArgumentParser(None, parser)
+        return parser
+
+    def take_action(self, parsed_args):
+        main(parsed_args)
+
+
+def main(opts=None):
+    # Parse arguments
+    if opts is None:
+        opts = ArgumentParser().parse_args(opts)
+    # Create commands instance
+    query = Query(opts)
+    # Run parsed subcommand function
+    raise SystemExit(getattr(query, opts.func)())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+'''
+scanner lists the input files of a root folder, or the members of an
+archive, for the commands. Folders are read with os.scandir, in the order
+os.walk gives, and files are kept or skipped by the options the commands
+share:
+
+* ``--include``: Glob(s) of the files to process, matched on the file name
+  or on its path relative to the root folder (e.g. ``*.log``,
+  ``host*/boot*``). Every file is processed when not given.
+* ``--exclude``: Glob(s) of the files, or folders, to skip (e.g. ``*.swp``,
+  ``*.bk.*``). A folder skipped is not read.
+* ``--max-size``: Skip the files larger than N bytes.
+* ``--skip-hidden``: Skip the files and folders whose name starts with a
+  dot.
+* ``--largest-first``: Process the files by size, largest first, so with
+  parallel jobs the largest file does not start last and hold the end of
+  the run. Members of archives are read in the order they are stored.
+
+    scanner.add_arguments(parser)
+    ...
+    for path in scanner.files(args.root_dir, args):
+        ...
+
+Sizes are only looked up for ``--max-size`` and ``--largest-first``.
+'''
+import fnmatch
+import os
+import posixpath
+
+from dluxparser import archives
+
+
+def add_arguments(parser):
+    '''Add the scanner options to an argparse parser.'''
+    parser.add_argument(
+        "--include", metavar="<glob>", nargs='+',
+        action='store', required=False, dest='include', type=str,
+        help="Only process the files matching any of the globs.")
+    parser.add_argument(
+        "--exclude", metavar="<glob>", nargs='+',
+        action='store', required=False, dest='exclude', type=str,
+        help="Skip the files and folders matching any of the globs.")
+    parser.add_argument(
+        "--max-size", metavar="N",
+        action='store', required=False, dest='max_size', type=int,
+        default=0,
+        help="Skip the files larger than N bytes.")
+    parser.add_argument(
+        "--skip-hidden", action='store_true', required=False,
+        dest='skip_hidden',
+        help="Skip the files and folders starting with a dot.")
+    parser.add_argument(
+        "--largest-first", action='store_true', required=False,
+        dest='largest_first',
+        help="Process the largest files first.")
+
+
+def files(root_dir, args):
+    '''Paths of the files within root_dir kept by the scanner options of
+       args, largest first if asked for.'''
+    options = _Options(args)
+    paths = _scan(root_dir, options)
+    if not options.largest_first:
+        return (path for path, _ in paths)
+    # Same sizes keep the folder order
+    return [path for path, _ in sorted(paths, key=lambda item: -item[1])]
+
+
+def members(path, args):
+    '''Members of the archive at path kept by the scanner options of args,
+       in the order they are stored.'''
+    options = _Options(args)
+    for member in archives.members(path):
+        parts = posixpath.normpath(member.name).split('/')
+        if any(options.skip_folder(part, '/'.join(parts[:index + 1]))
+               for index, part in enumerate(parts[:-1])):
+            continue
+        if options.keep('/'.join(parts), parts[-1], member.size):
+            yield member
+
+
+def chunksize(args):
+    '''Files handed to a worker at once, None for the workers default.
+       One at a time when largest first, so the largest ones spread.'''
+    return 1 if getattr(args, 'largest_first', False) else None
+
+
+class _Options(object):
+    '''Scanner options of a parsed command line.'''
+
+    def __init__(self, args):
+        self.include = getattr(args, 'include', None) or []
+        self.exclude = getattr(args, 'exclude', None) or []
+        self.max_size = getattr(args, 'max_size', 0) or 0
+        self.skip_hidden = getattr(args, 'skip_hidden', False)
+        self.largest_first = getattr(args, 'largest_first', False)
+        self.sized = bool(self.max_size or self.largest_first)
+
+    def skip_folder(self, name, relpath):
+        '''Whether the folder at relpath, named name, is not read.'''
+        return ((self.skip_hidden and name.startswith('.')) or
+                _matches(self.exclude, name, relpath))
+
+    def keep(self, relpath, name, size):
+        '''Whether the file at relpath, named name, of size bytes (None if
+           not looked up) is processed.'''
+        if self.skip_hidden and name.startswith('.'):
+            return False
+        if self.include and not _matches(self.include, name, relpath):
+            return False
+        if _matches(self.exclude, name, relpath):
+            return False
+        return not (self.max_size and size and size > self.max_size)
+
+
+def _matches(globs, name, relpath):
+    '''Whether a file name or its relative path matches any of the globs.'''
+    return any(fnmatch.fnmatch(name, pattern) or
+               fnmatch.fnmatch(relpath, pattern) for pattern in globs)
+
+
+def _scan(root_dir, options):
+    '''Yield the (path, size) pair of every file kept within root_dir, the
+       size is None when not needed. Folders which can not be read are
+       skipped, as os.walk does.'''
+    # Folders still to read, the next one last
+    pending = [(root_dir, '')]
+    while pending:
+        top, reltop = pending.pop()
+        try:
+            with os.scandir(top) as scan:
+                entries = list(scan)
+        except OSError:
+            continue
+        folders = []
+        for entry in entries:
+            relpath = os.path.join(reltop, entry.name)
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # Links to folders are not followed, as os.walk does
+                if not (entry.is_symlink() or
+                        options.skip_folder(entry.name, relpath)):
+                    folders.append((entry.path, relpath))
+                continue
+            size = None
+            if options.sized:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    # Left to fail when processed
+                    size = 0
+            if options.keep(relpath, entry.name, size):
+                yield entry.path, size
+        pending.extend(reversed(folders))
@@ -7,9 +7,50 @@ Common Arguments
 ----------------
 
 * ``--root-dir, -d``: The parent directory where files to be parsed live.
-  Folder can contain sub-folders.
-* ``--output-dir, -o``: The directory where parsed files will live.
-* ``--inline``: The parsed files will replace the original ones.
+  Folder can contain sub-folders. ``-`` reads a single file from the
+  standard input and writes the outcome to the standard output, messages
+  go to the standard error. A tar or zip archive (e.g. a ``.tar.gz``
+  bundle) is read member by member, with no extract step.
+* ``--output-dir, -o``: The directory where parsed files will live. Named
+  like an archive (``.zip``, ``.tar``, ``.tar.gz``, ``.tar.bz2``,
+  ``.tar.xz``) the parsed files are written into a new archive.
+  Archives, read or written, are parsed one file at a time, streamed
+  through the sub-command, and can not be parsed inline nor incrementally.
+* ``--inline``: The parsed files will replace the original ones. Each file is
+  written to a temporary file next to the original one, which then replaces
+  it at once, so a failure leaves every file either parsed or untouched.
+* ``--jobs, -j``: (Optional) Number of files processed in parallel, defaults
+  to 1. Use 0 for all available CPUs. Regex based sub-commands run on worker
+  processes, the others on threads. Messages are printed in the files order
+  and a file failing does not stop the rest.
+* ``--incremental``: (Optional) Reuse the output folder and only process the
+  files which are new or changed since the last run, outputs of deleted
+  files are removed. A manifest in the output folder keeps track of them.
+  Not available with ``--inline``.
+* ``--quiet, -q``: (Optional) Print only the files with errors, and a
+  progress line every few seconds, instead of a line per file.
+* ``--stats``: (Optional) Report the time spent reading, parsing and writing,
+  the bytes read and written, the throughput, the peak memory and the
+  slowest files.
+* ``--stats-json``: (Optional) Save those statistics into a json file.
+* ``--compress``: (Optional) Compress the output files with ``gzip``,
+  ``bz2`` or ``xz``, their names get its suffix. Not available with
+  ``--inline``, inline files keep the compression they had.
+* ``--include``, ``--exclude``, ``--max-size``, ``--skip-hidden``,
+  ``--largest-first``: (Optional) Select the files to process by globs,
+  size or hidden name, and process the largest first. See ``scanner``.
+
+Files compressed with gzip, bz2 or xz, recognized by their first bytes, are
+decompressed while read. Outputs drop the ``.gz``, ``.bz2`` or ``.xz``
+suffix of their input, and get the one of ``--compress`` if given.
+
+extract-section and remove-section search the regexes on the bytes of the
+memory mapped file and only read the section kept. Files with carriage
+returns, and regexes matching differently on bytes for the file content
+(e.g. ``.`` or ``\\s`` on non ASCII text), and compressed files, stream each
+file in a single pass instead. Regexes which can match an unknown number
+of lines (e.g. using ``\\s``, ``[^...]``, ``^``, ``$`` or groups) are run on
+the whole file in memory.
 
 Available sub-commands:
 
@@ -89,6 +130,11 @@ remove-from-bottom sub-command:
 -------------------------------
 
 Removes N number of lines from the bottom of the file.
+The cut point is found reading the file backwards from the end, with
+``--inline`` the file is truncated in place so the cost depends on N and
+not on the file size. In place truncation keeps the original line endings
+of the remaining text. Compressed files, and compressed outputs, are read
+through instead.
 
 Arguments
 ~~~~~~~~~
@@ -117,6 +163,20 @@ Usage
 
 remove-from-regex takes a regex or several regexes to delete the lines that
 matches the given regex(es).
+Every line is checked once against all the regexes, which are combined in a
+single one (or searched as plain strings when they have no special
+characters). The lines removed by each regex are reported, a line matching
+several regexes counts for the first one given.
+Each regex is searched on one line at a time, as if it was wrapped in a
+group, which changes some regexes from the first versions of the command,
+which searched ``.*<regex>.*\n`` on the whole file:
+
+* ``^`` and ``$`` match at the start and end of every line, they used to
+  match at the start and end of the file only.
+* ``|`` splits the whole regex, ``a|b`` removes the lines with an ``a`` or
+  a ``b``. It used to remove part of the lines only, up to the ``a``.
+* A regex can not match across lines, ``\n`` in it matches nothing.
+* A last line without newline is removed as well.
 
 ------------------------------
 to-lower:
@@ -130,17 +190,29 @@ Usage
 to-lower takes a directory and make all files content lower case.
 """
 import argparse
+import functools
 import os
 import re
-import time
 import shutil
 
-from cliff import command
 from datetime import datetime
 
+from dluxparser import archives
+from dluxparser import cli
+from dluxparser import compression
+from dluxparser import manifest
+from dluxparser import mapped
+from dluxparser import scanner
+from dluxparser import stats
+from dluxparser import streams
+from dluxparser import workers
+
+# Suffix of the temporary files written next to the originals when inline
+_INLINE_SUFFIX = '.dluxparser.tmp'
+
 
 class ArgumentParser():
-    def __init__(self, args=None, parser=None):
+    def __init__(self, args=None, parser=None, common=True):
         desc = 'shrinker provide sub-commands to shrink a text or log file.'
         usage = ('shrinker [-h] <SUB-COMMAND> ...\n\n'
                  'To see help on a specific sub-command, do:\n'
@@ -155,16 +227,17 @@ class ArgumentParser():
         subparsers = parser.add_subparsers(title='Sub-Commands',
                                            help='\nAvailable sub-commands.\n')
 
-        # Add arguments that goes with all sub-commands
-        common_args = self.add_common_args()
+        # Add arguments that goes with all sub-commands, pipeline stages
+        # parse sub-commands only
+        common_args = [self.add_common_args()] if common else []
 
         # Add sub-command parsers:
-        self.add_extract_section_parser(subparsers, [common_args])
-        self.add_remove_section_parser(subparsers, [common_args])
-        self.add_remove_from(subparsers, [common_args])
-        self.add_remove_from(subparsers, [common_args], 'bottom')
-        self.add_remove_from_regex(subparsers, [common_args])
-        _lower = subparsers.add_parser('to-lower', parents=[common_args],
+        self.add_extract_section_parser(subparsers, common_args)
+        self.add_remove_section_parser(subparsers, common_args)
+        self.add_remove_from(subparsers, common_args)
+        self.add_remove_from(subparsers, common_args, 'bottom')
+        self.add_remove_from_regex(subparsers, common_args)
+        _lower = subparsers.add_parser('to-lower', parents=common_args,
                                        help='Make file(s) content lower case.')
         _lower.set_defaults(func='to_lower')
 
@@ -190,6 +263,13 @@ class ArgumentParser():
             required=False,
             help='Asume parsed file must replace existing original one.'
         )
+        workers.add_arguments(shared_args)
+        shared_args.add_argument(
+            "--incremental", action='store_true', required=False,
+            help="Only process files new or changed since the last run.")
+        stats.add_arguments(shared_args)
+        compression.add_arguments(shared_args)
+        scanner.add_arguments(shared_args)
 
         # Return common args
         return shared_args
@@ -276,196 +356,533 @@ class ArgumentParser():
 
 
 class Shrinker():
-    def __init__(self, args):
+    def __init__(self, args, folders=True):
         self.args = args
-        if not os.path.isdir(args.root_dir):
+        # A pipeline stage only transforms text, it has no folders
+        if not folders:
+            return
+
+        incremental = getattr(args, 'incremental', False)
+        # Standard input is written to the standard output
+        if args.root_dir == '-':
+            if incremental or args.inline:
+                raise Exception("Standard input can not be parsed inline "
+                                "nor incrementally.")
+            return
+
+        self.archive, self.streamed = archives.modes(
+            args.root_dir, None if args.inline else args.output_dir)
+        if not self.archive and not os.path.isdir(args.root_dir):
             raise Exception("You must provide a valid root folder.")
-
-        output_dir = args.output_dir
+        if self.streamed and (incremental or args.inline):
+            raise Exception("Archives can not be parsed inline nor "
+                            "incrementally.")
+
+        if incremental and args.inline:
+            raise Exception("Incremental runs need an output folder, "
+                            "they can not be inline.")
+        if getattr(args, 'compress', None) and args.inline:
+            raise Exception("Inline files keep their compression, they can "
+                            "not be compressed.")
+        # Inline files are replaced one by one, no output folder
         if args.inline:
-            output_dir = '/tmp/ParsedFiles'+datetime.now().isoformat()
-            self.args.output_dir = output_dir
-        if os.path.abspath(args.root_dir) == os.path.abspath(output_dir):
+            return
+        if os.path.abspath(args.root_dir) == os.path.abspath(args.output_dir):
             raise Exception("Input and Output folders must be different.")
 
-        # Create output folder if exists rename it
+    def _make_output_dir(self):
+        '''Create output folder if exists rename it, unless reused.'''
+        output_dir = self.args.output_dir
+        if getattr(self.args, 'incremental', False):
+            if not os.path.isdir(output_dir):
+                os.makedirs(output_dir)
+            return
         if os.path.exists(output_dir):
             shutil.move(output_dir, output_dir + '.bk.' +
                         datetime.now().isoformat())
-        os.makedirs(output_dir)
+        if not archives.is_archive_name(output_dir):
+            os.makedirs(output_dir)
 
     def shrink(self):
         '''Main function for extract and remove section subcommands'''
-        # Get and process files
-        count = 0
-        for root, _, files in os.walk(self.args.root_dir):
-            for filename in files:
-                origin = os.path.join(root, filename)
-                output = os.path.join(self.args.output_dir, filename)
-                count = count + 1
-                print("%i. Parsing File: %s" % (count, origin))
-                data = self._get_content(origin)
-                # Remove return carriage characters
-                data = ''.join(data.split('\r'))
-                # Extract a section of the file
+        self._compile()
+        return self._run(self._shrink_file)
+
+    def transform(self, chunks):
+        '''Apply the sub-command to a stream of text chunks, to chain
+           sub-commands on a pipeline.'''
+        if self.args.func == 'shrink':
+            self._compile()
+            if self._streaming:
+                return self._shrink_chunks(chunks)
+            return [self._shrink_content(''.join(chunks))]
+        elif self.args.func == 'to_lower':
+            return (chunk.lower() for chunk in chunks)
+        elif self.args.func2 == 'top':
+            return streams.skip_lines(chunks, self.args.number)
+        elif self.args.func2 == 'bottom':
+            return streams.drop_last_lines(chunks, self.args.number)
+        elif self.args.func2 == 'regex':
+            matcher = streams.LineMatcher(self.args.regex)
+            return self._filter_chunks(chunks, matcher)
+
+    def _compile(self):
+        '''Compile the section regexes for the paths that can use them.'''
+        # Streaming is possible when the lines both regexes span is bounded
+        self._init_re = streams.compile_bounded(self.args.initstr)
+        self._end_re = streams.compile_bounded(self.args.endstr)
+        self._streaming = self._init_re and self._end_re
+        # The end regex is searched from the init match on, not on a copy
+        self._init_bytes = mapped.compile_bytes(self.args.initstr)
+        self._end_bytes = mapped.compile_bytes(self.args.endstr)
+        self._mapping = (self._init_bytes and self._end_bytes and
+                         not self._end_bytes.anchored)
+
+    def _shrink_file(self, job):
+        '''Extract or remove a section of a file.'''
+        origin, output = job
+        # The bytes of compressed files are not the text
+        if (self._mapping and not compression.detect(origin) and
+                self._shrink_mapped(origin, output)):
+            return
+        if self._streaming:
+            with compression.open_text(origin) as the_file:
+                chunks = stats.timed('read', streams.read_chunks(the_file))
+                self._write_chunks(output, self._shrink_chunks(chunks))
+        else:
+            data = self._shrink_content(self._get_content(origin))
+            self._write_to_file(output, data)
+
+    def _shrink_content(self, data):
+        '''Extract or remove a section of data held in memory.'''
+        # Remove return carriage characters
+        data = ''.join(data.split('\r'))
+        # Extract a section of the file
+        if self.args.func2 == 'extract':
+            # Remove content before initStr
+            data = self._remove_before(data, self.args.initstr)
+            # Remove N lines from the top
+            data = self._remove_lines(data, self.args.remove_top + 1)
+            # Remove content after endStr
+            data = self._remove_after(data, self.args.endstr)
+            # Remove N lines from the bottom
+            data = self._remove_lines(data, self.args.remove_bottom,
+                                      False)
+        # Remove a portion of the file
+        elif self.args.func2 == 'remove':
+            data = self._remove_between(data, self.args.initstr,
+                                        self.args.endstr)
+
+        if self.args.to_lower:
+            data = data.lower()
+        return data
+
+    def _shrink_mapped(self, origin, output):
+        '''Extract or remove a section searching the regexes on the bytes
+           of the mapped file. False if the file can not be mapped.'''
+        with open(origin, 'rb') as the_file:
+            data = mapped.map_text(the_file)
+            if data is None:
+                return False
+            try:
+                plain = (self._init_bytes.plain and self._end_bytes.plain or
+                         mapped.is_plain(data))
+                if not plain:
+                    return False
                 if self.args.func2 == 'extract':
-                    # Remove content before initStr
-                    data = self._remove_before(data, self.args.initstr)
-                    # Remove N lines from the top
-                    data = self._remove_lines(data, self.args.remove_top + 1)
-                    # Remove content after endStr
-                    data = self._remove_after(data, self.args.endstr)
-                    # Remove N lines from the bottom
-                    data = self._remove_lines(data, self.args.remove_bottom,
-                                              False)
-                # Remove a portion of the file
-                elif self.args.func2 == 'remove':
-                    data = self._remove_between(data, self.args.initstr,
-                                                self.args.endstr)
-
+                    ranges = [self._extract_range(data)]
+                else:
+                    ranges = self._remove_between_ranges(data)
+                chunks = stats.timed('read', mapped.read_ranges(data, ranges))
                 if self.args.to_lower:
-                    data = data.lower()
-
-                self._write_to_file(output, data)
-
-        # Handle inline parameter
-        self._ifinline()
-        print("Found %i files." % count)
+                    chunks = (chunk.lower() for chunk in chunks)
+                self._write_chunks(output, chunks)
+            finally:
+                data.close()
+        return True
+
+    def _extract_range(self, data):
+        '''Mapped version of the extract steps of _shrink_content.'''
+        start = 0
+        match = self._init_bytes.search(data)
+        if match:
+            start = match[1]
+        for _ in range(self.args.remove_top + 1):
+            index = data.find(b'\n', start)
+            if index < 0:
+                raise Exception("Unable to remove lines, not enough lines.")
+            start = index + 1
+
+        end = len(data)
+        match = self._end_bytes.search(data, start)
+        if match:
+            end = match[0]
+        for _ in range(self.args.remove_bottom):
+            end = data.rfind(b'\n', start, end)
+            if end < 0:
+                raise Exception("Unable to remove lines, not enough lines.")
+        return start, end
+
+    def _remove_between_ranges(self, data):
+        '''Mapped version of _remove_between.'''
+        match = self._init_bytes.search(data)
+        if not match:
+            workers.report("<-- Error: Initial string not found  %s" %
+                           self.args.initstr)
+            return [(0, len(data))]
+
+        end = self._end_bytes.search(data, match[1])
+        if not end:
+            workers.report("<-- Error: End string not found  %s" %
+                           self.args.endstr)
+            return [(0, match[0]), (match[1], len(data))]
+        return [(0, match[0]), (end[1], len(data))]
+
+    def _shrink_chunks(self, chunks):
+        '''Extract or remove a section of a stream of text chunks.
+
+        Same outcome as _shrink_content but done in a single pass, holding
+        only a chunk, the lines the regexes span and the lines removed from
+        the bottom.
+        '''
+        # Remove return carriage characters
+        chunks = (chunk.replace('\r', '') for chunk in chunks)
+        if self.args.func2 == 'extract':
+            chunks = streams.after_match(chunks, *self._init_re)
+            chunks = streams.skip_lines(chunks, self.args.remove_top + 1)
+            chunks = streams.before_match(chunks, *self._end_re)
+            chunks = streams.drop_last_lines(chunks,
+                                             self.args.remove_bottom)
+        elif self.args.func2 == 'remove':
+            chunks = self._remove_between_chunks(chunks)
+
+        if self.args.to_lower:
+            chunks = (chunk.lower() for chunk in chunks)
+        return chunks
+
+    def _remove_between_chunks(self, chunks):
+        '''Stream version of _remove_between.'''
+        start = streams.Splitter(chunks, *self._init_re)
+        for chunk in start.before():
+            yield chunk
+        if not start.found:
+            workers.report("<-- Error: Initial string not found  %s" %
+                           self.args.initstr)
+            return
+
+        # Text between the regexes is kept aside until endstr shows up
+        end = streams.Splitter(start.after(), *self._end_re)
+        spool = streams.Spool()
+        for chunk in end.before():
+            spool.write(chunk)
+        if not end.found:
+            workers.report("<-- Error: End string not found  %s" %
+                           self.args.endstr)
+            for chunk in spool.replay():
+                yield chunk
+            return
+        spool.close()
+        for chunk in end.after():
+            yield chunk
 
     def remove_from(self):
         '''Main function for remove-from-[top|bottom|regex] subcommands.'''
-        # Get and process files
-        count = 0
-        for root, _, files in os.walk(self.args.root_dir):
-            for filename in files:
-                origin = os.path.join(root, filename)
-                output = os.path.join(self.args.output_dir, filename)
-                count = count + 1
-                print("%i. Parsing File: %s" % (count, origin))
-                if self.args.func2 == 'top':
-                    data = self._remove_lines(origin, self.args.number)
-                elif self.args.func2 == 'bottom':
-                    data = self._remove_lines(origin, self.args.number, False)
-                elif self.args.func2 == 'regex':
-                    data = self._remove_lines_r(origin, self.args.regex)
-
-                self._write_to_file(output, data)
-
-        # Handle inline parameter
-        self._ifinline()
-        print("Found %i files." % count)
+        if self.args.func2 == 'regex':
+            self._matcher = streams.LineMatcher(self.args.regex)
+
+        # Only the regexes keep the CPU busy
+        return self._run(self._remove_from_file,
+                         threads=self.args.func2 != 'regex')
+
+    def _remove_from_file(self, job):
+        '''Remove lines from the top, bottom or matching regexes of a file.'''
+        origin, output = job
+        if self.args.func2 == 'top':
+            data = self._remove_lines(self._get_content(origin),
+                                      self.args.number)
+            self._write_to_file(output, data)
+        elif self.args.func2 == 'bottom':
+            self._remove_bottom_file(origin, output)
+        elif self.args.func2 == 'regex':
+            with compression.open_text(origin) as the_file:
+                chunks = stats.timed('read', streams.read_chunks(the_file))
+                self._write_chunks(
+                    output, self._filter_chunks(chunks, self._matcher))
 
     def to_lower(self):
         '''Main function to make file(s) content lower case.'''
-        # Get and process files
-        count = 0
-        for root, _, files in os.walk(self.args.root_dir):
-            for filename in files:
-                origin = os.path.join(root, filename)
-                output = os.path.join(self.args.output_dir, filename)
-                count = count + 1
-                data = self._get_content(origin).lower()
-
-                self._write_to_file(output, data)
-
-        # Handle inline parameter
-        self._ifinline()
-        print("Found %i files." % count)
+        return self._run(self._to_lower_file, threads=True, verbose=False)
+
+    def _to_lower_file(self, job):
+        '''Make the content of a file lower case.'''
+        origin, output = job
+        data = self._get_content(origin).lower()
+        self._write_to_file(output, data)
+
+    def _run(self, func, threads=False, verbose=True):
+        '''Run func on the (origin, output) pair of every file on a pool of
+           workers, print their messages and errors in the files order.'''
+        if self.args.root_dir == '-':
+            return workers.run_stdio(
+                lambda the_file: self.transform(streams.read_chunks(the_file)),
+                compress=self.args.compress)
+        if not self.args.inline:
+            self._make_output_dir()
+        inputs = manifest.load(self.args)
+        report = stats.Report(self.args)
+        # Paths are read lazily, only the ones in flight are kept
+        jobs, files, processes = workers.schedule(
+            self._walk(inputs), self.streamed, getattr(self.args, 'jobs', 1),
+            lazy=True)
+        writer = None
+        if self.streamed:
+            writer = archives.open_output(self.args.output_dir,
+                                          self.args.compress)
+            func = functools.partial(archives.run_job, self.transform,
+                                     writer)
+        elif self.args.inline:
+            func = functools.partial(self._replace_file, func)
+        outcomes = workers.imap(
+            report.wrap(functools.partial(workers.capture, func)), jobs,
+            processes, chunksize=scanner.chunksize(self.args),
+            threads=threads, max_pending=2)
+        for (origin, output), (messages, error) in zip(files, outcomes):
+            messages = report.add(origin, messages, error)
+            lines = []
+            if verbose:
+                lines.append("%i. Parsing File: %s" % (report.count, origin))
+            lines.extend(messages or [])
+            name = os.path.relpath(origin, self.args.root_dir)
+            if error:
+                lines.append("<-- Error: Unable to parse file %s: %s" %
+                             (origin, error))
+                if inputs:
+                    inputs.forget(name)
+            elif inputs:
+                inputs.record(name, origin, [os.path.basename(output)])
+            report.show(lines)
+
+        if writer:
+            writer.close()
+        if inputs:
+            inputs.close()
+        report.close()
+        print("Found %i files." % report.count)
+        if report.errors:
+            print("Failed to parse %i of %i files." %
+                  (report.errors, report.count))
+            return 1
+
+    def _walk(self, inputs=None):
+        '''Yield the (origin, output) pair of every file in root_dir, only
+           the changed ones if a manifest of inputs is given.'''
+        if self.archive:
+            for member in scanner.members(self.args.root_dir, self.args):
+                filename = compression.output_name(
+                    os.path.basename(member.name), self.args.compress)
+                yield member, os.path.join(self.args.output_dir, filename)
+            return
+        for origin in scanner.files(self.args.root_dir, self.args):
+            if self.args.inline:
+                # Left over by an interrupted run
+                if not origin.endswith(_INLINE_SUFFIX):
+                    yield origin, origin + _INLINE_SUFFIX
+                continue
+            name = os.path.relpath(origin, self.args.root_dir)
+            if inputs and not inputs.changed(name, origin):
+                continue
+            filename = compression.output_name(os.path.basename(origin),
+                                               self.args.compress)
+            yield origin, os.path.join(self.args.output_dir, filename)
+
+    def _replace_file(self, func, job):
+        '''Run func writing to a temporary file next to the original one,
+           then replace the original with it at once.'''
+        origin, output = job
+        try:
+            func(job)
+            # Nothing written if the original was changed in place
+            if os.path.exists(output):
+                shutil.copymode(origin, output)
+                os.replace(output, origin)
+        finally:
+            if os.path.exists(output):
+                os.remove(output)
 
     # #### Internal methods - To be used by the subcommands #####
     def _get_content(self, name):
-        '''Get the content from a file or from stream.'''
-        if os.path.exists(name):
-            the_file = open(name, 'r')
+        '''Get the content from a file.'''
+        with stats.timer('read'):
+            the_file = compression.open_text(name)
             content = the_file.read()
             the_file.close()
-        else:
-            content = name
         return content
 
-    def _locate_match(self, name, pattern):
-        '''Locate a string patern whithin a file or stream.'''
-        content = self._get_content(name)
+    def _locate_match(self, content, pattern):
+        '''Locate a string patern whithin a text.'''
         return re.split(pattern, content, 1)
 
     def _write_to_file(self, file_name, plain_content):
         '''Writes a given text into a file.'''
-        if not plain_content:
-            print("<-- Error: Empty processed data for file %s" % file_name)
-            plain_content = " "
-
-        the_file = open(file_name, "w")
-        the_file.write(plain_content)
-        the_file.close()
-
-    def _ifinline(self):
-        '''Replaces the original folder with parsed output when inline
-           parameter is passed'''
-        # If parsed file should replace original files
+        self._write_chunks(file_name, [plain_content])
+
+    def _write_chunks(self, file_name, chunks):
+        '''Writes a stream of text chunks into a file.'''
+        workers.write_chunks(file_name, workers.not_empty(chunks, file_name),
+                             self._output_compression(file_name))
+
+    def _output_compression(self, file_name):
+        '''Compression of an output file, as asked or, inline, as the
+           original file.'''
         if self.args.inline:
-            shutil.rmtree(self.args.root_dir)
-            shutil.move(self.args.output_dir, self.args.root_dir)
+            return compression.detect(file_name[:-len(_INLINE_SUFFIX)])
+        return self.args.compress
 
-    def _remove_before(self, name, initstr):
-        '''Remove lines from the top of a file or stream until
+    def _remove_before(self, content, initstr):
+        '''Remove lines from the top of a text until
            given string regex matches'''
-        content = self._locate_match(name, initstr)
+        content = self._locate_match(content, initstr)
         if len(content) > 1:
             return content[1]
         else:
             return content[0]
 
-    def _remove_between(self, name, initstr, endstr):
+    def _remove_between(self, content, initstr, endstr):
         '''Remove the lines that are between two regexes'''
-        content = self._locate_match(name, initstr)
+        content = self._locate_match(content, initstr)
 
         if len(content) == 1:
-            print("<-- Error: Initial string not found  %s" % initstr)
+            workers.report("<-- Error: Initial string not found  %s" % initstr)
             return content[0]
 
         beforeInitRegex = content[0]
         content = self._locate_match(content[1], endstr)
 
         if len(content) == 1:
-            print("<-- Error: End string not found  %s" % endstr)
+            workers.report("<-- Error: End string not found  %s" % endstr)
             return (beforeInitRegex + content[0])
 
         return beforeInitRegex + content[1]
 
-    def _remove_after(self, name, endstr):
-        '''Remove the lines from a file or stream after a
+    def _remove_after(self, content, endstr):
+        '''Remove the lines from a text after a
            given string regex matches'''
-        content = self._locate_match(name, endstr)
+        content = self._locate_match(content, endstr)
         return content[0]
 
-    def _remove_lines(self, name, num, top=True):
-        '''Remove num lines from the top or bottom of a given file or stream'''
-        content = self._get_content(name)
+    def _remove_lines(self, content, num, top=True):
+        '''Remove num lines from the top or bottom of a given text'''
         # Return content if nothing to remove
         if num == 0:
             return content
 
-        if top:
-            return re.split('\n', content, num)[num]
+        # Find the num-th newline from the top or from the bottom
+        index = -1 if top else len(content)
+        for _ in range(num):
+            if top:
+                index = content.find('\n', index + 1)
+            else:
+                index = content.rfind('\n', 0, index)
+            if index < 0:
+                raise Exception("Unable to remove lines, not enough lines.")
+
+        return content[index + 1:] if top else content[:index]
+
+    def _remove_bottom_file(self, origin, output):
+        '''Remove num lines from the bottom of a file, without reading it
+           all. Inline, the original file is truncated in place.'''
+        if self.args.compress or compression.detect(origin):
+            # Compressed bytes can not be cut, stream the text instead
+            with compression.open_text(origin) as the_file:
+                chunks = stats.timed('read', streams.read_chunks(the_file))
+                self._write_chunks(output, streams.drop_last_lines(
+                    chunks, self.args.number))
+            return
+        cut = self._tail_offset(origin, self.args.number)
+        if cut is None:
+            # Carriage returns near the cut, let text mode handle them
+            data = self._remove_lines(self._get_content(origin),
+                                      self.args.number, False)
+            self._write_to_file(output, data)
+        elif cut == 0:
+            self._write_to_file(output, '')
+        elif self.args.inline:
+            with stats.timer('write'), open(origin, 'r+b') as the_file:
+                the_file.truncate(cut)
+            stats.written(origin)
         else:
-            content = content[::-1]
-            content = re.split('\n', content, num)[num]
-            return content[::-1]
-
-    def _remove_lines_r(self, name, regex):
+            with stats.timer('write'):
+                self._copy_head(origin, output, cut)
+            stats.written(output)
+
+    def _tail_offset(self, name, num):
+        '''Byte offset of the num-th newline from the end of a file.
+
+        The file is read backwards in blocks. None is returned if a carriage
+        return shows up, as text mode would read it as a newline.
+        '''
+        with open(name, 'rb') as the_file:
+            the_file.seek(0, os.SEEK_END)
+            position = the_file.tell()
+            if num == 0:
+                return position
+            while position > 0:
+                size = min(streams.CHUNK_SIZE, position)
+                position = position - size
+                the_file.seek(position)
+                block = the_file.read(size)
+                if b'\r' in block:
+                    return None
+                index = len(block)
+                while num > 0:
+                    index = block.rfind(b'\n', 0, index)
+                    if index < 0:
+                        break
+                    num = num - 1
+                if num == 0:
+                    cut = position + index
+                    # A CR right before the cut is part of the newline
+                    the_file.seek(max(cut - 1, 0))
+                    if cut and the_file.read(1) == b'\r':
+                        return None
+                    return cut
+        raise Exception("Unable to remove lines, not enough lines.")
+
+    def _copy_head(self, name, output, length):
+        '''Copy the first length bytes of a file translating carriage
+           returns to newlines the same way text mode reads them.'''
+        with open(name, 'rb') as origin, open(output, 'wb') as the_file:
+            carry = b''
+            while length > 0:
+                block = carry + origin.read(min(streams.CHUNK_SIZE, length))
+                length = length - (len(block) - len(carry))
+                # Hold a trailing CR, it may be the start of a CRLF
+                carry = b'\r' if length and block.endswith(b'\r') else b''
+                if carry:
+                    block = block[:-1]
+                if b'\r' in block:
+                    block = block.replace(b'\r\n', b'\n')
+                    block = block.replace(b'\r', b'\n')
+                the_file.write(block)
+
+    def _remove_lines_r(self, content, regex):
         '''Remove the lines that match a given regex.'''
-        # Add a \n to make sure last line is parsed properly
-        content = self._get_content(name) + '\n'
-        count = len(content.split('\n'))
-        for r in regex:
-            content = re.sub('.*'+r+'.*\n', '', content)
-        count = count - len(content.split('\n'))
-        print('Removed %i lines.' % count)
-        return content[:-1]
+        matcher = streams.LineMatcher(regex)
+        return ''.join(self._filter_chunks([content], matcher))
+
+    def _filter_chunks(self, chunks, matcher):
+        '''Remove the lines that match a LineMatcher from a stream and
+           report the lines removed by each regex.'''
+        hits = [0] * len(matcher.patterns)
+        for chunk in streams.filter_lines(chunks, matcher, hits):
+            yield chunk
+        workers.report('Removed %i lines.' % sum(hits))
+        for pattern, count in zip(matcher.patterns, hits):
+            workers.report('    %i lines matched %s' % (count, pattern))
 
 
 # CLIFF CLI CREATOR CLASS
-class CliffShrinker(command.Command):
+class CliffShrinker(cli.Command):
     '''Shrinker commands'''
 
     def get_parser(self, prog_name):
@@ -488,9 +905,7 @@ def main(opts=None):
 
 
 if __name__ == "__main__":
-    start_time = time.time()
     main()
-    print("--- %s seconds ---" % (time.time() - start_time))
 
 
 # MFG 1/25/2018 parameters::
@@ -0,0 +1,146 @@
+'''
+sinks load the data log2json parses into a database, so a whole fleet of
+files is queried at once instead of loading their json files back.
+
+    dluxparser log2json -d logs --sink sqlite:fleet.db
+
+A sink is given as ``<kind>:<path>``, ``sqlite`` is the only kind. It gets
+a row per value parsed, taken before the data is compacted so elements keep
+their index, into the ``features`` table:
+
+    file        feature   element  key     value
+    host1.log   FeatureY  3        serial  X123
+
+``file`` is the path relative to the root folder, ``key`` is empty for
+values with no key. The files whose FeatureY 3 serial is X123 are then:
+
+    SELECT file FROM features WHERE feature = 'FeatureY' AND
+        key = 'serial' AND value = 'X123' AND element = 3
+
+Rows are inserted in transactions of about BATCH_ROWS rows, always whole
+files, and the indexes of a new database are created once it is loaded.
+Loading a file again replaces its rows, the other files keep theirs.
+
+log2json ``--index`` loads the sink INDEX_NAME of the output folder, which
+``dluxparser query`` searches with ``find``.
+'''
+import os
+
+# Kinds of sinks
+KINDS = ('sqlite',)
+
+# Rows inserted per transaction
+BATCH_ROWS = 50000
+
+# Database written into an output folder by log2json --index
+INDEX_NAME = '.dluxparser-index.sqlite'
+
+_TABLE = ('CREATE TABLE IF NOT EXISTS features ('
+          'file TEXT NOT NULL, feature TEXT NOT NULL, '
+          'element INTEGER NOT NULL, key TEXT NOT NULL, '
+          'value TEXT NOT NULL)')
+
+# Rows of a file, to replace them, and rows of a feature key and value
+_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS features_file ON features (file)',
+    'CREATE INDEX IF NOT EXISTS features_lookup '
+    'ON features (feature, key, value)',
+)
+
+
+def parse_spec(spec):
+    '''(kind, path) of a sink given as <kind>:<path>.'''
+    kind, _, path = spec.partition(':')
+    if kind not in KINDS or not path:
+        raise Exception("Invalid sink %s, it must be sqlite:<path>." % spec)
+    return kind, path
+
+
+def open_sink(spec):
+    '''Sink of a <kind>:<path> spec.'''
+    _, path = parse_spec(spec)
+    return SqliteSink(path)
+
+
+class SqliteSink(object):
+    '''Load the rows of parsed files into a SQLite database at path.'''
+
+    def __init__(self, path):
+        # Imported on demand, it is not part of the startup time
+        import sqlite3
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute(_TABLE)
+        # A new database has no rows to replace, it is indexed once loaded
+        self._replace = self._db.execute(
+            'SELECT 1 FROM features LIMIT 1').fetchone() is not None
+        if self._replace:
+            self._db.execute(_INDEXES[0])
+        self._db.commit()
+        self._pending = 0
+
+    def add(self, name, rows):
+        '''Load the (feature, element, key, value) rows of the file name,
+           in place of the ones it had.'''
+        self.forget(name)
+        self._db.executemany(
+            'INSERT INTO features VALUES (?, ?, ?, ?, ?)',
+            ((name, feature, element, key, value)
+             for feature, element, key, value in rows))
+        self._pending = self._pending + len(rows)
+        if self._pending >= BATCH_ROWS:
+            self._db.commit()
+            self._pending = 0
+
+    def forget(self, name):
+        '''Remove the rows of the file name.'''
+        if self._replace:
+            self._db.execute('DELETE FROM features WHERE file = ?', (name,))
+
+    def close(self):
+        '''Commit the rows left and create the indexes.'''
+        self._db.commit()
+        for index in _INDEXES:
+            self._db.execute(index)
+        self._db.commit()
+        self._db.close()
+
+
+def find(path, terms):
+    '''Sorted names of the files of the SQLite sink at path matching all
+       the terms.
+
+    A term is a (feature, element, key, value, prefix) tuple, element, key
+    and value are None to match any. With prefix, value is the beginning of
+    the values matched.
+    '''
+    if not os.path.isfile(path):
+        raise Exception("No database found at %s." % path)
+    queries = []
+    params = []
+    for feature, element, key, value, prefix in terms:
+        conditions = ['feature = ?']
+        params.append(feature)
+        if key is not None:
+            conditions.append('key = ?')
+            params.append(key)
+        if value and prefix:
+            # A range, unlike LIKE it is looked up on the index
+            conditions.append('value >= ? AND value < ?')
+            params.extend([value, value[:-1] + chr(ord(value[-1]) + 1)])
+        elif value is not None and not prefix:
+            conditions.append('value = ?')
+            params.append(value)
+        if element is not None:
+            conditions.append('element = ?')
+            params.append(element)
+        queries.append('SELECT DISTINCT file FROM features WHERE ' +
+                       ' AND '.join(conditions))
+
+    import sqlite3
+    db = sqlite3.connect(path)
+    try:
+        return [name for name, in db.execute(
+            ' INTERSECT '.join(queries) + ' ORDER BY file', params)]
+    finally:
+        db.close()
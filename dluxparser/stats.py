@@ -0,0 +1,266 @@
+'''
+stats measures where the time of a command run goes and reports on the
+files it parses.
+
+Jobs run through ``record`` keep per phase timings: ``read`` (reading and
+decoding the input), ``write`` (writing the outputs) and ``parse``
+(everything else), along with the bytes read and written and the peak
+resident memory of the process running them. The hooks below account
+nothing, and cost nothing, out of ``record``, so commands call them
+whether statistics were asked for or not.
+
+``Report`` prints the per file lines of a run, or a progress line now and
+then when quiet, and the statistics once the run is over:
+
+    Statistics:
+        Files: 400 parsed, 2 failed in 12.480 seconds.
+        Time per phase: read 1.210s, parse 9.870s, write 0.930s.
+        Input: 512.00 MB, 41.03 MB/s, 32.1 files/s. Output: 201.33 MB.
+        Peak memory: 61.2 MB.
+        Slowest files:
+            0.912s  logs/host1/boot.log
+
+Phase times add up the time spent on every file, with parallel jobs they
+can go over the time of the whole run. ``add_arguments`` gives a command
+the options ``Report`` takes.
+'''
+import contextlib
+import functools
+import heapq
+import json
+import os
+import threading
+import time
+
+from dluxparser import streams
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is not reported
+    resource = None
+
+# Seconds between progress lines when quiet
+PROGRESS_INTERVAL = 10
+
+# Number of slowest files reported
+SLOWEST = 10
+
+PHASES = ('read', 'parse', 'write')
+
+# Timings of the job being run on each thread
+_current = threading.local()
+
+
+def add_arguments(parser):
+    '''Add the -q/--quiet, --stats and --stats-json options to an argparse
+       parser.'''
+    parser.add_argument(
+        "-q", "--quiet", action='store_true', required=False,
+        help="Print only errors and a progress line now and then.")
+    parser.add_argument(
+        "--stats", action='store_true', required=False,
+        help="Report time per phase, throughput and peak memory.")
+    parser.add_argument(
+        "--stats-json", metavar="<file_name>",
+        action='store', required=False, dest='stats_json', type=str,
+        help="Save the statistics of the run into a json file.")
+
+
+def peak_memory():
+    '''Peak resident memory in MB of this process and its reaped children,
+       None if it can not be known.'''
+    if resource is None:
+        return None
+    # Linux reports KB
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return usage / 1024.0
+
+
+def record(func, job):
+    '''Run func on job, return its result and the timings of the job.
+
+    job is the input file name (or archive member), or a tuple starting
+    with it.
+    '''
+    origin = job if isinstance(job, str) else job[0]
+    # Archive members know their size
+    size = getattr(origin, 'size', None)
+    if size is None:
+        size = os.path.getsize(origin)
+    timings = {'read': 0.0, 'write': 0.0, 'bytes_in': size, 'bytes_out': 0}
+    _current.timings = timings
+    start = time.time()
+    try:
+        result = func(job)
+    finally:
+        del _current.timings
+    timings['seconds'] = time.time() - start
+    timings['parse'] = max(0.0, timings['seconds'] - timings['read'] -
+                           timings['write'])
+    timings['peak_mb'] = peak_memory()
+    return result, timings
+
+
+@contextlib.contextmanager
+def timer(phase):
+    '''Add the time spent in the with block to phase.'''
+    timings = getattr(_current, 'timings', None)
+    if timings is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        timings[phase] = timings[phase] + time.time() - start
+
+
+def timed(phase, chunks):
+    '''Stream of chunks adding the time taken to produce each to phase.'''
+    timings = getattr(_current, 'timings', None)
+    if timings is None:
+        return chunks
+    return _timed(timings, phase, chunks)
+
+
+def _timed(timings, phase, chunks):
+    chunks = iter(chunks)
+    while True:
+        start = time.time()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            timings[phase] = timings[phase] + time.time() - start
+        yield chunk
+
+
+def lines(the_file):
+    '''Lines of a text file, read in timed chunks when recording.'''
+    if getattr(_current, 'timings', None) is None:
+        return the_file
+    return streams.iter_lines(timed('read', streams.read_chunks(the_file)))
+
+
+def written(file_name, size=None):
+    '''Account a complete output file, of size bytes if it is not a file
+       on disk.'''
+    timings = getattr(_current, 'timings', None)
+    if timings is not None:
+        if size is None:
+            size = os.path.getsize(file_name)
+        timings['bytes_out'] = timings['bytes_out'] + size
+
+
+class Report(object):
+    '''Lines about the files of a run and its statistics.
+
+    args are the parsed command line: ``quiet`` prints only the lines of
+    files with errors and a progress line every PROGRESS_INTERVAL seconds,
+    ``stats`` and ``stats_json`` report the statistics on the output and
+    into a json file.
+    '''
+
+    def __init__(self, args):
+        self.quiet = getattr(args, 'quiet', False)
+        self.json_path = getattr(args, 'stats_json', None)
+        self.printed = bool(getattr(args, 'stats', False))
+        self.enabled = bool(self.printed or self.json_path)
+        self.count = self.errors = 0
+        self.start = self._shown = time.time()
+        self.totals = dict((key, 0) for key in
+                           PHASES + ('bytes_in', 'bytes_out'))
+        self.peak = None
+        self._slowest = []
+
+    def wrap(self, func):
+        '''func recording its timings if statistics are enabled.'''
+        if not self.enabled:
+            return func
+        return functools.partial(record, func)
+
+    def add(self, origin, outcome, error):
+        '''Account a file run through wrap, return the result of func.'''
+        self.count = self.count + 1
+        if error:
+            self.errors = self.errors + 1
+            return outcome
+        if not self.enabled:
+            return outcome
+
+        outcome, timings = outcome
+        for key in self.totals:
+            self.totals[key] = self.totals[key] + timings[key]
+        if timings['peak_mb'] is not None:
+            self.peak = max(self.peak or 0, timings['peak_mb'])
+        item = (timings['seconds'], self.count, origin, timings)
+        if len(self._slowest) < SLOWEST:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heappushpop(self._slowest, item)
+        return outcome
+
+    def show(self, lines):
+        '''Print the lines about a file. When quiet only the ones of files
+           with errors are printed, and the progress from time to time.'''
+        if not self.quiet or any(line.startswith('<--') for line in lines):
+            for line in lines:
+                print(line)
+        if self.quiet and time.time() - self._shown >= PROGRESS_INTERVAL:
+            self._shown = time.time()
+            print("%i files parsed, %i failed." % (self.count, self.errors))
+
+    def close(self):
+        '''Print the statistics if asked for, save them if a file is.'''
+        if not self.enabled:
+            return
+        summary = self.summary()
+        if self.json_path:
+            with open(self.json_path, 'w') as the_file:
+                json.dump(summary, the_file, indent=4, sort_keys=True)
+        if not self.printed:
+            return
+        print("Statistics:")
+        print("    Files: %i parsed, %i failed in %.3f seconds." %
+              (summary['files'] - summary['failed'], summary['failed'],
+               summary['seconds']))
+        print("    Time per phase: %s." % ', '.join(
+            '%s %.3fs' % (phase, summary['phases'][phase])
+            for phase in PHASES))
+        print("    Input: %.2f MB, %.2f MB/s, %.1f files/s. "
+              "Output: %.2f MB." %
+              (summary['bytes_in'] / 1048576.0, summary['mb_per_s'],
+               summary['files_per_s'], summary['bytes_out'] / 1048576.0))
+        if summary['peak_mb'] is not None:
+            print("    Peak memory: %.1f MB." % summary['peak_mb'])
+        if summary['slowest']:
+            print("    Slowest files:")
+            for item in summary['slowest']:
+                print("        %.3fs  %s" % (item['seconds'], item['file']))
+
+    def summary(self):
+        '''Statistics of the run as a dictionary.'''
+        seconds = max(time.time() - self.start, 1e-6)
+        peak = peak_memory()
+        if peak is not None and self.peak is not None:
+            peak = max(peak, self.peak)
+        slowest = []
+        for item in sorted(self._slowest, reverse=True):
+            entry = dict(item[3], file=item[2])
+            del entry['peak_mb']
+            slowest.append(entry)
+        return {
+            'files': self.count,
+            'failed': self.errors,
+            'seconds': seconds,
+            'phases': dict((phase, self.totals[phase]) for phase in PHASES),
+            'bytes_in': self.totals['bytes_in'],
+            'bytes_out': self.totals['bytes_out'],
+            'mb_per_s': self.totals['bytes_in'] / 1048576.0 / seconds,
+            'files_per_s': self.count / seconds,
+            'peak_mb': peak,
+            'slowest': slowest,
+        }
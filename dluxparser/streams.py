@@ -0,0 +1,400 @@
+'''
+streams holds the text streaming helpers shared by the commands.
+
+A stream is an iterable of text chunks. A chunk holds one or more whole
+lines, so every chunk ends with '\\n' except maybe the last one. Helpers
+consume a stream and yield a new one, so the content of a file goes
+through a chain of them in a single pass and only a few chunks are held
+in memory at any time.
+
+Regexes are searched on the current chunk plus the last lines of the
+previous one, so only patterns whose matches span a known number of lines
+can be streamed, see ``compile_bounded``.
+'''
+import collections
+import re
+import tempfile
+
+# Characters read at once from a file, rounded up to a whole line
+CHUNK_SIZE = 64 * 1024
+
+# Text kept in memory by a Spool before moving it to a temporary file
+SPOOL_SIZE = 8 * 1024 * 1024
+
+# Escapes that can match a newline or depend on text out of the window
+_UNBOUNDED_ESCAPES = 'sSDWAZxuUN0123456789'
+
+# Characters that give a pattern a meaning other than the plain string
+_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+
+def read_chunks(the_file, size=CHUNK_SIZE):
+    '''Read a text file as a stream of chunks of whole lines.'''
+    while True:
+        chunk = the_file.read(size)
+        if not chunk:
+            return
+        if not chunk.endswith('\n'):
+            chunk = chunk + the_file.readline()
+        yield chunk
+
+
+def iter_lines(chunks):
+    '''Lines of a stream, each with its '\\n' but maybe the last one.'''
+    rest = ''
+    for chunk in chunks:
+        lines = (rest + chunk).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if rest:
+        yield rest
+
+
+def line_span(pattern):
+    '''Number of lines a match of the regex pattern can span.
+
+    Newlines out of groups, classes and quantifiers add a line to the
+    span. None is returned for patterns that can match an unknown number
+    of newlines or that depend on the start or end of the whole text.
+    '''
+    span = 1
+    depth = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        newline = char == '\n'
+        if char == '\\':
+            escaped = pattern[index + 1:index + 2]
+            if escaped in _UNBOUNDED_ESCAPES:
+                return None
+            newline = escaped == 'n'
+            index = index + 1
+        elif char == '[':
+            end = _class_end(pattern, index)
+            item = pattern[index + 1:end]
+            if (end < 0 or item.startswith('^') or '\n' in item or
+                    re.search(r'\\[n' + _UNBOUNDED_ESCAPES + ']', item)):
+                return None
+            index = end
+        elif char in '^$':
+            return None
+        elif char == '(':
+            flags = re.match(r'\(\?([a-zA-Z-]*)', pattern[index:])
+            if flags and set(flags.group(1)) & set('smx'):
+                return None
+            depth = depth + 1
+        elif char == ')':
+            depth = depth - 1
+
+        if newline:
+            if depth or pattern[index + 1:index + 2] in ('*', '+', '?', '{'):
+                return None
+            span = span + 1
+        index = index + 1
+    return span
+
+
+def _class_end(pattern, start):
+    '''Index of the ']' closing the class opened at start, -1 if none.'''
+    index = start + 1
+    if pattern[index:index + 1] == '^':
+        index = index + 1
+    if pattern[index:index + 1] == ']':
+        index = index + 1
+    while index < len(pattern):
+        if pattern[index] == '\\':
+            index = index + 1
+        elif pattern[index] == ']':
+            return index
+        index = index + 1
+    return -1
+
+
+def _last_lines(text, num):
+    '''Index where the last num lines of text start.'''
+    index = len(text) - 1 if text.endswith('\n') else len(text)
+    while num > 0:
+        index = text.rfind('\n', 0, index)
+        if index < 0:
+            return 0
+        num = num - 1
+    return index + 1
+
+
+def is_regex(pattern):
+    '''Whether pattern has metacharacters, else it is a plain string.'''
+    return bool(_METACHARACTERS.intersection(pattern))
+
+
+def compile_bounded(pattern):
+    '''Compile pattern for streaming, return (regex, span) or None.
+
+    None means the pattern must be searched on the whole text: its span
+    is unbounded or it has groups, which re.split would return as well.
+    '''
+    span = line_span(pattern)
+    regex = re.compile(pattern)
+    if span is None or regex.groups:
+        return None
+    return regex, span
+
+
+class Splitter(object):
+    '''Split a stream on the first match of a regex.
+
+    before() yields the text before the match, then found tells whether
+    there was a match and after() yields the text following it.
+    Each chunk is searched along with the last span lines of the previous
+    text. A match is only taken once the searched text holds all the lines
+    it could span and some text after it, so it is the same match
+    re.search finds on the whole text.
+    '''
+
+    def __init__(self, chunks, regex, span):
+        self.found = False
+        self._chunks = iter(chunks)
+        self._regex = regex
+        self._span = span
+        self._rest = ''
+
+    def before(self):
+        text = ''
+        for chunk in self._chunks:
+            text = text + chunk
+            match = self._regex.search(text)
+            if match and self._complete(text, match):
+                break
+            # Keep the lines a match could still start on
+            start = _last_lines(text, self._span)
+            if start:
+                yield text[:start]
+                text = text[start:]
+        else:
+            # End of stream, take any match on the remaining text
+            match = self._regex.search(text)
+            if not match:
+                if text:
+                    yield text
+                return
+
+        if match.start():
+            yield text[:match.start()]
+        self._rest = text[match.end():]
+        self.found = True
+
+    def after(self):
+        if self._rest:
+            yield self._rest
+        for chunk in self._chunks:
+            yield chunk
+
+    def _complete(self, text, match):
+        return (match.end() < len(text) and
+                text.count('\n', match.start()) >= self._span)
+
+
+class Spool(object):
+    '''Keep text aside to replay it later.
+
+    Text is kept in memory up to SPOOL_SIZE characters and then moved to
+    a temporary file.
+    '''
+
+    def __init__(self):
+        self._file = tempfile.SpooledTemporaryFile(
+            max_size=SPOOL_SIZE, mode='w+', newline='\n')
+
+    def write(self, chunk):
+        self._file.write(chunk)
+
+    def replay(self):
+        self._file.seek(0)
+        for chunk in read_chunks(self._file):
+            yield chunk
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+
+class LineMatcher(object):
+    '''Tell which of several regex patterns a line matches.
+
+    Patterns are searched as plain strings when none has metacharacters,
+    otherwise they are combined in a single compiled regex, one group per
+    pattern. Patterns with groups or global flags of their own can not be
+    combined and are searched one by one.
+    Each pattern is searched on a single line as if wrapped in a group:
+    ``^`` and ``$`` anchor at its start and end and ``|`` alternates the
+    whole pattern, as with ``(?:pattern)``.
+    '''
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._literals = None
+        self._combined = None
+        if not any(is_regex(p) for p in self.patterns):
+            self._literals = self.patterns
+            return
+
+        self._regexes = [re.compile(p) for p in self.patterns]
+        default = re.compile('').flags
+        if not any(r.groups or r.flags != default for r in self._regexes):
+            self._combined = re.compile(
+                '|'.join('(%s)' % p for p in self.patterns))
+
+    def match(self, line):
+        '''Index of the first pattern found in line, None if none is.'''
+        if self._literals is not None:
+            for index, literal in enumerate(self._literals):
+                if literal in line:
+                    return index
+            return None
+
+        if self._combined is not None:
+            match = self._combined.search(line)
+            if not match:
+                return None
+            # The leftmost match may not come from the first pattern
+            found = match.lastindex - 1
+            for index in range(found):
+                if self._regexes[index].search(line):
+                    return index
+            return found
+
+        for index, regex in enumerate(self._regexes):
+            if regex.search(line):
+                return index
+        return None
+
+    def search(self, text):
+        '''Whether any pattern may match a line of text.
+
+        Only plain strings are looked up on the whole text, for regexes
+        it is always True.
+        '''
+        if self._literals is None:
+            return True
+        return any(literal in text for literal in self._literals)
+
+
+def filter_lines(chunks, matcher, hits):
+    '''Drop the lines matching any pattern of a LineMatcher.
+
+    The text is split on '\\n' and the lines kept are joined back with
+    it, so removing a last line without newline also removes the newline
+    before it. Chunks of kept lines are held until the next one, so each
+    ends with its '\\n' but the last. hits[i] is increased by the lines
+    removed by pattern i.
+    '''
+    pending = None
+    rest = ''
+    for chunk in chunks:
+        chunk = rest + chunk
+        end = chunk.rfind('\n') + 1
+        rest = chunk[end:]
+        if not end:
+            continue
+        if matcher.search(chunk[:end]):
+            lines = chunk[:end - 1].split('\n')
+            kept = []
+            for line in lines:
+                index = matcher.match(line)
+                if index is None:
+                    kept.append(line)
+                else:
+                    hits[index] = hits[index] + 1
+            if not kept:
+                continue
+            text = '\n'.join(kept)
+        else:
+            text = chunk[:end - 1]
+        if pending is not None:
+            yield pending + '\n'
+        pending = text
+
+    # Text after the last newline, an empty line if it ends the text
+    index = matcher.match(rest)
+    if index is None:
+        if pending is not None:
+            yield pending + '\n'
+        yield rest
+    else:
+        hits[index] = hits[index] + 1
+        if pending is not None:
+            yield pending
+
+
+def after_match(chunks, regex, span):
+    '''Text after the first match of regex, all the text if none matches.'''
+    splitter = Splitter(chunks, regex, span)
+    spool = Spool()
+    for chunk in splitter.before():
+        spool.write(chunk)
+    if not splitter.found:
+        for chunk in spool.replay():
+            yield chunk
+        return
+    spool.close()
+    for chunk in splitter.after():
+        yield chunk
+
+
+def before_match(chunks, regex, span):
+    '''Text before the first match of regex, all the text if none matches.'''
+    splitter = Splitter(chunks, regex, span)
+    for chunk in splitter.before():
+        yield chunk
+
+
+def skip_lines(chunks, num):
+    '''Drop the first num lines, the stream must have num newlines.'''
+    for chunk in chunks:
+        if num > 0:
+            count = chunk.count('\n')
+            if count < num:
+                num = num - count
+                continue
+            index = -1
+            while num > 0:
+                index = chunk.find('\n', index + 1)
+                num = num - 1
+            chunk = chunk[index + 1:]
+        if chunk:
+            yield chunk
+    if num > 0:
+        raise Exception("Unable to remove lines, not enough lines.")
+
+
+def drop_last_lines(chunks, num):
+    '''Drop the text after the num-th newline from the end and it.
+
+    Only the chunks holding the last num lines are kept in memory.
+    '''
+    if not num:
+        for chunk in chunks:
+            yield chunk
+        return
+
+    pending = collections.deque()
+    newlines = 0
+    for chunk in chunks:
+        count = chunk.count('\n')
+        pending.append((chunk, count))
+        newlines = newlines + count
+        # The first chunk is not needed if the rest holds num newlines
+        while newlines - pending[0][1] >= num:
+            first, count = pending.popleft()
+            newlines = newlines - count
+            yield first
+
+    text = ''.join(chunk for chunk, _ in pending)
+    cut = len(text)
+    while num > 0:
+        cut = text.rfind('\n', 0, cut)
+        if cut < 0:
+            raise Exception("Unable to remove lines, not enough lines.")
+        num = num - 1
+    if cut:
+        yield text[:cut]
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+import unittest
+
+from dluxparser import api
+from dluxparser.tests import test_log2json
+
+LOG = (
+    'Tx64 display.cfg file\n'
+    '*****\n'
+    'dlux header\n'
+    'Hostname = alpha\n'
+    'number of fans = 2\n'
+    'FeatureY 1 serial = X1\n'
+    'FeatureY 2 serial = X2\n' +
+    '*' * 25 + '\n'
+    'Trailer = last\n'
+)
+
+TABLE = (
+    'name,size\n'
+    'alpha,16\n'
+    'count,3\n'
+    '"beta\ntwo",8\n'
+    'gamma,4\n'
+)
+
+
+def _pieces(text, size=5):
+    '''Text in chunks of size characters, lines split anywhere.'''
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+class TestInputs(unittest.TestCase):
+    '''Files, lines and chunks of any size give the same outcome.'''
+
+    def test_log2json(self):
+        for text in test_log2json.SAMPLES:
+            expected = api.log2json(text.splitlines(True))
+            self.assertEqual(api.log2json(io.StringIO(text)), expected)
+            self.assertEqual(api.log2json(_pieces(text)), expected)
+            self.assertEqual(api.log2json(_pieces(text), engine='legacy'),
+                             expected)
+
+    def test_csv_records(self):
+        expected = list(csv.DictReader(io.StringIO(TABLE)))
+        self.assertEqual(list(api.csv_records(io.StringIO(TABLE))), expected)
+        self.assertEqual(list(api.csv_records(_pieces(TABLE))), expected)
+
+    def test_csv2json(self):
+        expected = json.dumps(list(csv.DictReader(io.StringIO(TABLE))))
+        self.assertEqual(''.join(api.csv2json(io.StringIO(TABLE))),
+                         expected)
+        self.assertEqual(''.join(api.csv2json(_pieces(TABLE))), expected)
+
+
+class TestChaining(unittest.TestCase):
+    '''Streams of the shrinker functions feed the parsers.'''
+
+    def test_log2json(self):
+        messages = []
+        chunks = api.extract_section(io.StringIO(LOG), 'dlux header',
+                                     '[*]{25}', messages=messages)
+        chunks = api.remove_from_regex(chunks, ['number of'])
+        self.assertEqual(api.log2json(chunks), {
+            'Hostname': 'alpha',
+            'FeatureY': [{'serial': 'X1'}, {'serial': 'X2'}],
+        })
+        self.assertEqual(messages, [])
+
+    def test_pieces(self):
+        chunks = api.remove_section(_pieces(LOG), 'Tx64', 'dlux header')
+        chunks = api.remove_from_bottom(chunks, 2)
+        chunks = api.to_lower(chunks)
+        self.assertEqual(api.log2json(chunks), {
+            'hostname': 'alpha',
+            'number': {'of_fans': '2'},
+            'featurey': [{'serial': 'x1'}, {'serial': 'x2'}],
+        })
+
+    def test_csv(self):
+        chunks = api.remove_from_top(io.StringIO(TABLE), 0)
+        chunks = api.remove_from_regex(chunks, ['^count'])
+        records = list(api.csv_records(chunks))
+        self.assertEqual([record['name'] for record in records],
+                         ['alpha', 'beta\ntwo', 'gamma'])
+        chunks = api.remove_from_regex(_pieces(TABLE), ['^count'])
+        self.assertEqual(json.loads(''.join(api.csv2json(chunks))),
+                         records)
+
+    def test_messages(self):
+        messages = []
+        chunks = api.remove_section(io.StringIO(LOG), 'not there', 'x',
+                                    messages=messages)
+        self.assertEqual(''.join(chunks), LOG)
+        self.assertEqual(messages,
+                         ["<-- Error: Initial string not found  not there"])
+
+
+if __name__ == '__main__':
+    unittest.main()
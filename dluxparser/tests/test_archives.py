@@ -0,0 +1,119 @@
+import contextlib
+import gzip
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import warnings
+import zipfile
+
+from dluxparser import log2json
+from dluxparser import shrinker
+
+FILES = {
+    'host1.log': 'Hostname = alpha\nFeatureY 1 serial = X1\n',
+    'sub/host2.log': 'Hostname = beta\nMemory 1 size = 8 GB\n',
+    'sub/deep/host3.log.gz': 'Hostname = gamma\n',
+}
+
+
+class TestArchives(unittest.TestCase):
+    '''Archives read and written give the outputs of plain folders.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'logs')
+        for name, text in FILES.items():
+            path = os.path.join(self.root_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            opener = gzip.open if name.endswith('.gz') else open
+            with opener(path, 'wt') as the_file:
+                the_file.write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _tar(self, members=FILES):
+        path = os.path.join(self.tmp, 'logs.tar.gz')
+        with tarfile.open(path, 'w:gz') as archive:
+            for member in sorted(members):
+                archive.add(os.path.join(self.root_dir, member), member)
+        return path
+
+    def _zip(self):
+        path = os.path.join(self.tmp, 'logs.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            for member in sorted(FILES):
+                archive.write(os.path.join(self.root_dir, member), member)
+        return path
+
+    def _run(self, command, root_dir, output_dir):
+        '''Outcome of a run of command on root_dir.'''
+        module = log2json if command[0] == 'log2json' else shrinker
+        args = module.ArgumentParser().parse_args(
+            command[1:] + ['-d', root_dir, '-o', output_dir, '-q'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            if module is log2json:
+                return log2json.Log2Json(args).parse()
+            return getattr(shrinker.Shrinker(args), args.func)()
+
+    def _folder(self, path):
+        '''Text of every file of a folder by name.'''
+        return dict((name, open(os.path.join(path, name), 'r').read())
+                    for name in os.listdir(path))
+
+    def _expected(self, command):
+        output_dir = os.path.join(self.tmp, 'expected')
+        self.assertFalse(self._run(command, self.root_dir, output_dir))
+        return self._folder(output_dir)
+
+    def test_tar_to_zip(self):
+        for command in (['log2json'], ['shrinker', 'to-lower']):
+            expected = self._expected(command)
+            output = os.path.join(self.tmp, 'out.zip')
+            self.assertFalse(self._run(command, self._tar(), output))
+            with zipfile.ZipFile(output) as archive:
+                self.assertEqual(
+                    dict((name, archive.read(name).decode())
+                         for name in archive.namelist()), expected)
+            os.remove(output)
+
+    def test_zip_to_folder(self):
+        expected = self._expected(['log2json'])
+        self.assertEqual(sorted(expected),
+                         ['host1.json', 'host2.json', 'host3.json'])
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertFalse(self._run(['log2json'], self._zip(), output_dir))
+        self.assertEqual(self._folder(output_dir), expected)
+
+    def test_zip_to_tar(self):
+        expected = self._expected(['log2json'])
+        output = os.path.join(self.tmp, 'out.tar.xz')
+        self.assertFalse(self._run(['log2json'], self._zip(), output))
+        with tarfile.open(output) as archive:
+            self.assertEqual(
+                dict((info.name, archive.extractfile(info).read().decode())
+                     for info in archive), expected)
+
+    def test_duplicate_names(self):
+        expected = self._expected(['log2json'])
+        # Both are written as host1.json, the first one stays
+        with gzip.open(os.path.join(self.root_dir, 'host1.log.gz'),
+                       'wt') as the_file:
+            the_file.write('Hostname = other\n')
+        tar = self._tar(sorted(FILES) + ['host1.log.gz'])
+        output = os.path.join(self.tmp, 'out.zip')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertEqual(self._run(['log2json'], tar, output), 1)
+        self.assertEqual(caught, [])
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(sorted(archive.namelist()), sorted(expected))
+            self.assertEqual(archive.read('host1.json').decode(),
+                             expected['host1.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
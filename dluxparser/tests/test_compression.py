@@ -0,0 +1,76 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import compression
+from dluxparser import log2json
+
+TEXT = 'Hostname = alpha\nFeatureY 1 serial = X1\ncaf\xe9 = cr\xe8me\n'
+
+
+class TestCompression(unittest.TestCase):
+    '''Compressed files are read and written as their plain text.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, name, kind):
+        path = os.path.join(self.tmp, name)
+        with compression.open_text(path, 'w', kind) as the_file:
+            the_file.write(TEXT)
+        return path
+
+    def test_formats(self):
+        for kind in compression.FORMATS + (None,):
+            # Recognized by their first bytes, whatever their name
+            path = self._write('input-%s.log' % kind, kind)
+            self.assertEqual(compression.detect(path), kind)
+            with compression.open_text(path) as the_file:
+                self.assertEqual(the_file.read(), TEXT)
+            with open(path, 'rb') as binary:
+                the_file = compression.open_binary(io.BufferedReader(binary))
+                self.assertEqual(the_file.read(), TEXT)
+
+    def test_names(self):
+        self.assertEqual(compression.plain_name('boot.log.gz'), 'boot.log')
+        self.assertEqual(compression.plain_name('boot.log.bz2'), 'boot.log')
+        self.assertEqual(compression.plain_name('.xz'), '.xz')
+        self.assertEqual(compression.output_name('boot.json.gz'),
+                         'boot.json')
+        self.assertEqual(compression.output_name('boot.json.gz', 'xz'),
+                         'boot.json.xz')
+
+    def test_log2json(self):
+        root_dir = os.path.join(self.tmp, 'logs')
+        os.makedirs(root_dir)
+        for kind in compression.FORMATS:
+            name = 'h-%s.log%s' % (kind, compression.SUFFIXES[kind])
+            with compression.open_text(os.path.join(root_dir, name), 'w',
+                                       kind) as the_file:
+                the_file.write(TEXT)
+        output_dir = os.path.join(self.tmp, 'out')
+        args = log2json.ArgumentParser().parse_args(
+            ['-d', root_dir, '-o', output_dir, '--compress', 'xz', '-q'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertFalse(log2json.Log2Json(args).parse())
+        expected = log2json.Log2Json(args, folders=False).parse_text(
+            TEXT.splitlines(True))
+        self.assertEqual(sorted(os.listdir(output_dir)),
+                         ['h-%s.json.xz' % kind
+                          for kind in sorted(compression.FORMATS)])
+        for name in os.listdir(output_dir):
+            path = os.path.join(output_dir, name)
+            self.assertEqual(compression.detect(path), 'xz')
+            with compression.open_text(path) as the_file:
+                self.assertEqual(json.load(the_file), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import csv2json
+
+# Quoted delimiters, quotes and new lines, empty and non ASCII fields
+TABLE = (
+    'name,size,notes\n'
+    'alpha,16,plain\n'
+    '"beta, two",8,"said ""hi"""\n'
+    'gamma,,"two\nlines"\n'
+    'delta,4,caf\xe9 ☃\n'
+    'short,1\n'
+    'long,2,three,four\n'
+)
+
+
+def _old_convert(path):
+    '''Json text of a csv file as the first csv2json wrote it.'''
+    with open(path, 'r') as csvfile:
+        reader = csv.DictReader(csvfile)
+        return json.dumps([row for row in reader])
+
+
+class _Csv2JsonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'tables')
+        os.makedirs(self.root_dir)
+        self.tables = {
+            'small.csv': TABLE,
+            'header.csv': 'name,size\n',
+            # Enough rows for several batches and writes
+            'big.csv': 'id,value,text\n' + ''.join(
+                '%i,%i.5,"row %i, ""quoted""\n"\n' % (row, row * 3, row)
+                for row in range(5000)),
+        }
+        for name, text in self.tables.items():
+            with open(os.path.join(self.root_dir, name), 'w') as the_file:
+                the_file.write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _args(self, *options):
+        return csv2json.ArgumentParser().parse_args(
+            ['--root-dir', self.root_dir, '-q'] + list(options))
+
+
+class TestCsv2Json(_Csv2JsonTest):
+    '''Streamed json is the json of the whole table encoded at once.'''
+
+    def _check_files(self, output_dir):
+        for name in self.tables:
+            json_name = os.path.splitext(name)[0] + '.json'
+            with open(os.path.join(output_dir, json_name), 'r') as the_file:
+                self.assertEqual(
+                    the_file.read(),
+                    _old_convert(os.path.join(self.root_dir, name)), name)
+
+    def test_files(self):
+        self.assertFalse(csv2json.Csv2Json(self._args()).parse())
+        self._check_files(self.root_dir)
+
+    def test_small_batches(self):
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertFalse(csv2json.Csv2Json(self._args(
+            '-o', output_dir, '-b', '7')).parse())
+        self._check_files(output_dir)
+
+    def test_parallel(self):
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertFalse(csv2json.Csv2Json(self._args(
+            '-o', output_dir, '-j', '2')).parse())
+        self._check_files(output_dir)
+
+    def test_threads(self):
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertFalse(csv2json.Csv2Json(self._args(
+            '-o', output_dir, '-j', '2', '--pool', 'thread')).parse())
+        self._check_files(output_dir)
+
+    def test_convert(self):
+        args = self._args('-b', '2')
+        converter = csv2json.Csv2Json(args, folders=False)
+        for name, text in self.tables.items():
+            self.assertEqual(
+                ''.join(converter.convert(text.splitlines(True))),
+                _old_convert(os.path.join(self.root_dir, name)), name)
+
+
+class TestParts(_Csv2JsonTest):
+    '''Json Lines and part files hold the rows of the whole table.'''
+
+    def _parts(self, output_dir, name, ext='json'):
+        '''Text of the numbered parts of name, in order.'''
+        parts = []
+        while True:
+            path = os.path.join(output_dir, '%s.%05i.%s' %
+                                (name, len(parts) + 1, ext))
+            if not os.path.exists(path):
+                return parts
+            with open(path, 'r') as the_file:
+                parts.append(the_file.read())
+
+    def _rows(self, name):
+        return json.loads(_old_convert(os.path.join(self.root_dir, name)))
+
+    def test_jsonl(self):
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertFalse(csv2json.Csv2Json(self._args(
+            '-o', output_dir, '--format', 'jsonl')).parse())
+        for name in self.tables:
+            base = os.path.splitext(name)[0]
+            with open(os.path.join(output_dir, base + '.jsonl'),
+                      'r') as the_file:
+                lines = the_file.read().splitlines()
+            self.assertEqual([json.loads(line) for line in lines],
+                             self._rows(name), name)
+
+    def test_split_rows(self):
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertFalse(csv2json.Csv2Json(self._args(
+            '-o', output_dir, '--split-rows', '1000')).parse())
+        parts = self._parts(output_dir, 'big')
+        self.assertEqual(len(parts), 5)
+        self.assertEqual(sum((json.loads(part) for part in parts), []),
+                         self._rows('big.csv'))
+        # A header only table still gets its part
+        self.assertEqual(self._parts(output_dir, 'header'), ['[]'])
+
+    def test_split_bytes(self):
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertFalse(csv2json.Csv2Json(self._args(
+            '-o', output_dir, '--split-bytes', '4000', '--format',
+            'jsonl')).parse())
+        parts = self._parts(output_dir, 'big', 'jsonl')
+        self.assertGreater(len(parts), 1)
+        for part in parts:
+            self.assertLessEqual(len(part), 4000)
+        self.assertEqual([json.loads(line) for part in parts
+                          for line in part.splitlines()],
+                         self._rows('big.csv'))
+        self.assertFalse(os.path.exists(os.path.join(output_dir,
+                                                     'big.jsonl')))
+
+
+class TestLayouts(unittest.TestCase):
+    '''Rows and columnar layouts hold the table, typed on request.'''
+
+    TYPED = (
+        'id,ratio,flag,code,big,text\n'
+        '1,0.5,true,007,1e400,a\n'
+        '-2,3,False,1,2,b\n'
+        ',,,,,\n'
+        '4,1e3,true,2,3\n'
+    )
+
+    def _convert(self, text, *options):
+        args = csv2json.ArgumentParser().parse_args(['-f', '-'] +
+                                                    list(options))
+        converter = csv2json.Csv2Json(args, folders=False)
+        return ''.join(converter.convert(text.splitlines(True)))
+
+    def test_rows(self):
+        rows = list(csv.reader(TABLE.splitlines(True)))
+        width = len(rows[0])
+        table = json.loads(self._convert(TABLE, '--layout', 'rows'))
+        self.assertEqual(table, {
+            'columns': rows[0],
+            'data': [(row + [None] * width)[:width] for row in rows[1:]],
+        })
+
+    def test_columnar(self):
+        records = json.loads(self._convert(TABLE))
+        columnar = json.loads(self._convert(TABLE, '--layout', 'columnar'))
+        self.assertEqual(list(columnar['data']), columnar['columns'])
+        for column, values in columnar['data'].items():
+            self.assertEqual(values,
+                             [record.get(column) for record in records])
+
+    def test_jsonl_rows(self):
+        lines = self._convert(TABLE, '--layout', 'rows', '--format',
+                              'jsonl').splitlines()
+        self.assertEqual(json.loads(lines[0]), ['name', 'size', 'notes'])
+        self.assertEqual(json.loads(lines[1]), ['alpha', '16', 'plain'])
+        self.assertEqual(len(lines), 7)
+
+    def test_infer_types(self):
+        expected = {
+            'id': [1, -2, None, 4],
+            'ratio': [0.5, 3.0, None, 1000.0],
+            'flag': [True, False, None, True],
+            # Leading zeros, numbers over a float and text stay strings
+            'code': ['007', '1', '', '2'],
+            'big': ['1e400', '2', '', '3'],
+            'text': ['a', 'b', '', None],
+        }
+        columnar = json.loads(self._convert(
+            self.TYPED, '--layout', 'columnar', '--infer-types'))
+        self.assertEqual(columnar['data'], expected)
+        rows = json.loads(self._convert(
+            self.TYPED, '--layout', 'rows', '--infer-types'))
+        self.assertEqual(rows['data'], [list(row) for row in
+                                        zip(*expected.values())])
+        self.assertNotIn('Infinity', self._convert(
+            self.TYPED, '--layout', 'rows', '--infer-types'))
+
+    def test_infer_records(self):
+        self.assertRaises(Exception, self._convert, self.TYPED,
+                          '--infer-types')
+
+
+if __name__ == '__main__':
+    unittest.main()
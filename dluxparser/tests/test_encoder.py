@@ -0,0 +1,68 @@
+import json
+import unittest
+
+from dluxparser import encoder
+
+DATA = (
+    {'Hostname': 'alpha', 'FeatureY': [{'serial': 'X1'}, {'serial': 'X2'}],
+     'FeatureX': {'key_A': 'value'}, 'Empty': {}, 'Count': 2},
+    {'Caf\xe9': 'cr\xe8me ☃', 'plain': 'ascii', 'emoji': '\U0001f600'},
+    {'quoted': 'a "b" \\ c\n\t', 'control': '\x00\x1f'},
+    ['x', 1, None, True, 1.5],
+    {},
+    'text \xe9',
+)
+
+
+class _FakeOrjson(object):
+    '''orjson like encoder writing non ASCII characters as they are.'''
+
+    OPT_NON_STR_KEYS = 1
+
+    def dumps(self, data, option=None):
+        return json.dumps(data, separators=(',', ':'),
+                          ensure_ascii=False).encode('utf-8')
+
+
+class TestEncoder(unittest.TestCase):
+    '''Every style gives the text of the standard library.'''
+
+    def tearDown(self):
+        encoder._orjson = None
+
+    def _check(self):
+        for data in DATA:
+            self.assertEqual(''.join(encoder.iterencode(data)),
+                             json.dumps(data, indent=4))
+            compact = json.dumps(data, separators=(',', ':'))
+            self.assertEqual(encoder.encode(data, 'compact'), compact)
+            self.assertEqual(''.join(encoder.iterencode(data, 'compact')),
+                             compact)
+
+    def test_standard_library(self):
+        encoder._orjson = False
+        self._check()
+
+    def test_non_ascii(self):
+        # Escaped as the standard library does, whatever the encoder
+        encoder._orjson = _FakeOrjson()
+        self._check()
+        self.assertEqual(encoder.encode({'k': '\xe9'}, 'compact'),
+                         '{"k":"\\u00e9"}')
+
+    @unittest.skipIf(encoder._fast() is None, 'orjson is not installed')
+    def test_orjson(self):
+        encoder._orjson = None
+        self._check()
+
+    def test_chunks(self):
+        data = dict(('key %i' % index, 'value %i' % index)
+                    for index in range(5000))
+        chunks = list(encoder.iterencode(data, 'compact'))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks),
+                         json.dumps(data, separators=(',', ':')))
+
+
+if __name__ == '__main__':
+    unittest.main()
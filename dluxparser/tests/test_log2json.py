@@ -0,0 +1,231 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import log2json
+
+# Inputs both engines must parse alike
+SAMPLES = (
+    # Features with no number, with a key and with elements
+    "Hostname = alpha\n"
+    "FeatureX key A = value one\n"
+    "FeatureX key B = value two\n"
+    "FeatureY 1 serial = X1\n"
+    "FeatureY 1 size = 16 GB\n"
+    "FeatureY 2 serial = X2\n"
+    "FeatureZ 3 = last\n",
+    # Elements of several digits, digits on keys, empty values
+    "Disk 12 slot 4 name = sda\n"
+    "Disk 12 model = M 2\n"
+    "Disk 3 empty =   \n"
+    "Fan 101 speed = 2000 rpm\n",
+    # Special words take their second word, values on their own
+    "Front panel led = green\n"
+    "Power supply 1 watts = 750\n"
+    "power cord = plugged\n"
+    "Front = alone\n",
+    # Lines with neither a digit nor '=' are carried to the next one
+    "Chassis\ntype = tower\n"
+    "header line\n\nVendor = dlux\n",
+    # Truncated lines, garbage characters and no final new line
+    "Memory 2 size\n"
+    "Memory 1 size = 8 GB\n"
+    "Caf\xe9 name = cr\xe8me\n"
+    "Temp ° 1 value = 40\n"
+    "Last = one",
+    # Repeated keys, the last value wins
+    "Hostname = alpha\nHostname = beta\nCPU 1 cores = 4\nCPU 1 cores = 8\n",
+)
+
+
+def _args(**options):
+    args = argparse.Namespace(engine='line')
+    vars(args).update(options)
+    return args
+
+
+class TestEngines(unittest.TestCase):
+    '''The line engine gives the json of the legacy state machine.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _parse_text(self, text, engine):
+        parser = log2json.Log2Json(_args(engine=engine), folders=False)
+        return parser.parse_text(text.splitlines(True))
+
+    def _parse_file(self, text, engine):
+        path = os.path.join(self.tmp, 'input.log')
+        with open(path, 'w', encoding='utf-8', newline='') as the_file:
+            the_file.write(text)
+        parser = log2json.Log2Json(_args(engine=engine), folders=False)
+        return parser._compact(parser._parse(path))
+
+    def test_text(self):
+        for text in SAMPLES:
+            self.assertEqual(self._parse_text(text, 'line'),
+                             self._parse_text(text, 'legacy'), text)
+
+    def test_file(self):
+        for text in SAMPLES:
+            self.assertEqual(self._parse_file(text, 'line'),
+                             self._parse_file(text, 'legacy'), text)
+
+    def test_carriage_returns(self):
+        for text in SAMPLES:
+            text = text.replace('\n', '\r\n')
+            self.assertEqual(self._parse_file(text, 'line'),
+                             self._parse_file(text, 'legacy'), text)
+
+    def test_outcome(self):
+        self.assertEqual(self._parse_text(SAMPLES[0], 'line'), {
+            'Hostname': 'alpha',
+            'FeatureX': {'key_A': 'value_one', 'key_B': 'value_two'},
+            'FeatureY': [{'serial': 'X1', 'size': '16_GB'},
+                         {'serial': 'X2'}],
+            'FeatureZ': 'last',
+        })
+
+
+class TestParallel(unittest.TestCase):
+    '''Files parsed by several processes give the outputs and the progress
+       lines of a single one.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'logs')
+        os.makedirs(os.path.join(self.root_dir, 'sub'))
+        for index, text in enumerate(SAMPLES * 3):
+            name = os.path.join('sub' if index % 2 else '',
+                                'h%02i.log' % index)
+            with open(os.path.join(self.root_dir, name), 'w',
+                      encoding='utf-8') as the_file:
+                the_file.write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _run(self, jobs):
+        output_dir = os.path.join(self.tmp, 'out%s' % jobs)
+        args = log2json.ArgumentParser().parse_args(
+            ['-d', self.root_dir, '-o', output_dir, '-j', jobs])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertFalse(log2json.Log2Json(args).parse())
+        outputs = {}
+        for name in os.listdir(output_dir):
+            with open(os.path.join(output_dir, name), 'r') as the_file:
+                outputs[name] = the_file.read()
+        return outputs, output.getvalue().splitlines()
+
+    def test_jobs(self):
+        outputs, lines = self._run('1')
+        self.assertEqual(len(outputs), len(SAMPLES) * 3)
+        self.assertEqual(
+            [line.split(': ')[0] for line in lines],
+            ['%i. Parsing file' % number
+             for number in range(1, len(outputs) + 1)])
+        self.assertEqual(
+            sorted(line.split(': ')[1] for line in lines),
+            sorted(os.path.join(root, name) for root, _, names in
+                   os.walk(self.root_dir) for name in names))
+        self.assertEqual(self._run('2'), (outputs, lines))
+
+
+class TestNdjsonIndex(unittest.TestCase):
+    '''Offsets of the .idx files read back every ndjson record.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'logs')
+        os.makedirs(os.path.join(self.root_dir, 'sub'))
+        self.texts = {}
+        for index, text in enumerate(SAMPLES):
+            name = os.path.join('sub' if index % 2 else '', 'h%i.log' % index)
+            self.texts[name] = text
+            with open(os.path.join(self.root_dir, name), 'w',
+                      encoding='utf-8') as the_file:
+                the_file.write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _run(self, *options):
+        output_dir = os.path.join(self.tmp, 'out')
+        args = log2json.ArgumentParser().parse_args(
+            ['-d', self.root_dir, '-o', output_dir, '--output-mode',
+             'ndjson', '--offset-index', '-q'] + list(options))
+        self.assertFalse(log2json.Log2Json(args).parse())
+        return output_dir
+
+    def _records(self, output_dir):
+        '''Records read back by the offsets of every index.'''
+        records = {}
+        for name in sorted(os.listdir(output_dir)):
+            if not name.endswith('.idx'):
+                continue
+            path = os.path.join(output_dir, name[:-len('.idx')])
+            with open(path + '.idx', 'r') as index, \
+                    open(path, 'rb') as the_file:
+                for line in index:
+                    offset, length, key = line.rstrip('\n').split('\t')
+                    the_file.seek(int(offset))
+                    record = the_file.read(int(length))
+                    self.assertTrue(record.endswith(b'\n'))
+                    records[key] = json.loads(record.decode('utf-8'))
+        return records
+
+    def _check(self, output_dir):
+        records = self._records(output_dir)
+        self.assertEqual(sorted(records), sorted(self.texts))
+        parser = log2json.Log2Json(_args(), folders=False)
+        for name, text in self.texts.items():
+            record = records[name]
+            self.assertEqual(record.pop('id'), name)
+            self.assertEqual(record,
+                             parser.parse_text(text.splitlines(True)))
+
+    def test_single_file(self):
+        output_dir = self._run()
+        self.assertIn(log2json.RECORDS_FILE + '.idx',
+                      os.listdir(output_dir))
+        self._check(output_dir)
+
+    def test_split_rows(self):
+        output_dir = self._run('--split-rows', '2')
+        self.assertEqual(
+            len([name for name in os.listdir(output_dir)
+                 if name.endswith('.idx')]), (len(SAMPLES) + 1) // 2)
+        self._check(output_dir)
+
+    def test_split_bytes(self):
+        self._check(self._run('--split-bytes', '200'))
+
+    def test_lines(self):
+        # Parts read line by line hold the records the index points to
+        output_dir = self._run('--split-rows', '4')
+        indexed = self._records(output_dir)
+        records = {}
+        for name in sorted(os.listdir(output_dir)):
+            if name.endswith('.ndjson'):
+                with open(os.path.join(output_dir, name), 'r',
+                          encoding='utf-8') as the_file:
+                    for line in the_file:
+                        record = json.loads(line)
+                        records[record['id']] = record
+        self.assertEqual(records, indexed)
+        self.assertEqual(sorted(os.listdir(output_dir)),
+                         ['records.00001.ndjson', 'records.00001.ndjson.idx',
+                          'records.00002.ndjson', 'records.00002.ndjson.idx'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import main
+
+
+class TestQuiet(unittest.TestCase):
+    '''-q/--quiet reaches the commands wherever it is given.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'logs')
+        os.makedirs(self.root_dir)
+        with open(os.path.join(self.root_dir, 'host.log'), 'w') as the_file:
+            the_file.write('Hostname = alpha\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _run(self, *argv):
+        '''Lines a dluxparser command line prints.'''
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            with self.assertRaises(SystemExit) as context:
+                main.main(list(argv))
+        self.assertFalse(context.exception.code)
+        return output.getvalue().splitlines()
+
+    def _log2json(self, options=(), global_options=()):
+        output_dir = os.path.join(self.tmp, 'out')
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return self._run(*(list(global_options) + [
+            'log2json', '-d', self.root_dir, '-o', output_dir] +
+            list(options)))
+
+    def test_command(self):
+        self.assertEqual(len(self._log2json()), 1)
+        self.assertEqual(self._log2json(['-q']), [])
+        self.assertEqual(self._log2json(['--quiet']), [])
+
+    def test_global(self):
+        self.assertEqual(self._log2json(global_options=['-q']), [])
+        self.assertEqual(self._log2json(global_options=['--quiet']), [])
+
+    def test_sub_command(self):
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertEqual(
+            self._run('shrinker', 'to-lower', '-d', self.root_dir, '-o',
+                      output_dir, '-q'),
+            ['Found 1 files.'])
+        with open(os.path.join(output_dir, 'host.log'), 'r') as the_file:
+            self.assertEqual(the_file.read(), 'hostname = alpha\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
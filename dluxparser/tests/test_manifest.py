@@ -0,0 +1,114 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import log2json
+from dluxparser import manifest
+
+
+class TestIncremental(unittest.TestCase):
+    '''Incremental runs parse only the inputs new or changed.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'logs')
+        self.output_dir = os.path.join(self.tmp, 'out')
+        os.makedirs(os.path.join(self.root_dir, 'sub'))
+        for name in ('a.log', 'b.log', os.path.join('sub', 'c.log')):
+            self._write(name, 'Hostname = %s\n' % name[-5])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, name, text):
+        with open(os.path.join(self.root_dir, name), 'w') as the_file:
+            the_file.write(text)
+
+    def _touch(self, name):
+        '''Move the mtime of an input on, whatever the clock resolution.'''
+        path = os.path.join(self.root_dir, name)
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+
+    def _run(self, *options):
+        '''Names of the inputs parsed and the lines printed by a run.'''
+        args = log2json.ArgumentParser().parse_args(
+            ['-d', self.root_dir, '-o', self.output_dir, '--incremental'] +
+            list(options))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertFalse(log2json.Log2Json(args).parse())
+        lines = output.getvalue().splitlines()
+        parsed = sorted(os.path.relpath(line.split(': ')[1], self.root_dir)
+                        for line in lines if 'Parsing file' in line)
+        return parsed, lines
+
+    def _output(self, name):
+        with open(os.path.join(self.output_dir, name), 'r') as the_file:
+            return json.load(the_file)
+
+    def _manifest(self):
+        with open(os.path.join(self.output_dir, manifest.MANIFEST_NAME),
+                  'r') as the_file:
+            return json.load(the_file)['files']
+
+    def test_unchanged(self):
+        self.assertEqual(self._run()[0], ['a.log', 'b.log', 'sub/c.log'])
+        parsed, lines = self._run()
+        self.assertEqual(parsed, [])
+        self.assertIn('Skipped 3 unchanged files.', lines)
+        # Inputs are not hashed when processed
+        self.assertEqual(set(entry['sha256'] for entry in
+                             self._manifest().values()), {None})
+
+    def test_changed(self):
+        self._run()
+        self._write('a.log', 'Hostname = changed\n')
+        self.assertEqual(self._run()[0], ['a.log'])
+        self.assertEqual(self._output('a.json'), {'Hostname': 'changed'})
+
+    def test_touched(self):
+        self._run()
+        # Parsed again once, to take its hash
+        self._touch('b.log')
+        self.assertEqual(self._run()[0], ['b.log'])
+        self.assertTrue(self._manifest()['b.log']['sha256'])
+        self._touch('b.log')
+        self.assertEqual(self._run()[0], [])
+        # Same size, other content
+        self._write('b.log', 'Hostname = x\n')
+        self._touch('b.log')
+        self.assertEqual(self._run()[0], ['b.log'])
+        self.assertEqual(self._output('b.json'), {'Hostname': 'x'})
+
+    def test_deleted(self):
+        self._run()
+        os.remove(os.path.join(self.root_dir, 'sub', 'c.log'))
+        parsed, lines = self._run()
+        self.assertEqual(parsed, [])
+        self.assertIn('Removed outputs of 1 deleted files.', lines)
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         [manifest.MANIFEST_NAME, 'a.json', 'b.json'])
+        self.assertEqual(sorted(self._manifest()), ['a.log', 'b.log'])
+
+    def test_options(self):
+        self._run()
+        os.remove(os.path.join(self.root_dir, 'b.log'))
+        parsed, lines = self._run('--json-style', 'compact')
+        self.assertIn('Options changed since the last run, parsing all '
+                      'files.', lines)
+        self.assertEqual(parsed, ['a.log', 'sub/c.log'])
+        # Outputs of the previous options are not left behind
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         [manifest.MANIFEST_NAME, 'a.json', 'c.json'])
+        with open(os.path.join(self.output_dir, 'a.json'), 'r') as the_file:
+            self.assertEqual(the_file.read(), '{"Hostname":"a"}')
+        self.assertEqual(self._run('--json-style', 'compact')[0], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
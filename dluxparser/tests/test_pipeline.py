@@ -0,0 +1,104 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import pipeline
+
+LOG = (
+    'Tx64 display.cfg file\n'
+    '*****\n'
+    'dlux header\n'
+    'Hostname = %s\n'
+    'number of fans = 2\n'
+    'FeatureY 1 serial = X1\n'
+    'FeatureY 2 serial = X2\n' +
+    '*' * 25 + '\n'
+    'Trailer = last\n'
+)
+
+SPEC = (
+    '# Keep the dlux section, without counts\n'
+    'shrinker extract-section -i "dlux header" -e "[*]{25}"\n'
+    '\n'
+    'remove-from-regex -r "number of"\n'
+    'log2json --json-style compact\n'
+)
+
+
+class TestPipeline(unittest.TestCase):
+    '''Files streamed through the stages of a spec file.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'logs')
+        self.output_dir = os.path.join(self.tmp, 'out')
+        os.makedirs(os.path.join(self.root_dir, 'sub'))
+        for name in ('alpha.log', os.path.join('sub', 'beta.log')):
+            with open(os.path.join(self.root_dir, name), 'w') as the_file:
+                the_file.write(LOG % os.path.splitext(
+                    os.path.basename(name))[0])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _run(self, spec, *options):
+        '''Outcome and lines printed by a run of spec.'''
+        spec_file = os.path.join(self.tmp, 'stages.spec')
+        with open(spec_file, 'w') as the_file:
+            the_file.write(spec)
+        args = pipeline.ArgumentParser().parse_args(
+            ['-d', self.root_dir, '-o', self.output_dir, '-s', spec_file] +
+            list(options))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            outcome = pipeline.Pipeline(args).run()
+        return outcome, output.getvalue().splitlines()
+
+    def _read(self, name):
+        with open(os.path.join(self.output_dir, name), 'r') as the_file:
+            return the_file.read()
+
+    def test_spec(self):
+        outcome, lines = self._run(SPEC)
+        self.assertFalse(outcome)
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         ['alpha.json', 'beta.json'])
+        for name in ('alpha', 'beta'):
+            self.assertEqual(json.loads(self._read(name + '.json')), {
+                'Hostname': name,
+                'FeatureY': [{'serial': 'X1'}, {'serial': 'X2'}],
+            })
+        # Compact json, as the log2json command writes it
+        self.assertNotIn(' ', self._read('alpha.json'))
+        self.assertIn('Removed 1 lines.', lines)
+        self.assertEqual(lines[-1], 'Found 2 files.')
+
+    def test_shrinker_only(self):
+        self.assertFalse(self._run('to-lower\n')[0])
+        self.assertEqual(self._read('alpha.log'), (LOG % 'alpha').lower())
+
+    def test_quiet_stats(self):
+        stats_file = os.path.join(self.tmp, 'stats.json')
+        outcome, lines = self._run(SPEC, '-q', '--stats', '--stats-json',
+                                   stats_file)
+        self.assertFalse(outcome)
+        self.assertFalse([line for line in lines if 'Parsing' in line])
+        self.assertIn('Statistics:', lines)
+        with open(stats_file, 'r') as the_file:
+            summary = json.load(the_file)
+        self.assertEqual((summary['files'], summary['failed']), (2, 0))
+        self.assertEqual(summary['bytes_in'], 2 * len(LOG % 'beta') + 1)
+
+    def test_invalid(self):
+        self.assertRaises(Exception, self._run, 'log2json\nto-lower\n')
+        self.assertRaises(Exception, self._run, 'log2json -d x\n')
+        self.assertRaises(Exception, self._run, 'to-lower -d x\n')
+        self.assertRaises(Exception, self._run, '# nothing\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
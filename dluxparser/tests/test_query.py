@@ -0,0 +1,99 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import log2json
+from dluxparser import query
+
+LOGS = {
+    'host1.log': 'Hostname = echo1\nFeatureY 1 serial = X1\n'
+                 'FeatureY 3 serial = X123\nPower supply 1 watts = 750\n',
+    'host2.log': 'Hostname = echo2\nFeatureY 3 serial = X9\n'
+                 'FeatureY 4 serial = X123\n',
+    'sub/host3.log': 'Hostname = foxtrot\nFeatureZ 2 = last\n',
+}
+
+
+class TestQuery(unittest.TestCase):
+    '''Terms find the files of a log2json --index.'''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        root_dir = os.path.join(cls.tmp, 'logs')
+        for name, text in LOGS.items():
+            path = os.path.join(root_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as the_file:
+                the_file.write(text)
+        cls.output_dir = os.path.join(cls.tmp, 'out')
+        args = log2json.ArgumentParser().parse_args(
+            ['-d', root_dir, '-o', cls.output_dir, '--index', '-q'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            log2json.Log2Json(args).parse()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def _find(self, *terms):
+        '''Files printed for the terms, and the outcome.'''
+        args = query.ArgumentParser().parse_args(
+            list(terms) + ['-o', self.output_dir])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            outcome = query.Query(args).find()
+        return output.getvalue().splitlines(), outcome
+
+    def test_terms(self):
+        self.assertEqual(query.Query(query.ArgumentParser().parse_args(
+            ['FeatureY[3].serial=X1*', 'Hostname', 'A.b', 'A=',
+             'A.b=c=d'])).terms, [
+            ('FeatureY', 3, 'serial', 'X1', True),
+            ('Hostname', None, None, None, False),
+            ('A', None, 'b', None, False),
+            ('A', None, None, '', False),
+            ('A', None, 'b', 'c=d', False),
+        ])
+        self.assertRaises(Exception, self._find, '[3].serial')
+
+    def test_feature(self):
+        self.assertEqual(self._find('FeatureY'),
+                         (['host1.log', 'host2.log'], None))
+        self.assertEqual(self._find('FeatureZ'), (['sub/host3.log'], None))
+
+    def test_element(self):
+        self.assertEqual(self._find('FeatureY[3].serial=X123'),
+                         (['host1.log'], None))
+        self.assertEqual(self._find('FeatureY.serial=X123'),
+                         (['host1.log', 'host2.log'], None))
+        self.assertEqual(self._find('FeatureY[4].serial'),
+                         (['host2.log'], None))
+
+    def test_prefix(self):
+        self.assertEqual(self._find('Hostname=echo*'),
+                         (['host1.log', 'host2.log'], None))
+        self.assertEqual(self._find('FeatureY.serial=X12*'),
+                         (['host1.log', 'host2.log'], None))
+        self.assertEqual(self._find('Hostname=*'),
+                         (['host1.log', 'host2.log', 'sub/host3.log'], None))
+
+    def test_values(self):
+        # Values with no key, features of special words
+        self.assertEqual(self._find('FeatureZ=last'), (['sub/host3.log'],
+                                                       None))
+        self.assertEqual(self._find('FeatureZ=la'), ([], 1))
+        self.assertEqual(self._find('Power_supply[1].watts=750'),
+                         (['host1.log'], None))
+
+    def test_intersect(self):
+        self.assertEqual(self._find('FeatureY.serial=X123', 'Hostname=echo2'),
+                         (['host2.log'], None))
+        self.assertEqual(self._find('FeatureY', 'FeatureZ'), ([], 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from dluxparser import scanner
+
+# File sizes by path
+FILES = {
+    'a.log': 10,
+    'b.txt': 300,
+    'big.log': 5000,
+    '.hidden.log': 20,
+    'host1/boot.log': 200,
+    'host1/boot.swp': 5,
+    'host1/deep/kern.log': 1000,
+    'host2/boot.log': 50,
+    '.git/config': 30,
+    'old.bk.1/a.log': 40,
+}
+
+
+class TestScanner(unittest.TestCase):
+    '''Files are listed in the os.walk order, kept by the options.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'logs')
+        for name, size in FILES.items():
+            path = os.path.join(self.root_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as the_file:
+                the_file.write('x' * size)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _args(self, *options):
+        parser = argparse.ArgumentParser()
+        scanner.add_arguments(parser)
+        return parser.parse_args(list(options))
+
+    def _files(self, *options):
+        return [os.path.relpath(path, self.root_dir) for path in
+                scanner.files(self.root_dir, self._args(*options))]
+
+    def _walk(self):
+        return [os.path.relpath(os.path.join(root, name), self.root_dir)
+                for root, _, names in os.walk(self.root_dir)
+                for name in names]
+
+    def test_all(self):
+        self.assertEqual(self._files(), self._walk())
+
+    def test_include(self):
+        self.assertEqual(sorted(self._files('--include', '*.log')),
+                         sorted(name for name in FILES
+                                if name.endswith('.log')))
+        # Globs match the path relative to the root folder too
+        self.assertEqual(sorted(self._files('--include', 'host*/boot*',
+                                            'b.*')),
+                         ['b.txt', 'host1/boot.log', 'host1/boot.swp',
+                          'host2/boot.log'])
+
+    def test_exclude(self):
+        self.assertEqual(sorted(self._files('--exclude', '*.swp', '*.bk.*',
+                                            'deep', '.git')),
+                         ['.hidden.log', 'a.log', 'b.txt', 'big.log',
+                          'host1/boot.log', 'host2/boot.log'])
+        self.assertEqual(sorted(self._files('--include', '*.log',
+                                            '--exclude', 'host1')),
+                         ['.hidden.log', 'a.log', 'big.log',
+                          'host2/boot.log', 'old.bk.1/a.log'])
+
+    def test_max_size(self):
+        self.assertEqual(sorted(self._files('--max-size', '50')),
+                         sorted(name for name, size in FILES.items()
+                                if size <= 50))
+
+    def test_skip_hidden(self):
+        self.assertEqual(sorted(self._files('--skip-hidden')),
+                         sorted(name for name in FILES
+                                if not name.startswith('.')))
+
+    def test_largest_first(self):
+        self.assertEqual(self._files('--largest-first'),
+                         sorted(FILES, key=lambda name: -FILES[name]))
+        self.assertEqual(self._files('--largest-first', '--max-size', '300',
+                                     '--skip-hidden'),
+                         ['b.txt', 'host1/boot.log', 'host2/boot.log',
+                          'old.bk.1/a.log', 'a.log', 'host1/boot.swp'])
+        self.assertEqual(scanner.chunksize(self._args('--largest-first')), 1)
+        self.assertIsNone(scanner.chunksize(self._args()))
+
+    def test_members(self):
+        path = os.path.join(self.tmp, 'logs.tar')
+        with tarfile.open(path, 'w') as archive:
+            archive.add(self.root_dir, '.')
+        names = [member.name for member in scanner.members(
+            path, self._args('--exclude', 'host1', '--skip-hidden',
+                             '--max-size', '1000'))]
+        self.assertEqual(sorted(os.path.normpath(name) for name in names),
+                         ['a.log', 'b.txt', 'host2/boot.log',
+                          'old.bk.1/a.log'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import shrinker
+from dluxparser import streams
+from dluxparser import workers
+
+STARS = '*' * 25
+
+# A display.cfg dump, sections are searched across its lines
+TEXT = (
+    'Tx64 display.cfg file version 2\n'
+    '*****\n'
+    'preamble\n'
+    'dlux header\n'
+    'Skipped = line\n'
+    'Hostname = alpha\n'
+    'Memory 1 size = 16 GB\n'
+    'Memory 2 size = 8 GB\n'
+    'Dropped = line\n' +
+    STARS + '\n'
+    'Trailer = Last\n'
+    'end'
+)
+
+# Sub-command options of each case, the in memory path is the reference
+SECTIONS = (
+    ['extract-section', '-i', 'dlux header', '-e', '[*]{25}'],
+    ['extract-section', '-i', 'dlux header', '-e', '[*]{25}', '-t', '1',
+     '-b', '1'],
+    ['extract-section', '-i', 'dlux header', '-e', '[*]{25}', '-l'],
+    ['extract-section', '-i', 'preamble\ndlux', '-e', 'Dropped'],
+    ['extract-section', '-i', 'not there', '-e', 'Trailer', '-t', '2'],
+    ['extract-section', '-i', 'Hostname', '-e', 'not there'],
+    ['remove-section', '-i', 'Tx64 display.cfg file.*\n[*]+', '-e',
+     'dlux header'],
+    ['remove-section', '-i', 'Memory', '-e', 'GB'],
+    ['remove-section', '-i', 'preamble', '-e', 'not there'],
+    ['remove-section', '-i', 'not there', '-e', 'Hostname', '-l'],
+)
+
+
+class _ShrinkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'logs')
+        os.makedirs(self.root_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _shrinker(self, options):
+        args = shrinker.ArgumentParser().parse_args(
+            options + ['-d', self.root_dir])
+        return shrinker.Shrinker(args, folders=False)
+
+    def _write(self, text, name='input.log'):
+        path = os.path.join(self.root_dir, name)
+        with open(path, 'w', newline='') as the_file:
+            the_file.write(text)
+        return path
+
+    def _read(self, path):
+        with open(path, 'r') as the_file:
+            return the_file.read()
+
+    def _run(self, func, *arguments):
+        '''Outcome of func and the messages it reported.'''
+        outcome = []
+        messages = workers.capture(
+            lambda job: outcome.append(func(*arguments)), None)
+        return outcome[0], messages
+
+
+class TestSections(_ShrinkerTest):
+    '''Streamed and mapped sections are the ones cut in memory.'''
+
+    def _expected(self, options, text):
+        stage = self._shrinker(options)
+        return self._run(stage._shrink_content, text)
+
+    def test_streamed(self):
+        for options in SECTIONS:
+            expected = self._expected(options, TEXT)
+            stage = self._shrinker(options)
+            stage._compile()
+            self.assertTrue(stage._streaming, options)
+            chunks = streams.read_chunks(io.StringIO(TEXT), 7)
+            self.assertEqual(
+                self._run(lambda: ''.join(stage._shrink_chunks(chunks))),
+                expected, options)
+
+    def test_mapped(self):
+        origin = self._write(TEXT)
+        output = os.path.join(self.tmp, 'output.log')
+        for options in SECTIONS:
+            text, messages = self._expected(options, TEXT)
+            stage = self._shrinker(options)
+            stage._compile()
+            self.assertTrue(stage._mapping, options)
+            mapped, mapped_messages = self._run(stage._shrink_mapped, origin,
+                                                output)
+            self.assertTrue(mapped, options)
+            # Empty outputs are written as a blank
+            self.assertEqual(self._read(output), text or ' ', options)
+            self.assertEqual(mapped_messages, messages, options)
+
+    def test_not_mapped(self):
+        origin = self._write(TEXT.replace('\n', '\r\n'))
+        stage = self._shrinker(list(SECTIONS[0]))
+        stage._compile()
+        self.assertFalse(stage._shrink_mapped(origin, origin + '.out'))
+
+    def test_files(self):
+        # Plain files are mapped, compressed ones streamed
+        import gzip
+        self._write(TEXT, 'plain.log')
+        with gzip.open(os.path.join(self.root_dir, 'packed.log.gz'),
+                       'wt') as the_file:
+            the_file.write(TEXT)
+        for options in SECTIONS:
+            output_dir = os.path.join(self.tmp, 'out')
+            shutil.rmtree(output_dir, ignore_errors=True)
+            args = shrinker.ArgumentParser().parse_args(
+                options + ['-d', self.root_dir, '-o', output_dir, '-q'])
+            shrinker.Shrinker(args).shrink()
+            text = self._expected(options, TEXT)[0] or ' '
+            self.assertEqual(self._read(os.path.join(output_dir,
+                                                     'plain.log')), text)
+            self.assertEqual(self._read(os.path.join(output_dir,
+                                                     'packed.log')), text)
+
+
+class TestRemoveFromBottom(_ShrinkerTest):
+    '''Lines cut from the end of the file are the ones cut in memory.'''
+
+    TEXTS = (
+        TEXT,
+        TEXT + '\n',
+        TEXT + '\n\n\n',
+        # Over a block, the cut is searched backwards across blocks
+        ''.join('line %i of a long file\n' % line
+                for line in range(20000)),
+        # Carriage returns are left to text mode
+        TEXT.replace('\n', '\r\n'),
+        'a\rb\r\nc\nd\n',
+    )
+
+    def _expected(self, text, number):
+        stage = self._shrinker(['remove-from-bottom', '-n', str(number)])
+        try:
+            return stage._remove_lines(text.replace('\r\n', '\n')
+                                       .replace('\r', '\n'), number, False)
+        except Exception:
+            return None
+
+    def test_tail(self):
+        output = os.path.join(self.tmp, 'output.log')
+        for text in self.TEXTS:
+            origin = self._write(text)
+            for number in (0, 1, 3, text.count('\n'), text.count('\n') + 1):
+                expected = self._expected(text, number)
+                stage = self._shrinker(['remove-from-bottom', '-n',
+                                        str(number)])
+                if expected is None:
+                    self.assertRaises(Exception, self._run,
+                                      stage._remove_bottom_file, origin,
+                                      output)
+                    continue
+                self._run(stage._remove_bottom_file, origin, output)
+                self.assertEqual(self._read(output), expected or ' ',
+                                 (text[:20], number))
+
+    def test_streamed(self):
+        for text in self.TEXTS:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+            for number in (0, 1, 3, text.count('\n')):
+                chunks = streams.read_chunks(io.StringIO(text), 7)
+                self.assertEqual(
+                    ''.join(streams.drop_last_lines(chunks, number)),
+                    self._expected(text, number), (text[:20], number))
+
+
+class TestRemoveFromRegex(_ShrinkerTest):
+    '''Lines are removed in a pass, counted for the first regex found.'''
+
+    def test_hits(self):
+        stage = self._shrinker(['remove-from-regex', '-r', 'x'])
+        self.assertEqual(
+            self._run(stage._remove_lines_r, TEXT,
+                      ['^Memory|^Dropped', 'GB$', 'line', '^\\*+$']),
+            ('Tx64 display.cfg file version 2\npreamble\ndlux header\n'
+             'Hostname = alpha\nTrailer = Last\nend',
+             ['Removed 6 lines.',
+              '    3 lines matched ^Memory|^Dropped',
+              '    0 lines matched GB$',
+              '    1 lines matched line',
+              '    2 lines matched ^\\*+$']))
+
+    def test_files(self):
+        self._write(TEXT)
+        output_dir = os.path.join(self.tmp, 'out')
+        args = shrinker.ArgumentParser().parse_args(
+            ['remove-from-regex', '-r', '^[A-Z]', 'end', '-d',
+             self.root_dir, '-o', output_dir, '-q', '-j', '2'])
+        shrinker.Shrinker(args).remove_from()
+        self.assertEqual(self._read(os.path.join(output_dir, 'input.log')),
+                         '*****\npreamble\ndlux header\n' + STARS)
+
+
+class TestInline(_ShrinkerTest):
+    '''Inline files are replaced one by one, or left untouched.'''
+
+    def _inline(self, *options):
+        args = shrinker.ArgumentParser().parse_args(
+            list(options) + ['-d', self.root_dir, '--inline', '-q'])
+        stage = shrinker.Shrinker(args)
+        return getattr(stage, args.func)()
+
+    def test_remove_from_bottom(self):
+        for text in TestRemoveFromBottom.TEXTS[:4]:
+            origin = self._write(text)
+            self._inline('remove-from-bottom', '-n', '2')
+            self.assertEqual(self._read(origin),
+                             TestRemoveFromBottom._expected(self, text, 2)
+                             or ' ')
+
+    def test_failure(self):
+        short = self._write('one\ntwo\n', 'short.log')
+        long = self._write(TEXT, 'long.log')
+        os.chmod(long, 0o640)
+        self.assertEqual(self._inline('remove-from-bottom', '-n', '5'), 1)
+        # The file failing is left as it was, the others are replaced
+        self.assertEqual(self._read(short), 'one\ntwo\n')
+        self.assertEqual(self._read(long),
+                         TestRemoveFromBottom._expected(self, TEXT, 5))
+        self.assertEqual(os.stat(long).st_mode & 0o777, 0o640)
+        self.assertEqual(sorted(os.listdir(self.root_dir)),
+                         ['long.log', 'short.log'])
+
+    def test_compressed(self):
+        # Inline files keep the compression they had
+        import gzip
+        origin = os.path.join(self.root_dir, 'packed.log.gz')
+        with gzip.open(origin, 'wt') as the_file:
+            the_file.write(TEXT)
+        self._inline('to-lower')
+        with gzip.open(origin, 'rt') as the_file:
+            self.assertEqual(the_file.read(), TEXT.lower())
+        self.assertEqual(os.listdir(self.root_dir), ['packed.log.gz'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from dluxparser import log2json
+from dluxparser import sinks
+
+ROWS = {
+    'host1.log': [('Hostname', 1, '', 'alpha'),
+                  ('FeatureY', 1, 'serial', 'X1'),
+                  ('FeatureY', 2, 'serial', 'X2')],
+    'sub/host2.log': [('Hostname', 1, '', 'beta')],
+}
+
+
+class TestSqliteSink(unittest.TestCase):
+    '''Files loaded into the features table, once each.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'fleet.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _load(self, rows):
+        sink = sinks.open_sink('sqlite:' + self.path)
+        for name, file_rows in sorted(rows.items()):
+            sink.add(name, file_rows)
+        sink.close()
+        return sink
+
+    def _query(self, sql):
+        db = sqlite3.connect(self.path)
+        try:
+            return db.execute(sql).fetchall()
+        finally:
+            db.close()
+
+    def _rows(self):
+        return sorted(self._query('SELECT * FROM features'))
+
+    def _expected(self, rows):
+        return sorted((name,) + row for name, file_rows in rows.items()
+                      for row in file_rows)
+
+    def test_twice(self):
+        self._load(ROWS)
+        self._load(ROWS)
+        self.assertEqual(self._rows(), self._expected(ROWS))
+
+    def test_replace(self):
+        self._load(ROWS)
+        rows = {'host1.log': [('Hostname', 1, '', 'gamma')],
+                'host3.log': [('Hostname', 1, '', 'delta')]}
+        sink = sinks.open_sink('sqlite:' + self.path)
+        self.assertTrue(sink._replace)
+        for name, file_rows in sorted(rows.items()):
+            sink.add(name, file_rows)
+        sink.forget('sub/host2.log')
+        sink.close()
+        self.assertEqual(self._rows(), self._expected(rows))
+
+    def test_new_database(self):
+        # Nothing to replace, the indexes are created once loaded
+        sink = sinks.SqliteSink(self.path)
+        self.assertFalse(sink._replace)
+        indexes = "SELECT name FROM sqlite_master WHERE type = 'index'"
+        self.assertEqual(self._query(indexes), [])
+        sink.add('host1.log', ROWS['host1.log'])
+        sink.close()
+        self.assertEqual(sorted(self._query(indexes)),
+                         [('features_file',), ('features_lookup',)])
+
+    def test_batches(self):
+        batch_rows = sinks.BATCH_ROWS
+        sinks.BATCH_ROWS = 3
+        try:
+            sink = sinks.SqliteSink(self.path)
+            sink.add('sub/host2.log', ROWS['sub/host2.log'])
+            self.assertEqual(self._rows(), [])
+            # Committed once BATCH_ROWS rows are pending, whole files
+            sink.add('host1.log', ROWS['host1.log'])
+            self.assertEqual(self._rows(), self._expected(ROWS))
+            sink.close()
+        finally:
+            sinks.BATCH_ROWS = batch_rows
+
+    def test_spec(self):
+        self.assertEqual(sinks.parse_spec('sqlite:a:b.db'),
+                         ('sqlite', 'a:b.db'))
+        self.assertRaises(Exception, sinks.parse_spec, 'mysql:x')
+        self.assertRaises(Exception, sinks.parse_spec, 'sqlite:')
+
+    def test_log2json(self):
+        root_dir = os.path.join(self.tmp, 'logs')
+        os.makedirs(root_dir)
+        with open(os.path.join(root_dir, 'host1.log'), 'w') as the_file:
+            the_file.write('Hostname = alpha\nFeatureY 1 serial = X1\n'
+                           'FeatureY 2 serial = X2\n')
+        for run in range(2):
+            args = log2json.ArgumentParser().parse_args(
+                ['-d', root_dir, '-o', os.path.join(self.tmp, 'out'),
+                 '--sink', 'sqlite:' + self.path, '-q'])
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertFalse(log2json.Log2Json(args).parse())
+        self.assertEqual(self._rows(), self._expected(
+            {'host1.log': ROWS['host1.log']}))
+
+
+if __name__ == '__main__':
+    unittest.main()
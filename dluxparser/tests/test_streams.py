@@ -0,0 +1,66 @@
+import unittest
+
+from dluxparser import streams
+
+TEXT = (
+    'count = 1\n'
+    'name = alpha\n'
+    'recount = 2\n'
+    'size = 16\n'
+    'end'
+)
+
+
+class TestLineMatcher(unittest.TestCase):
+    '''Patterns are searched line by line, each as a whole.'''
+
+    def _filter(self, patterns, text=TEXT, size=4):
+        '''Text kept and lines removed by each pattern, text read in chunks
+           of size characters.'''
+        matcher = streams.LineMatcher(patterns)
+        hits = [0] * len(patterns)
+        chunks = [text[start:start + size]
+                  for start in range(0, len(text), size)]
+        return ''.join(streams.filter_lines(chunks, matcher, hits)), hits
+
+    def test_anchors(self):
+        # ^ and $ anchor on every line, not on the text only
+        self.assertEqual(self._filter(['^count']),
+                         ('name = alpha\nrecount = 2\nsize = 16\nend', [1]))
+        self.assertEqual(self._filter(['count$', 'alpha$']),
+                         ('count = 1\nrecount = 2\nsize = 16\nend', [0, 1]))
+        self.assertEqual(self._filter(['= 1$', '6$']),
+                         ('name = alpha\nrecount = 2\nend', [1, 1]))
+
+    def test_alternation(self):
+        # | alternates the whole pattern, the other patterns still count
+        self.assertEqual(self._filter(['^name|^size', 'count']),
+                         ('end', [2, 2]))
+        self.assertEqual(self._filter(['alpha|16', '^end$']),
+                         ('count = 1\nrecount = 2', [2, 1]))
+
+    def test_hits(self):
+        # A line matching several patterns counts for the first one given
+        self.assertEqual(self._filter(['count', '^count', 'x']),
+                         ('name = alpha\nsize = 16\nend', [2, 0, 0]))
+        self.assertEqual(self._filter(['^count', 'count']),
+                         ('name = alpha\nsize = 16\nend', [1, 1]))
+        # Later patterns matching further on the line still lose
+        self.assertEqual(self._filter(['16', 'size']),
+                         ('count = 1\nname = alpha\nrecount = 2\nend', [1, 0]))
+
+    def test_literals(self):
+        self.assertEqual(self._filter(['count', 'end']),
+                         ('name = alpha\nsize = 16', [2, 1]))
+
+    def test_not_combined(self):
+        # Patterns with groups or flags are searched one by one
+        self.assertEqual(self._filter(['(?i)NAME', r'(\d)6']),
+                         ('count = 1\nrecount = 2\nend', [1, 1]))
+
+    def test_lines_only(self):
+        self.assertEqual(self._filter(['1\nname']), (TEXT, [0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import functools
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dluxparser import workers
+
+
+def _square(job):
+    if job == 3:
+        raise ValueError('no three')
+    return job * job
+
+
+def _pid(job):
+    return os.getpid()
+
+
+def _reporting(job):
+    workers.report('job %i' % job)
+    if job % 2:
+        workers.report('odd')
+
+
+class TestImap(unittest.TestCase):
+    '''Outcomes come back in jobs order, however the jobs are run.'''
+
+    EXPECTED = [(job * job, None) if job != 3 else
+                (None, 'ValueError: no three') for job in range(40)]
+
+    def test_serial(self):
+        self.assertEqual(list(workers.imap(_square, range(40))),
+                         self.EXPECTED)
+
+    def test_processes(self):
+        self.assertEqual(list(workers.imap(_square, list(range(40)), 2)),
+                         self.EXPECTED)
+
+    def test_threads(self):
+        self.assertEqual(list(workers.imap(_square, list(range(40)), 2,
+                                           threads=True)), self.EXPECTED)
+
+    def test_bounded(self):
+        jobs = (job for job in range(40))
+        self.assertEqual(list(workers.imap(_square, jobs, 2, chunksize=3,
+                                           max_pending=2)), self.EXPECTED)
+
+    def test_unsized_chunks(self):
+        # Jobs read from a generator go to the pool CHUNK_JOBS at a time
+        jobs = (job for job in range(workers.CHUNK_JOBS * 4))
+        pids = [pid for pid, _ in workers.imap(_pid, jobs, 2,
+                                               max_pending=2)]
+        for start in range(0, len(pids), workers.CHUNK_JOBS):
+            self.assertEqual(
+                len(set(pids[start:start + workers.CHUNK_JOBS])), 1)
+        self.assertNotIn(os.getpid(), pids)
+
+
+class TestCapture(unittest.TestCase):
+    '''Messages of captured jobs come back with their outcome.'''
+
+    def test_order(self):
+        outcomes = workers.imap(functools.partial(workers.capture,
+                                                  _reporting),
+                                list(range(6)), 3, chunksize=1)
+        self.assertEqual(
+            [messages for messages, _ in outcomes],
+            [['job %i' % job] + (['odd'] if job % 2 else [])
+             for job in range(6)])
+
+    def test_collect(self):
+        messages = []
+
+        def chunks():
+            workers.report('first')
+            yield 'a'
+            workers.report('second')
+            yield 'b'
+
+        self.assertEqual(list(workers.collect(chunks(), messages)),
+                         ['a', 'b'])
+        self.assertEqual(messages, ['first', 'second'])
+
+
+class TestJsonWriter(unittest.TestCase):
+    '''Records are written into complete files, read back by their index.'''
+
+    RECORDS = ['{"id": %i, "text": "caf\xe9 %s"}' % (index, 'x' * index)
+               for index in range(25)]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'out.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, **options):
+        writer = workers.JsonWriter(self.path, '[', ', ', ']', **options)
+        with writer:
+            for index, record in enumerate(self.RECORDS):
+                writer.write(record, 'key%i' % index)
+        return writer.files
+
+    def test_single(self):
+        self.assertEqual(self._write(batch_size=4), [self.path])
+        with open(self.path, 'r') as the_file:
+            self.assertEqual(json.load(the_file),
+                             [json.loads(record) for record in self.RECORDS])
+        self.assertEqual(os.listdir(self.tmp), ['out.json'])
+
+    def test_parts(self):
+        files = self._write(split_rows=10, index=True)
+        self.assertEqual([os.path.basename(name) for name in files],
+                         ['out.00001.json', 'out.00002.json',
+                          'out.00003.json'])
+        records = []
+        for name in files:
+            with open(name, 'r') as the_file:
+                part = json.load(the_file)
+            self.assertLessEqual(len(part), 10)
+            # Every record is read back by its offset and length in bytes
+            with open(name, 'rb') as the_file, \
+                    open(name + '.idx', 'r') as index:
+                for line, record in zip(index, part):
+                    offset, length, key = line.rstrip('\n').split('\t')
+                    the_file.seek(int(offset))
+                    self.assertEqual(json.loads(the_file.read(int(length))),
+                                     record)
+                    self.assertEqual(key, 'key%i' % record['id'])
+            records.extend(part)
+        self.assertEqual(records,
+                         [json.loads(record) for record in self.RECORDS])
+
+    def test_split_bytes(self):
+        files = self._write(split_bytes=200, compress='gzip')
+        self.assertGreater(len(files), 1)
+        records = []
+        for name in files:
+            self.assertTrue(name.endswith('.json.gz'))
+            with gzip.open(name, 'rt') as the_file:
+                text = the_file.read()
+            # A part holds at least a record
+            self.assertTrue(len(text) <= 200 or text.count('"id"') == 1)
+            records.extend(json.loads(text))
+        self.assertEqual(len(records), len(self.RECORDS))
+
+    def test_failure(self):
+        writer = workers.JsonWriter(self.path, split_rows=2)
+        with self.assertRaises(ValueError):
+            with writer:
+                for record in self.RECORDS[:5]:
+                    writer.write(record)
+                raise ValueError('stop')
+        # Complete parts stay, the one being written is discarded
+        self.assertEqual(sorted(os.listdir(self.tmp)),
+                         ['out.00001.json', 'out.00002.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
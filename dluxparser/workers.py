@@ -0,0 +1,392 @@
+'''
+workers runs a function over a list of jobs, either serially or spread on
+a pool of worker processes (or threads), and yields the outcome of every
+job in the same order the jobs were given.
+
+Jobs are dispatched to the pool in chunks so the per-job IPC overhead
+stays low on big lists of small files. A job raising an exception does
+not stop the rest; its error message is returned instead.
+
+The chunks handed to the pool can be bounded, jobs are then read lazily
+and only a few chunks per worker are in flight, so a generator over a
+big tree never gets queued (nor its results held) all at once.
+
+Jobs run through capture keep the messages they report, so the caller
+prints them in the jobs order whatever worker ran them.
+
+run_stdio runs a job on the standard input instead of a file, writing
+its outcome to the standard output and its messages to the standard
+error, so the commands can be chained in shell pipelines. Compressed
+input is read through its compression.
+
+write_chunks writes the text chunks a job returns into its output file,
+which is removed if they fail, and not_empty turns an empty outcome into a
+blank file and an error message, as the commands write them. JsonWriter
+appends the json records of many jobs into a file, or numbered parts.
+'''
+import collections
+import functools
+import itertools
+import locale
+import os
+import sys
+import threading
+
+from dluxparser import compression
+from dluxparser import stats
+
+# Jobs per chunk handed to a pool of processes when the number of jobs is
+# not known, as when read lazily from a generator
+CHUNK_JOBS = 8
+
+# Characters of records held by JsonWriter before they are written, however
+# few records they are
+BATCH_CHARS = 4 * 1024 * 1024
+
+# Messages reported by the job running on each thread
+_log = threading.local()
+
+
+def add_arguments(parser):
+    '''Add the -j/--jobs option to an argparse parser.'''
+    parser.add_argument(
+        "-j", "--jobs", metavar="N",
+        action='store', required=False, dest='jobs', type=int,
+        default=1,
+        help="Number of files processed in parallel, 0 for all CPUs.")
+
+
+def cpu_count():
+    '''Number of CPUs available, 1 if it can not be determined.'''
+    import multiprocessing
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def imap(func, jobs, processes=1, chunksize=None, threads=False,
+         max_pending=None):
+    '''Yield a (result, error) tuple per job, in jobs order.
+
+    processes <= 1 runs the jobs on the current process,
+    processes == 0 uses all available CPUs.
+    threads runs the jobs on a pool of threads instead of processes.
+    max_pending bounds the chunks per worker handed to the pool and not
+    yet yielded, jobs can then be any iterable.
+    '''
+    if processes == 0:
+        processes = cpu_count()
+    call = functools.partial(_safe_call, func)
+    sized = hasattr(jobs, '__len__')
+
+    if processes <= 1 or (sized and len(jobs) <= 1):
+        for job in jobs:
+            yield call(job)
+        return
+
+    if not chunksize:
+        # Threads share memory, no need to amortize IPC. For processes
+        # same heuristic as multiprocessing.Pool.map, a fixed one when the
+        # jobs can not be counted
+        chunksize = 1
+        if sized and not threads:
+            chunksize = max(1, len(jobs) // (processes * 4))
+        elif not threads:
+            chunksize = CHUNK_JOBS
+
+    # Imported on demand, most runs do not need a pool and it takes a good
+    # share of the startup time
+    import multiprocessing
+    from multiprocessing import pool as mp_pool
+    if threads:
+        pool = mp_pool.ThreadPool(processes)
+    else:
+        pool = multiprocessing.Pool(processes)
+    try:
+        if max_pending:
+            outcomes = _bounded_imap(pool, call, jobs, chunksize,
+                                     max_pending * processes)
+        else:
+            outcomes = pool.imap(call, jobs, chunksize)
+        for outcome in outcomes:
+            yield outcome
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def schedule(pairs, streamed, processes, lazy=False):
+    '''(jobs, files, processes) of a run over (origin, output) pairs.
+
+    jobs and files give the same pairs, jobs to hand to imap and files to
+    match its outcomes. Streamed runs read, or write, archive members in
+    order, one at a time, on a single process. Pairs are read lazily when
+    streamed or lazy, else listed so imap sizes its chunks.
+    '''
+    if streamed or lazy:
+        jobs, files = itertools.tee(pairs)
+        return jobs, files, 1 if streamed else processes
+    pairs = list(pairs)
+    return pairs, pairs, processes
+
+
+def _bounded_imap(pool, call, jobs, chunksize, max_pending):
+    '''pool.imap with at most max_pending chunks handed to the pool.'''
+    pending = collections.deque()
+    jobs = iter(jobs)
+    while True:
+        chunk = list(itertools.islice(jobs, chunksize))
+        if chunk:
+            pending.append(pool.apply_async(_call_chunk, (call, chunk)))
+        elif not pending:
+            return
+        # Wait for the oldest chunk once the window is full or jobs ran out
+        if not chunk or len(pending) >= max_pending:
+            for outcome in pending.popleft().get():
+                yield outcome
+
+
+def _call_chunk(call, chunk):
+    '''Run call on every job of a chunk.'''
+    return [call(job) for job in chunk]
+
+
+def _safe_call(func, job):
+    '''Run func on job returning (result, None) or (None, error).'''
+    try:
+        return func(job), None
+    except Exception as err:
+        return None, '%s: %s' % (err.__class__.__name__, err)
+
+
+def capture(func, job):
+    '''Run func on job, return the messages it reported.'''
+    _log.messages = []
+    try:
+        func(job)
+        return _log.messages
+    finally:
+        del _log.messages
+
+
+def report(message):
+    '''Report a message about the job being run, print it if the job is
+       not run through capture.'''
+    messages = getattr(_log, 'messages', None)
+    if messages is None:
+        print(message)
+    else:
+        messages.append(message)
+
+
+def collect(chunks, messages):
+    '''Stream of chunks, the messages reported while producing each one
+       are appended to messages instead of being printed.'''
+    chunks = iter(chunks)
+    while True:
+        previous = getattr(_log, 'messages', None)
+        _log.messages = messages
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            if previous is None:
+                del _log.messages
+            else:
+                _log.messages = previous
+        yield chunk
+
+
+def not_empty(chunks, name):
+    '''Stream of chunks, a blank one if they are all empty, reported as an
+       error of the output file name.'''
+    empty = True
+    for chunk in chunks:
+        if chunk:
+            empty = False
+            yield chunk
+    if empty:
+        report("<-- Error: Empty processed data for file %s" % name)
+        yield " "
+
+
+def write_chunks(file_name, chunks, compress=None):
+    '''Write a stream of text chunks into a file, compressed with compress
+       if given. The file is removed if the stream fails.'''
+    try:
+        with compression.open_text(file_name, 'w', compress) as the_file:
+            for chunk in chunks:
+                with stats.timer('write'):
+                    the_file.write(chunk)
+    except Exception:
+        os.remove(file_name)
+        raise
+    stats.written(file_name)
+
+
+class JsonWriter(object):
+    '''Write encoded json records into a file or into numbered parts.
+
+    Every file gets the head, the records separated by separator and the
+    tail. Records are written batch_size (or BATCH_CHARS characters) at a
+    time. A new part is started when the current one reaches split_rows
+    records or would grow over split_bytes; a part always holds at least
+    one record.
+    Files are written under a temporary name and renamed when complete,
+    used as a context manager the current part is discarded on errors.
+    Files are compressed with compress, if given, and get its suffix;
+    split_bytes counts the text written, not the compressed bytes.
+
+    With index, every part gets an ``.idx`` file with a line per record:
+    its byte offset, its length in bytes and the key it was written with,
+    separated by tabs, so a record is read back with a seek. Parts indexed
+    can not be compressed.
+    '''
+
+    def __init__(self, path, head='', separator='', tail='',
+                 split_rows=0, split_bytes=0, batch_size=1000,
+                 compress=None, index=False):
+        if index and compress:
+            raise Exception("Compressed files can not be indexed.")
+        self.path = path
+        self.compress = compress
+        self.head = head
+        self.separator = separator
+        self.tail = tail
+        self.split_rows = split_rows
+        self.split_bytes = split_bytes
+        self.batch_size = batch_size
+        self.index = index
+        self.files = []
+        self._file = self._index = None
+        self._batch = []
+        self._entries = []
+        self._rows = self._size = self._batched = self._offset = 0
+        self._encoding = locale.getpreferredencoding(False)
+
+    def write(self, record, key=''):
+        '''Add an encoded record to the output, under key in the index.'''
+        chunk = record if not self._rows else self.separator + record
+        if self._file is not None and (
+                (self.split_rows and self._rows >= self.split_rows) or
+                (self.split_bytes and self._size + len(chunk) +
+                 len(self.tail) > self.split_bytes)):
+            self._close_part()
+            chunk = record
+        if self._file is None:
+            self._open_part()
+        self._batch.append(chunk)
+        self._rows = self._rows + 1
+        self._size = self._size + len(chunk)
+        self._batched = self._batched + len(chunk)
+        if self.index:
+            start = self._offset + self._bytes(
+                chunk[:len(chunk) - len(record)])
+            length = self._bytes(record)
+            self._entries.append('%i\t%i\t%s\n' % (start, length, key))
+            self._offset = start + length
+        if (len(self._batch) >= self.batch_size or
+                self._batched >= BATCH_CHARS):
+            self._flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
+            name = self.files.pop()
+            os.remove(name + '.tmp')
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+                os.remove(name + '.idx.tmp')
+
+    def close(self):
+        '''Complete the output, an empty one if nothing was written.'''
+        if self._file is None and not self.files:
+            self._open_part()
+        if self._file is not None:
+            self._close_part()
+        return self.files
+
+    def _part_name(self):
+        if not (self.split_rows or self.split_bytes):
+            return compression.output_name(self.path, self.compress)
+        base, ext = os.path.splitext(self.path)
+        return compression.output_name(
+            '%s.%05i%s' % (base, len(self.files) + 1, ext), self.compress)
+
+    def _open_part(self):
+        self.files.append(self._part_name())
+        self._file = compression.open_text(self.files[-1] + '.tmp', 'w',
+                                           self.compress)
+        self._file.write(self.head)
+        self._rows = 0
+        self._size = len(self.head)
+        if self.index:
+            self._index = open(self.files[-1] + '.idx.tmp', 'w')
+            self._offset = self._bytes(self.head)
+
+    def _bytes(self, text):
+        '''Size of text once encoded into a file.'''
+        if text.isascii():
+            return len(text)
+        return len(text.encode(self._encoding))
+
+    def _flush(self):
+        with stats.timer('write'):
+            self._file.write(''.join(self._batch))
+            if self._index is not None:
+                self._index.write(''.join(self._entries))
+        self._batch = []
+        self._entries = []
+        self._batched = 0
+
+    def _close_part(self):
+        self._flush()
+        with stats.timer('write'):
+            self._file.write(self.tail)
+            self._file.close()
+        self._file = None
+        os.rename(self.files[-1] + '.tmp', self.files[-1])
+        stats.written(self.files[-1])
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+            os.rename(self.files[-1] + '.idx.tmp', self.files[-1] + '.idx')
+
+
+def run_stdio(func, compress=None):
+    '''Write to the standard output the text chunks func returns for the
+       standard input. Compressed input is decompressed and the output is
+       compressed with compress, if given. Messages and errors go to the
+       standard error, return 1 on errors.'''
+    def chunks():
+        # func runs when the first chunk is asked for, within collect
+        for chunk in func(compression.open_stream(sys.stdin)):
+            yield chunk
+
+    messages = []
+    error = None
+    output = compression.open_stream(sys.stdout, 'w', compress)
+    try:
+        for chunk in collect(chunks(), messages):
+            output.write(chunk)
+    except Exception as err:
+        error = '%s: %s' % (err.__class__.__name__, err)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    for message in messages:
+        sys.stderr.write(message + '\n')
+    if error:
+        sys.stderr.write("<-- Error: Unable to parse standard input: %s\n" %
+                         error)
+        return 1